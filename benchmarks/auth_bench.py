@@ -0,0 +1,73 @@
+"""Микробенчмарк: студена срещу топла автентификация.
+
+Стартиране (по подразбиране с локална SQLite база):
+    python -m benchmarks.auth_bench --iterations 2000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./auth_bench.db")
+os.environ.setdefault("DB_PROFILE", "bench")
+
+from sqlalchemy import event
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, Base, engine
+from models import Doctor
+from routers.auth import create_access_token, get_current_doctor
+from utils.auth_cache import identity_cache
+
+queries = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    global queries
+    queries += 1
+
+
+async def _prepare() -> str:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Doctor).where(Doctor.username == "bench-doctor"))
+        doctor = result.scalar_one_or_none()
+        if doctor is None:
+            doctor = Doctor(username="bench-doctor", hashed_password="-")
+            db.add(doctor)
+            await db.commit()
+        return create_access_token(data={"sub": str(doctor.id)})
+
+
+async def _measure(token: str, iterations: int, warm: bool) -> dict:
+    global queries
+    identity_cache.clear()
+    async with AsyncSessionLocal() as db:
+        await get_current_doctor(token, db)
+        queries = 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            if not warm:
+                identity_cache.clear()
+            await get_current_doctor(token, db)
+        elapsed = time.perf_counter() - started
+    return {
+        "mode": "warm" if warm else "cold",
+        "us_per_call": round(elapsed / iterations * 1e6, 2),
+        "queries_per_call": round(queries / iterations, 2),
+    }
+
+
+async def main(iterations: int):
+    token = await _prepare()
+    for warm in (False, True):
+        print(await _measure(token, iterations, warm))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    asyncio.run(main(parser.parse_args().iterations))
@@ -0,0 +1,111 @@
+"""Бенчмарк: изтриване на пациенти с дълга история на имунизациите.
+
+Сравнява старото изтриване (зареждане + db.delete на всяка имунизация),
+една DELETE заявка на пациент (ON DELETE CASCADE) и масово изтриване.
+
+    python -m benchmarks.delete_bench --patients 200 --history 150
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./delete_bench.db")
+os.environ.setdefault("DB_PROFILE", "bench")
+
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, Base, engine
+from models import Doctor, Immunization, Patient, Vaccine
+from utils.queries import remove_patients
+from utils.sql_profile import capture_queries, instrument_engine
+
+
+async def _seed(doctor_id: int, vaccine_id: int, patients: int, history: int, egn_prefix: int) -> list:
+    async with engine.begin() as conn:
+        result = await conn.execute(insert(Patient).returning(Patient.id), [
+            {"first_name": "Бенч", "last_name": f"Пациент{i}", "egn": f"{egn_prefix:02d}{i:08d}",
+             "birth_date": date(2010, 1, 1), "doctor_id": doctor_id}
+            for i in range(patients)
+        ])
+        ids = list(result.scalars().all())
+        await conn.execute(insert(Immunization), [
+            {"patient_id": pid, "vaccine_id": vaccine_id, "doctor_id": doctor_id,
+             "date_given": date(2010, 1, 1) + timedelta(days=day)}
+            for pid in ids for day in range(history)
+        ])
+    return ids
+
+
+# Предишната реализация на delete_patient_web (за сравнение)
+async def _delete_legacy(doctor_id: int, ids: list) -> None:
+    for patient_id in ids:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Patient).where(Patient.id == patient_id, Patient.doctor_id == doctor_id))
+            patient = result.scalar_one()
+            result = await db.execute(select(Immunization).where(Immunization.patient_id == patient_id))
+            for immunization in result.scalars().all():
+                await db.delete(immunization)
+            await db.delete(patient)
+            await db.commit()
+
+
+async def _delete_single(doctor_id: int, ids: list) -> None:
+    for patient_id in ids:
+        async with AsyncSessionLocal() as db:
+            await remove_patients(db, doctor_id, [patient_id])
+            await db.commit()
+
+
+async def _delete_bulk(doctor_id: int, ids: list) -> None:
+    async with AsyncSessionLocal() as db:
+        await remove_patients(db, doctor_id, ids)
+        await db.commit()
+
+
+async def main(patients: int, history: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # Всеки режим изтрива пациентите си, така че повторното пускане започва на чисто
+    async with AsyncSessionLocal() as db:
+        doctor = (await db.execute(select(Doctor).where(Doctor.username == "delete-bench"))).scalar_one_or_none()
+        if doctor is None:
+            doctor = Doctor(username="delete-bench", hashed_password="-")
+            db.add(doctor)
+        vaccine = Vaccine(name="Бенч", recommended_month=None)
+        db.add(vaccine)
+        await db.commit()
+        doctor_id, vaccine_id = doctor.id, vaccine.id
+
+    instrument_engine(engine)
+    modes = [("legacy", _delete_legacy), ("single", _delete_single), ("bulk", _delete_bulk)]
+    for number, (name, run) in enumerate(modes):
+        ids = await _seed(doctor_id, vaccine_id, patients, history, number)
+        with capture_queries() as log:
+            started = time.perf_counter()
+            await run(doctor_id, ids)
+            elapsed = time.perf_counter() - started
+        async with AsyncSessionLocal() as db:
+            left = (await db.execute(select(Immunization.id).where(Immunization.patient_id.in_(ids)))).first()
+        print({
+            "mode": name,
+            "patients": patients,
+            "history": history,
+            "ms_per_patient": round(elapsed / patients * 1000, 3),
+            "queries_per_patient": round(log.count / patients, 2),
+            "orphans_left": left is not None,
+        })
+    async with AsyncSessionLocal() as db:
+        await db.delete(vaccine)
+        await db.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--history", type=int, default=150, help="Имунизации на пациент")
+    args = parser.parse_args()
+    asyncio.run(main(args.patients, args.history))
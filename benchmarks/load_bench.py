@@ -0,0 +1,202 @@
+"""End-to-end бенчмарк: main.app през in-process ASGI клиент.
+
+Сценарии: login, dashboard, patient_vaccines, schedule, immunization_write.
+По подразбиране ползва локална SQLite база; за Postgres задайте DATABASE_URL.
+
+    python -m benchmarks.load_bench --requests 300 --concurrency 8 --save benchmarks/baselines/before.json
+    python -m benchmarks.load_bench --compare benchmarks/baselines/before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./load_bench.db")
+os.environ.setdefault("DB_PROFILE", "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, Base, DB_PROFILE, engine
+from models import Doctor, Immunization, Patient, Vaccine
+from routers.auth import create_access_token, get_password_hash
+from utils.population import DEFAULT_CATALOG
+
+BENCH_USERNAME = "bench-doctor"
+BENCH_PASSWORD = "bench-password"
+
+
+
+# 🌱 Доктор, каталог и пациенти с имунизации (само ако доктора го няма)
+async def _seed(patients: int, seed: int) -> int:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Doctor).where(Doctor.username == BENCH_USERNAME))
+        doctor = result.scalar_one_or_none()
+        if doctor is not None:
+            return doctor.id
+
+        doctor = Doctor(username=BENCH_USERNAME, hashed_password=get_password_hash(BENCH_PASSWORD))
+        db.add(doctor)
+        if not (await db.execute(select(func.count(Vaccine.id)))).scalar():
+            db.add_all(Vaccine(name=name, recommended_month=month, is_mandatory=True) for name, month in DEFAULT_CATALOG)
+        await db.flush()
+        vaccines = (await db.execute(select(Vaccine))).scalars().all()
+
+        rng = random.Random(seed)
+        today = date.today()
+        rows = [
+            Patient(
+                first_name=f"Име{i}", last_name=f"Фамилия{i % 500:03d}",
+                egn=f"{doctor.id:03d}{i:07d}", birth_date=today - timedelta(days=rng.randint(0, 18 * 365)),
+                doctor_id=doctor.id,
+            )
+            for i in range(patients)
+        ]
+        db.add_all(rows)
+        await db.flush()
+        for patient in rows:
+            for vaccine in rng.sample(vaccines, rng.randint(0, len(vaccines))):
+                db.add(Immunization(
+                    patient_id=patient.id, vaccine_id=vaccine.id, doctor_id=doctor.id,
+                    date_given=patient.birth_date + timedelta(days=30 * (vaccine.recommended_month or 0)),
+                ))
+        await db.commit()
+
+    from utils.compliance import rebuild_all
+    await rebuild_all()
+    return doctor.id
+
+
+# 🎬 Сценариите връщат функция, която изпраща една заявка
+def _scenarios(client: httpx.AsyncClient, patient_ids: List[int], vaccine_ids: List[int], token: str) -> Dict[str, Callable]:
+    bearer = {"Authorization": f"Bearer {token}"}
+    cookies = {"access_token": token}
+    pick = random.Random(0).choice
+
+    return {
+        "login": lambda: client.post("/auth/login", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}),
+        "dashboard": lambda: client.get("/dashboard", cookies=cookies),
+        "patient_vaccines": lambda: client.get(f"/patients/{pick(patient_ids)}/vaccines", cookies=cookies),
+        "schedule": lambda: client.get(f"/schedule/{pick(patient_ids)}", headers=bearer),
+        "immunization_write": lambda: client.post("/immunizations/", headers=bearer, json={
+            "patient_id": pick(patient_ids), "vaccine_id": pick(vaccine_ids), "date_given": date.today().isoformat(),
+        }),
+    }
+
+
+# 0 при празен списък (--requests 0 или сценарий без заявки)
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# ⏱️ requests заявки от concurrency паралелни работника
+async def _run(send: Callable, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await send()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _compare(results: dict, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    print(f"\nСравнение с {baseline_path}:")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        deltas = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (current[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            deltas.append(f"{key} {before[key]} -> {current[key]} ({change:+.1f}%)")
+        print(f"  {name:<20} " + ", ".join(deltas))
+
+
+async def main(args):
+    from main import app
+
+    doctor_id = await _seed(args.patients, args.seed)
+    async with AsyncSessionLocal() as db:
+        patient_ids = (await db.execute(select(Patient.id).where(Patient.doctor_id == doctor_id))).scalars().all()
+        vaccine_ids = (await db.execute(select(Vaccine.id))).scalars().all()
+    token = create_access_token(data={"sub": str(doctor_id)})
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        scenarios = _scenarios(client, patient_ids, vaccine_ids, token)
+        for name in args.scenarios or scenarios:
+            send = scenarios[name]
+            # Загрявка: кешове, компилирани заявки, шаблони
+            for _ in range(min(args.warmup, args.requests)):
+                await send()
+            requests = args.login_requests if name == "login" else args.requests
+            results[name] = await _run(send, requests, args.concurrency)
+            print(f"{name:<20} {results[name]}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "database": engine.dialect.name,
+        "profile": DB_PROFILE,
+        "python": platform.python_version(),
+        "patients": len(patient_ids),
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Записан baseline: {args.save}")
+    if args.compare:
+        _compare(results, args.compare)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="Заявки на сценарий")
+    parser.add_argument("--login-requests", type=int, default=40, help="Заявки за login (bcrypt е бавен)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", nargs="*", choices=["login", "dashboard", "patient_vaccines", "schedule", "immunization_write"])
+    parser.add_argument("--save", help="Път за JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline за сравнение")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""Бенчмарк: ORM + pydantic orm_mode срещу колони като редове + бърз JSON.
+
+Измерва списъка с пациенти (PatientSummaryOut) за --rows реда:
+време (най-доброто от --repeat) и пиков обем памет (tracemalloc).
+
+    python -m benchmarks.serialization_bench --rows 10000 --rows 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./serialization_bench.db")
+os.environ.setdefault("DB_PROFILE", "bench")
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, insert
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, Base, engine
+from models import Doctor, Patient, PatientCompliance
+from routers.patient import _patient_summary
+from schemas import PatientSummaryOut
+from utils.fastjson import dumps, orjson
+from utils.queries import patient_summary_rows_page, patients_page
+
+
+async def _seed(rows: int) -> int:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        doctor = (await db.execute(select(Doctor).where(Doctor.username == "serialization-bench"))).scalar_one_or_none()
+        if doctor is None:
+            doctor = Doctor(username="serialization-bench", hashed_password="-")
+            db.add(doctor)
+            await db.commit()
+        existing = (await db.execute(select(func.count(Patient.id)).where(Patient.doctor_id == doctor.id))).scalar()
+        if existing < rows:
+            result = await db.execute(insert(Patient).returning(Patient.id), [
+                {"first_name": "Иван", "last_name": f"Петров{i:06d}", "egn": f"9{doctor.id:02d}{i:07d}",
+                 "birth_date": date(2015, 1, 1) + timedelta(days=i % 3000), "doctor_id": doctor.id}
+                for i in range(existing, rows)
+            ])
+            await db.execute(insert(PatientCompliance), [
+                {"patient_id": pid, "given_count": 5, "missing_count": pid % 3, "next_due_date": date(2026, 1, 1)}
+                for pid in result.scalars().all()
+            ])
+            await db.commit()
+        return doctor.id
+
+
+# Досегашният път: ORM обекти -> orm_mode валидация -> jsonable_encoder -> json.dumps
+async def _orm_path(doctor_id: int, rows: int) -> bytes:
+    async with AsyncSessionLocal() as db:
+        patients = (await db.execute(patients_page(doctor_id, rows))).scalars().all()[:rows]
+        payload = [PatientSummaryOut.from_orm(p) for p in patients]
+        return json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode()
+
+
+async def _rows_path(doctor_id: int, rows: int) -> bytes:
+    async with AsyncSessionLocal() as db:
+        result = (await db.execute(patient_summary_rows_page(doctor_id, rows))).all()[:rows]
+        return dumps([_patient_summary(row) for row in result])
+
+
+async def _measure(path, doctor_id: int, rows: int, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = await path(doctor_id, rows)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    await path(doctor_id, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ms": round(best * 1000, 1),
+        "rows_per_s": round(rows / best),
+        "peak_mb": round(peak / 2 ** 20, 1),
+        "bytes": len(body),
+    }
+
+
+async def main(sizes, repeat: int):
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json (orjson не е инсталиран)'}")
+    for rows in sizes:
+        doctor_id = await _seed(rows)
+        for name, path in (("orm+pydantic", _orm_path), ("rows+fastjson", _rows_path)):
+            print({"rows": rows, "path": name, **await _measure(path, doctor_id, rows, repeat)})
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, action="append", help="Брой редове (може няколко пъти)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows or [10000], args.repeat))
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Тестовете работят върху временна SQLite база - database.py чете DATABASE_URL при import
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL",
+    "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(prefix="vaccination-tests-"), "test.db"),
+)
+os.environ.setdefault("DB_ECHO", "0")
+
+pytest_plugins = ["utils.pytest_sql"]
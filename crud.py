@@ -1,18 +1,29 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from datetime import date
 from typing import List, Optional
+import logging
 
 from database import get_db
-from models import Patient, Doctor, Vaccine, Immunization
+from models import Patient, Doctor, Vaccine
 from routers.auth import get_current_doctor_web_strict  # Използваме strict версията
-from utils.schedule import calculate_age_in_months, required_mandatory_vaccines
+from utils.schedule import calculate_age_in_months, required_for_age
+from utils.catalog import catalog_cache
+from utils.queries import load_patient_with_immunizations, load_patients_page, remove_patients
+from utils import due_dates
+from utils.compliance import rebuild_in_background, refresh_patients
+from utils.ingest import detect_format, upload_chunks
+from utils.templates import stream_template, templates
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
+
+# Брой пациенти на една страница в dashboard-а (по подразбиране и максимум през ?limit=)
+DASHBOARD_PAGE_SIZE = 60
+DASHBOARD_MAX_PAGE_SIZE = 2000
 
 
 # Middleware функция за проверка на автентификация и redirect
@@ -27,10 +38,21 @@ async def check_auth_redirect(request: Request, db: AsyncSession = Depends(get_d
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
 
 
-# 🏠 Dashboard - показва всички пациенти на лекаря
+# 🔗 Относителен URL към следващата страница със запазени филтри
+def _page_url(request: Request, cursor: str) -> str:
+    url = request.url.include_query_params(after=cursor)
+    return f"{url.path}?{url.query}"
+
+
+# 🏠 Dashboard - показва пациентите на лекаря по страници (keyset по фамилия)
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(
     request: Request, 
+    after: Optional[str] = None,
+    born_from: Optional[date] = None,
+    born_to: Optional[date] = None,
+    name_prefix: Optional[str] = None,
+    limit: int = Query(DASHBOARD_PAGE_SIZE, ge=1, le=DASHBOARD_MAX_PAGE_SIZE),
     db: AsyncSession = Depends(get_db)
 ):
     try:
@@ -39,19 +61,23 @@ async def dashboard(
         if isinstance(doctor, RedirectResponse):
             return doctor
             
-        result = await db.execute(select(Patient).where(Patient.doctor_id == doctor.id))
-        patients = result.scalars().all()
-        
-        return templates.TemplateResponse(
-            "dashboard.html", 
-            {
-                "request": request, 
-                "patients": patients,
-                "doctor": doctor
-            }
+        filters = {"born_from": born_from, "born_to": born_to, "name_prefix": name_prefix}
+        patients, next_cursor = await load_patients_page(
+            db, doctor.id, limit, after=after, **filters
         )
+        
+        # Данните са заредени; HTML-ът се праща на парчета, докато се рендерира
+        context = {
+            "request": request, 
+            "patients": patients,
+            "doctor": doctor,
+            "filters": filters,
+            "after": after,
+            "next_url": _page_url(request, next_cursor) if next_cursor else None
+        }
+        return StreamingResponse(stream_template("dashboard.html", context), media_type="text/html")
     except Exception as e:
-        print(f"Dashboard error: {e}")
+        logger.error("Dashboard error: %s", e)
         return templates.TemplateResponse(
             "dashboard.html", 
             {
@@ -74,19 +100,20 @@ async def manage_vaccines(
         if isinstance(doctor, RedirectResponse):
             return doctor
             
-        result = await db.execute(select(Vaccine).order_by(Vaccine.recommended_month))
-        vaccines = result.scalars().all()
+        catalog = await catalog_cache.get(db)
+        vaccines = catalog.by_month()
         
         return templates.TemplateResponse(
             "manage_vaccines.html",
             {
                 "request": request,
                 "vaccines": vaccines,
+                "catalog_version": catalog.version,
                 "doctor": doctor
             }
         )
     except Exception as e:
-        print(f"Vaccines management error: {e}")
+        logger.error("Vaccines management error: %s", e)
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -119,7 +146,7 @@ async def edit_vaccine_form(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Edit vaccine form error: {e}")
+        logger.error("Edit vaccine form error: %s", e)
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -128,6 +155,7 @@ async def edit_vaccine_form(
 async def update_vaccine_web(
     vaccine_id: int,
     request: Request,
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     is_mandatory: bool = Form(False),
     recommended_month: Optional[int] = Form(None),
@@ -144,15 +172,23 @@ async def update_vaccine_web(
         if not vaccine:
             raise HTTPException(status_code=404, detail="Ваксината не е намерена")
         
+        schedule_changed = (
+            vaccine.is_mandatory != is_mandatory
+            or vaccine.recommended_month != (recommended_month if recommended_month else None)
+        )
         vaccine.name = name
         vaccine.is_mandatory = is_mandatory
         vaccine.recommended_month = recommended_month if recommended_month else None
         
         await db.commit()
+        catalog_cache.invalidate()
+        if schedule_changed:
+            background_tasks.add_task(rebuild_in_background)
+            background_tasks.add_task(due_dates.rebuild_in_background, [vaccine_id])
         return RedirectResponse(url="/vaccines", status_code=status.HTTP_303_SEE_OTHER)
         
     except Exception as e:
-        print(f"Update vaccine error: {e}")
+        logger.error("Update vaccine error: %s", e)
         await db.rollback()
         return RedirectResponse(url="/vaccines", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -178,7 +214,7 @@ async def new_patient_form(
             }
         )
     except Exception as e:
-        print(f"New patient form error: {e}")
+        logger.error("New patient form error: %s", e)
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -220,13 +256,71 @@ async def create_patient_web(
             doctor_id=doctor.id
         )
         db.add(new_patient)
+        await db.flush()
+        await refresh_patients(db, [new_patient.id])
         await db.commit()
         await db.refresh(new_patient)
         
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
         
     except Exception as e:
-        print(f"Create patient error: {e}")
+        logger.error("Create patient error: %s", e)
+        await db.rollback()
+        return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
+
+
+# 📂 Форма за масов импорт на пациенти
+@router.get("/patients/import", response_class=HTMLResponse)
+async def import_patients_form(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    doctor = await check_auth_redirect(request, db)
+    if isinstance(doctor, RedirectResponse):
+        return doctor
+        
+    return templates.TemplateResponse(
+        "import_patients.html",
+        {"request": request, "doctor": doctor}
+    )
+
+
+# 📥 Масов импорт на пациенти от качен CSV/NDJSON файл
+@router.post("/patients/import", response_class=HTMLResponse)
+async def import_patients_web(
+    request: Request,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    from routers.patient import import_patients
+    try:
+        doctor = await check_auth_redirect(request, db)
+        if isinstance(doctor, RedirectResponse):
+            return doctor
+            
+        fmt = detect_format(file.content_type, file.filename)
+        if fmt is None:
+            return templates.TemplateResponse(
+                "import_patients.html",
+                {
+                    "request": request,
+                    "doctor": doctor,
+                    "error": "Поддържат се само CSV и NDJSON файлове"
+                }
+            )
+        
+        report = await import_patients(db, upload_chunks(file), fmt, doctor.id)
+        return templates.TemplateResponse(
+            "import_patients.html",
+            {
+                "request": request,
+                "doctor": doctor,
+                "report": report.as_dict(),
+                "filename": file.filename
+            }
+        )
+    except Exception as e:
+        logger.error("Import patients error: %s", e)
         await db.rollback()
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -266,7 +360,7 @@ async def edit_patient_form(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Edit patient form error: {e}")
+        logger.error("Edit patient form error: %s", e)
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -319,13 +413,15 @@ async def update_patient_web(
         patient.egn = egn
         patient.birth_date = birth_date
         
+        await db.flush()
+        await refresh_patients(db, [patient.id])
         await db.commit()
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Update patient error: {e}")
+        logger.error("Update patient error: %s", e)
         await db.rollback()
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -342,26 +438,10 @@ async def delete_patient_web(
         if isinstance(doctor, RedirectResponse):
             return doctor
             
-        result = await db.execute(
-            select(Patient).where(
-                Patient.id == patient_id, 
-                Patient.doctor_id == doctor.id
-            )
-        )
-        patient = result.scalar_one_or_none()
-        
-        if not patient:
+        # Една DELETE заявка; имунизациите и обобщението се трият каскадно от базата
+        deleted = await remove_patients(db, doctor.id, [patient_id])
+        if not deleted:
             raise HTTPException(status_code=404, detail="Пациентът не е намерен или нямате достъп до него")
-        
-        # Изтриваме всички свързани имунизации
-        result = await db.execute(
-            select(Immunization).where(Immunization.patient_id == patient_id)
-        )
-        immunizations = result.scalars().all()
-        for immunization in immunizations:
-            await db.delete(immunization)
-        
-        await db.delete(patient)
         await db.commit()
         
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
@@ -369,7 +449,7 @@ async def delete_patient_web(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Delete patient error: {e}")
+        logger.error("Delete patient error: %s", e)
         await db.rollback()
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -386,14 +466,8 @@ async def patient_vaccines(
         if isinstance(doctor, RedirectResponse):
             return doctor
             
-        # Вземаме пациента
-        result = await db.execute(
-            select(Patient).where(
-                Patient.id == patient_id, 
-                Patient.doctor_id == doctor.id
-            )
-        )
-        patient = result.scalar_one_or_none()
+        # Вземаме пациента заедно с имунизациите му (една заявка)
+        patient = await load_patient_with_immunizations(db, patient_id, doctor.id)
         
         if not patient:
             raise HTTPException(status_code=404, detail="Пациентът не е намерен или нямате достъп до него")
@@ -401,18 +475,15 @@ async def patient_vaccines(
         # Изчисляваме възрастта в месеци
         age_months = calculate_age_in_months(patient.birth_date)
         
-        # Всички ваксини
-        result = await db.execute(select(Vaccine))
-        all_vaccines = result.scalars().all()
+        # Всички ваксини (от кеша на каталога)
+        catalog = await catalog_cache.get(db)
+        all_vaccines = catalog.vaccines
         
         # Задължителни ваксини според възрастта
-        required_vaccines = required_mandatory_vaccines(age_months, all_vaccines)
+        required_vaccines = required_for_age(age_months, catalog.compiled)
         
         # Поставени ваксини с данни за имунизациите
-        result = await db.execute(
-            select(Immunization).where(Immunization.patient_id == patient_id)
-        )
-        immunizations = result.scalars().all()
+        immunizations = patient.immunizations
         given_vaccine_ids = {imm.vaccine_id for imm in immunizations}
         
         # Създаваме речници за по-лесно търсене
@@ -444,5 +515,5 @@ async def patient_vaccines(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Patient vaccines error: {e}")
+        logger.error("Patient vaccines error: %s", e)
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
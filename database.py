@@ -1,7 +1,11 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 import os
+import time
 
 # Зареждане на .env файла
 load_dotenv()
@@ -9,8 +13,141 @@ load_dotenv()
 # Взимане на URL за връзка от .env файла
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Профили на engine-а: dev (с SQL лог), prod и bench (без лог, по-голям пул)
+ENGINE_PROFILES = {
+    "dev": {
+        "echo": True, "pool_size": 5, "max_overflow": 10, "pool_pre_ping": True,
+        "pool_recycle": 1800, "statement_cache_size": 100,
+    },
+    "prod": {
+        "echo": False, "pool_size": 20, "max_overflow": 10, "pool_pre_ping": True,
+        "pool_recycle": 1800, "statement_cache_size": 500,
+    },
+    "bench": {
+        "echo": False, "pool_size": 50, "max_overflow": 0, "pool_pre_ping": False,
+        "pool_recycle": -1, "statement_cache_size": 500,
+    },
+}
+
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+
+
+def _env_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ⚙️ Настройки на профила + отделни overrides от средата (DB_POOL_SIZE, DB_ECHO, ...)
+def engine_settings(profile: str = DB_PROFILE) -> dict:
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Непознат DB_PROFILE: {profile} (налични: {', '.join(ENGINE_PROFILES)})")
+    settings = dict(ENGINE_PROFILES[profile])
+    overrides = {
+        "echo": ("DB_ECHO", _env_bool),
+        "pool_size": ("DB_POOL_SIZE", int),
+        "max_overflow": ("DB_MAX_OVERFLOW", int),
+        "pool_pre_ping": ("DB_POOL_PRE_PING", _env_bool),
+        "pool_recycle": ("DB_POOL_RECYCLE", int),
+        "statement_cache_size": ("DB_STATEMENT_CACHE_SIZE", int),
+    }
+    for key, (name, convert) in overrides.items():
+        if os.getenv(name) is not None:
+            settings[key] = convert(os.getenv(name))
+    return settings
+
+
+# 📈 Телеметрия на пула: чакане за връзка и грешки при свързване
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.connection_errors = 0
+
+    def observe_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "connection_errors": self.connection_errors,
+        }
+
+
+pool_stats = PoolStats()
+
+
+# Пул, който мери колко чака заявката за свободна връзка
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_stats.connection_errors += 1
+            raise
+        pool_stats.observe_wait(time.perf_counter() - started)
+        return connection
+
+
+def _engine_kwargs(url: str, settings: dict) -> dict:
+    kwargs = {"echo": settings["echo"]}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite използва StaticPool - настройките за пула не важат
+        return kwargs
+    kwargs.update(
+        poolclass=InstrumentedPool,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_pre_ping=settings["pool_pre_ping"],
+        pool_recycle=settings["pool_recycle"],
+    )
+    if parsed.get_driver_name() == "asyncpg":
+        kwargs["connect_args"] = {"prepared_statement_cache_size": settings["statement_cache_size"]}
+    return kwargs
+
+
 # Създаване на engine
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL, engine_settings()))
+
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # SQLite не прилага FOREIGN KEY / ON DELETE CASCADE без тази настройка
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if make_url(DATABASE_URL).database not in (None, "", ":memory:"):
+            # WAL: compliance.rebuild_all чете пачките в една сесия и пише с commit в друга - без WAL
+            # отвореното четене държи SHARED lock и commit-ът пада с "database is locked".
+            # Същото важи и за дългите четения на export и напомнянията
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _count_disconnects(context):
+    if context.is_disconnect:
+        pool_stats.connection_errors += 1
+
+
+# 🩺 Състояние на пула за /health/db
+def pool_status() -> dict:
+    pool = engine.pool
+    status = {"profile": DB_PROFILE, "pool": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    status.update(pool_stats.as_dict())
+    return status
 
 # Създаване на session
 AsyncSessionLocal = sessionmaker(
@@ -1,11 +1,19 @@
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 import os
 
 # Импортиране на всички роутери
-from routers import patient, immunization, auth, vaccine, doctor, schedule
+from routers import patient, immunization, auth, vaccine, doctor, schedule, export
 import crud
+from database import engine, pool_status
+from utils.log import RequestIdMiddleware, setup_logging, shutdown_logging
+from utils.metrics import MetricsMiddleware, instrument_engine, metrics
+from utils import sql_profile
+from utils.catalog import catalog_cache
+from utils.auth_cache import identity_cache
+from utils.password_pool import password_pool
+from utils.templates import fragment_cache, precompile_templates
 
 app = FastAPI(
     title="Vaccination Schedule API",
@@ -13,6 +21,18 @@ app = FastAPI(
     description="API за управление на ваксинационни графици"
 )
 
+# Структурирано логване през опашка (извън event loop-а) + request id за всяка заявка
+setup_logging()
+if sql_profile.SQL_PROFILE:
+    # Профил на SQL заявките по заявка (X-SQL-Queries + N+1 предупреждения) - само при SQL_PROFILE=1
+    sql_profile.instrument_engine(engine)
+    app.add_middleware(sql_profile.SqlProfileMiddleware)
+app.add_middleware(RequestIdMiddleware)
+
+# Метрики за латентност, брой SQL заявки и време в базата по route
+instrument_engine(engine)
+app.add_middleware(MetricsMiddleware)
+
 # ВАЖНО: Първо включваме auth роутера
 app.include_router(auth.router)
 
@@ -25,11 +45,23 @@ app.include_router(doctor.router)
 app.include_router(vaccine.router)
 app.include_router(immunization.router)
 app.include_router(schedule.router)
+app.include_router(export.router)
 
 # Статични файлове (ако имате CSS, JS, изображения)
 if os.path.exists("static"):
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
+@app.on_event("startup")
+def compile_templates():
+    """Компилира шаблоните предварително (и пълни bytecode кеша)"""
+    precompile_templates()
+
+@app.on_event("shutdown")
+async def dispose_engine():
+    """Затваря връзките в пула при спиране на приложението"""
+    await engine.dispose()
+    shutdown_logging()
+
 @app.get("/", include_in_schema=False)
 def redirect_to_login():
     """Пренасочване към login страницата"""
@@ -40,6 +72,36 @@ def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Метрики в текстов формат за Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/db")
+def db_pool_health():
+    """Състояние на пула от връзки: заети/свободни, чакане и грешки"""
+    return pool_status()
+
+@app.get("/health/catalog")
+def catalog_cache_stats():
+    """Hit/miss броячи на кеша на каталога с ваксини"""
+    return catalog_cache.stats()
+
+@app.get("/health/auth")
+def auth_cache_stats():
+    """Hit/miss броячи на кеша за автентификация"""
+    return identity_cache.stats()
+
+@app.get("/health/templates")
+def template_cache_stats():
+    """Hit/miss броячи на кеша на HTML фрагменти"""
+    return fragment_cache.stats()
+
+@app.get("/health/hashing")
+def password_pool_stats():
+    """Латентност и чакане на опашката при хеширане на пароли"""
+    return password_pool.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""Административни команди.
+
+    python manage.py migrate              # прилага неприложените миграции
+    python manage.py check-plans          # EXPLAIN на горещите заявки, код 1 при пълно сканиране
+    python manage.py rebuild-compliance   # пълно преизчисляване на patient_compliance и patient_vaccine_due
+    python manage.py export --doctor-id 1 --format csv --output registry.csv
+    python manage.py generate-population --patients 1000000 --doctors 500 --seed 7
+    python manage.py overdue-reminders --workers 4 --sender file --output-dir reminders
+
+rebuild-compliance трябва да се пуска всяка нощ (cron): missing_count и next_due_date в
+patient_compliance са сметнати към деня на записа, а пациентите порастват - след смяна на
+месеца missing_count се разминава с /patients/{id}/missing-vaccines до следващото преизчисляване.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date
+
+from database import engine
+
+
+async def migrate(args):
+    import migrations
+    applied = await migrations.upgrade(engine)
+    print("Приложени миграции: " + (", ".join(applied) if applied else "няма нови"))
+
+
+async def check_plans(args):
+    from utils.query_plans import HOT_QUERIES, check_hot_queries
+    problems = await check_hot_queries(engine)
+    for problem in problems:
+        print(problem, end="\n\n")
+    if problems:
+        raise SystemExit(1)
+    print(f"Планове: {len(HOT_QUERIES)} заявки без пълно сканиране")
+
+
+async def rebuild_compliance(args):
+    from utils import due_dates
+    from utils.compliance import rebuild_all
+    total = await rebuild_all(args.chunk_size)
+    print(f"Обновени обобщения: {total} пациента")
+    print(f"Обновени дължими дати: {await due_dates.rebuild_all(args.chunk_size)} пациента")
+
+
+async def export(args):
+    from utils.export import available_formats, iter_export
+    if args.format not in available_formats():
+        raise SystemExit(f"Неподдържан формат. Налични: {', '.join(available_formats())}")
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in iter_export(args.doctor_id, args.format, args.chunk_size):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+async def generate_population(args):
+    from routers.auth import get_password_hash
+    from utils import due_dates
+    from utils.compliance import rebuild_all
+    from utils.population import PopulationSpec, generate_population as generate
+
+    compliance_by = {}
+    for item in filter(None, (args.compliance_by or "").split(",")):
+        name, _, rate = item.partition("=")
+        compliance_by[name.strip()] = float(rate)
+
+    def progress(totals, seconds):
+        print(f"  {totals['patients']:>10} пациента, {totals['immunizations']:>11} имунизации"
+              f" ({totals['patients'] / seconds:,.0f} пациента/s)", flush=True)
+
+    try:
+        spec = PopulationSpec(
+            patients=args.patients, doctors=args.doctors, seed=args.seed, max_age_years=args.max_age,
+            compliance=args.compliance, compliance_by=compliance_by, mean_delay_days=args.mean_delay,
+        )
+        totals = await generate(engine, spec, get_password_hash(args.password), args.chunk_size, progress)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Генерирани: {totals}")
+    if not args.skip_compliance:
+        print(f"Обновени обобщения: {await rebuild_all()} пациента")
+        print(f"Обновени дължими дати: {await due_dates.rebuild_all()} пациента")
+
+
+async def overdue_reminders(args):
+    from utils.reminders import REMINDER_WORKERS, SENDERS, build_outbox, send_outbox
+    run_date = date.fromisoformat(args.date) if args.date else date.today()
+    workers = REMINDER_WORKERS if args.workers is None else args.workers
+    report = await build_outbox(run_date, workers, args.chunk_size, restart=args.restart)
+    print(f"Изчисляване: {report.as_dict()}")
+    if args.skip_send:
+        return
+    options = {"directory": args.output_dir} if args.sender == "file" and args.output_dir else {}
+    print(f"Изпращане: {await send_outbox(run_date, SENDERS[args.sender](**options))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vaccination Schedule - административни команди")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="Прилага неприложените миграции").set_defaults(handler=migrate)
+    commands.add_parser(
+        "check-plans", help="Проверява плановете на горещите заявки за пълно сканиране"
+    ).set_defaults(handler=check_plans)
+
+    rebuild = commands.add_parser("rebuild-compliance", help="Преизчислява обобщението и дължимите дати за всички пациенти (всяка нощ)")
+    rebuild.add_argument("--chunk-size", type=int, default=2000)
+    rebuild.set_defaults(handler=rebuild_compliance)
+
+    exporter = commands.add_parser("export", help="Експорт на пациентите и имунизациите на лекар")
+    exporter.add_argument("--doctor-id", type=int, required=True)
+    exporter.add_argument("--format", choices=["csv", "ndjson", "parquet"], default="csv")
+    exporter.add_argument("--output", help="Файл за запис (по подразбиране stdout)")
+    exporter.add_argument("--chunk-size", type=int, default=5000)
+    exporter.set_defaults(handler=export)
+
+    population = commands.add_parser(
+        "generate-population", help="Синтетични лекари, пациенти и имунизации (детерминирано по --seed)"
+    )
+    population.add_argument("--patients", type=int, default=10000)
+    population.add_argument("--doctors", type=int, default=200)
+    population.add_argument("--seed", type=int, default=1)
+    population.add_argument(
+        "--max-age", type=int, default=None,
+        help="Максимална възраст в години (по подразбиране 18 или колкото е нужно за уникални ЕГН-та)",
+    )
+    population.add_argument("--compliance", type=float, default=0.92, help="Дял поставени дължими ваксини")
+    population.add_argument("--compliance-by", help="По ваксина: \"MMR-1=0.85,BCG=0.98\"")
+    population.add_argument("--mean-delay", type=float, default=14.0, help="Средно закъснение в дни")
+    population.add_argument("--password", default="doctor", help="Парола на генерираните лекари")
+    population.add_argument("--chunk-size", type=int, default=50000)
+    population.add_argument("--skip-compliance", action="store_true", help="Без преизчисляване на patient_compliance и patient_vaccine_due")
+    population.set_defaults(handler=generate_population)
+
+    reminders = commands.add_parser(
+        "overdue-reminders", help="Нощни напомняния за просрочени ваксини (продължава прекъснато пускане)"
+    )
+    reminders.add_argument("--date", help="Дата на пускането YYYY-MM-DD (по подразбиране днес)")
+    reminders.add_argument("--workers", type=int, default=None, help="Работни процеси (0 = без пул)")
+    reminders.add_argument("--chunk-size", type=int, default=5000)
+    reminders.add_argument("--sender", choices=["file", "smtp"], default="file")
+    reminders.add_argument("--output-dir", help="Папка за --sender file")
+    reminders.add_argument("--skip-send", action="store_true", help="Само попълва reminder_outbox")
+    reminders.add_argument("--restart", action="store_true", help="Изчислява наново лекарите за датата (без вече изпратените)")
+    reminders.set_defaults(handler=overdue_reminders)
+
+    args = parser.parse_args()
+    # SQL логовете отиват в stdout и биха развалили експорта
+    engine.echo = False
+
+    async def run():
+        try:
+            await args.handler(args)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
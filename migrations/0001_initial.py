@@ -0,0 +1,58 @@
+"""Основните таблици (doctors, patients, vaccines, immunizations, patient_compliance).
+
+Схемата е замразена към момента на миграцията - по-късните промени в models.py
+идват със собствени миграции.
+"""
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, ForeignKey, Integer, MetaData, String, Table, func,
+)
+
+metadata = MetaData()
+
+doctors = Table(
+    "doctors", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+)
+
+patients = Table(
+    "patients", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("first_name", String, nullable=False),
+    Column("last_name", String, nullable=False),
+    Column("egn", String, unique=True, nullable=False),
+    Column("birth_date", Date, nullable=False),
+    Column("doctor_id", Integer, ForeignKey("doctors.id")),
+)
+
+vaccines = Table(
+    "vaccines", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, nullable=False),
+    Column("is_mandatory", Boolean, default=True),
+    Column("recommended_month", Integer),
+)
+
+immunizations = Table(
+    "immunizations", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id")),
+    Column("vaccine_id", Integer, ForeignKey("vaccines.id")),
+    Column("date_given", Date, nullable=False),
+    Column("doctor_id", Integer, ForeignKey("doctors.id")),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+patient_compliance = Table(
+    "patient_compliance", metadata,
+    Column("patient_id", Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True),
+    Column("given_count", Integer, nullable=False, default=0),
+    Column("missing_count", Integer, nullable=False, default=0),
+    Column("next_due_date", Date),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+async def upgrade(conn):
+    await conn.run_sync(lambda sync_conn: metadata.create_all(sync_conn, checkfirst=True))
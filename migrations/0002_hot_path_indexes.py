@@ -0,0 +1,17 @@
+"""Индекси за горещите заявки: пациенти по лекар и имунизации по пациент/ваксина."""
+from sqlalchemy import text
+
+INDEXES = [
+    ("ix_patients_doctor_id", "patients", "doctor_id"),
+    # Списъци и keyset пагинация по лекар: WHERE doctor_id ORDER BY last_name, id
+    ("ix_patients_doctor_last_name_id", "patients", "doctor_id, last_name, id"),
+    ("ix_patients_doctor_birth_date", "patients", "doctor_id, birth_date"),
+    ("ix_immunizations_patient_id", "immunizations", "patient_id"),
+    ("ix_immunizations_vaccine_id", "immunizations", "vaccine_id"),
+    ("ix_immunizations_patient_vaccine", "immunizations", "patient_id, vaccine_id"),
+]
+
+
+async def upgrade(conn):
+    for name, table, columns in INDEXES:
+        await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
@@ -0,0 +1,62 @@
+"""ON DELETE CASCADE за immunizations.patient_id (patient_compliance го има от създаването си).
+
+PostgreSQL: сменя FOREIGN KEY ограниченията на място.
+SQLite: не поддържа ALTER CONSTRAINT, затова таблицата се пресъздава и данните се копират.
+"""
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, Index, MetaData, Table, func, text
+
+metadata = MetaData()
+
+# Само колоните, към които сочат FOREIGN KEY-овете (таблиците не се създават тук)
+for _name in ("patients", "vaccines", "doctors"):
+    Table(_name, metadata, Column("id", Integer, primary_key=True))
+
+immunizations = Table(
+    "immunizations", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("patients.id", ondelete="CASCADE"), index=True),
+    Column("vaccine_id", Integer, ForeignKey("vaccines.id"), index=True),
+    Column("date_given", Date, nullable=False),
+    Column("doctor_id", Integer, ForeignKey("doctors.id")),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_immunizations_patient_vaccine", "patient_id", "vaccine_id"),
+)
+
+TABLES = [immunizations]
+
+
+async def _upgrade_postgresql(conn, table):
+    result = await conn.execute(text(
+        "SELECT con.conname FROM pg_constraint con "
+        "JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = ANY(con.conkey) "
+        "WHERE con.conrelid = CAST(:table AS regclass) AND con.contype = 'f' "
+        "AND att.attname = 'patient_id' AND con.confdeltype <> 'c'"
+    ), {"table": table.name})
+    for name in result.scalars().all():
+        await conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{name}"'))
+        await conn.execute(text(
+            f'ALTER TABLE {table.name} ADD CONSTRAINT "{name}" FOREIGN KEY (patient_id) '
+            "REFERENCES patients (id) ON DELETE CASCADE"
+        ))
+
+
+async def _upgrade_sqlite(conn, table):
+    # Колони: id, seq, table, from, to, on_update, on_delete, match
+    result = await conn.execute(text(f"PRAGMA foreign_key_list({table.name})"))
+    if all(row[6] == "CASCADE" for row in result if row[2] == "patients" and row[3] == "patient_id"):
+        return
+    for index in table.indexes:
+        await conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    await conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+    await conn.run_sync(lambda sync_conn: table.create(sync_conn))
+    columns = ", ".join(column.name for column in table.columns)
+    await conn.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old"))
+    await conn.execute(text(f"DROP TABLE {table.name}_old"))
+
+
+async def upgrade(conn):
+    for table in TABLES:
+        if conn.dialect.name == "postgresql":
+            await _upgrade_postgresql(conn, table)
+        elif conn.dialect.name == "sqlite":
+            await _upgrade_sqlite(conn, table)
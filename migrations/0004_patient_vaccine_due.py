@@ -0,0 +1,31 @@
+"""Таблица patient_vaccine_due с дължимите дати по пациент и ваксина.
+
+Попълва се за съществуващите пациенти от 0006 (заедно със състоянието в
+vaccine_due_state) и после се поддържа при всяка промяна на пациент,
+имунизация или каталог. Ръчно: `python manage.py rebuild-compliance`.
+"""
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, MetaData, Table
+
+metadata = MetaData()
+
+# Само колоните, към които сочат FOREIGN KEY-овете (таблиците не се създават тук)
+for _name in ("patients", "vaccines", "doctors"):
+    Table(_name, metadata, Column("id", Integer, primary_key=True))
+
+patient_vaccine_due = Table(
+    "patient_vaccine_due", metadata,
+    Column("patient_id", Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True),
+    Column("vaccine_id", Integer, ForeignKey("vaccines.id", ondelete="CASCADE"), primary_key=True),
+    Column("doctor_id", Integer, ForeignKey("doctors.id")),
+    Column("due_date", Date, nullable=False),
+    Column("given_date", Date),
+    Index("ix_patient_vaccine_due_doctor_open_due", "doctor_id", "given_date", "due_date"),
+    Index("ix_patient_vaccine_due_vaccine", "vaccine_id"),
+)
+
+TABLES = [patient_vaccine_due]
+
+
+async def upgrade(conn):
+    await conn.run_sync(lambda sync_conn: metadata.create_all(sync_conn, tables=TABLES, checkfirst=True))
+
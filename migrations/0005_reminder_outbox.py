@@ -0,0 +1,32 @@
+"""Таблица reminder_outbox за нощните напомняния за просрочени ваксини."""
+from sqlalchemy import (
+    Column, Date, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, UniqueConstraint, func,
+)
+
+metadata = MetaData()
+
+# Само колоната, към която сочи FOREIGN KEY-ът (таблицата не се създава тук)
+Table("doctors", metadata, Column("id", Integer, primary_key=True))
+
+reminder_outbox = Table(
+    "reminder_outbox", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("run_date", Date, nullable=False),
+    Column("doctor_id", Integer, ForeignKey("doctors.id", ondelete="CASCADE"), nullable=False),
+    Column("patient_count", Integer, nullable=False, default=0),
+    Column("overdue_count", Integer, nullable=False, default=0),
+    Column("payload", Text, nullable=False),
+    Column("status", String, nullable=False, default="pending"),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("last_error", String),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("sent_at", DateTime(timezone=True)),
+    UniqueConstraint("run_date", "doctor_id", name="uq_reminder_outbox_run_doctor"),
+    Index("ix_reminder_outbox_status_run_date", "status", "run_date"),
+)
+
+TABLES = [reminder_outbox]
+
+
+async def upgrade(conn):
+    await conn.run_sync(lambda sync_conn: metadata.create_all(sync_conn, tables=TABLES, checkfirst=True))
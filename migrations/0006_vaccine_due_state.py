@@ -0,0 +1,32 @@
+"""Таблица vaccine_due_state - по кой месец са сметнати редовете в patient_vaccine_due.
+
+Без ред за ваксината (или с друг месец, или ready=0) четенията смятат от
+имунизациите, вместо да вярват на patient_vaccine_due. Попълва се заедно с
+patient_vaccine_due веднага след миграцията (after_upgrade).
+Ръчно: `python manage.py rebuild-compliance`.
+"""
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, MetaData, Table
+
+metadata = MetaData()
+
+# Само колоната, към която сочи FOREIGN KEY-ът (таблицата не се създава тук)
+Table("vaccines", metadata, Column("id", Integer, primary_key=True))
+
+vaccine_due_state = Table(
+    "vaccine_due_state", metadata,
+    Column("vaccine_id", Integer, ForeignKey("vaccines.id", ondelete="CASCADE"), primary_key=True),
+    Column("first_due_month", Integer, nullable=False),
+    Column("ready", Boolean, nullable=False, default=False),
+)
+
+TABLES = [vaccine_due_state]
+
+
+async def upgrade(conn):
+    await conn.run_sync(lambda sync_conn: metadata.create_all(sync_conn, tables=TABLES, checkfirst=True))
+
+
+# Попълване за съществуващите пациенти - единственото място, което ползва кода на приложението
+async def after_upgrade(engine):
+    from utils import due_dates
+    await due_dates.rebuild_all(bind=engine)
@@ -0,0 +1,63 @@
+"""Версионирани миграции на схемата.
+
+Всеки модул NNNN_име.py в тази папка дефинира `async def upgrade(conn)`
+и по избор `async def after_upgrade(engine)` - попълване на данни с кода на
+приложението след commit на схемата.
+Приложените версии се пазят в таблица schema_migrations; всяка миграция
+се изпълнява в собствена транзакция. Миграциите са идемпотентни, за да
+минават и върху бази, създадени преди въвеждането на механизма.
+
+Схемата в миграциите не идва от models.py: всяка описва своите таблици и индекси
+такива, каквито са били тогава, иначе старите миграции биха създали
+днешната схема и следващите биха се прескочили.
+"""
+import importlib
+import pkgutil
+from typing import List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+# 📚 Всички миграции като (версия, име, модул), подредени по версия
+def discover() -> List[Tuple[int, str, object]]:
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        prefix, _, name = info.name.partition("_")
+        if prefix.isdigit():
+            found.append((int(prefix), name, importlib.import_module(f"{__name__}.{info.name}")))
+    return sorted(found, key=lambda item: item[0])
+
+
+async def applied_versions(engine: AsyncEngine) -> set:
+    async with engine.begin() as conn:
+        await conn.run_sync(_metadata.create_all)
+        result = await conn.execute(select(schema_migrations.c.version))
+        return set(result.scalars().all())
+
+
+# ⬆️ Прилага всички неприложени миграции; връща имената им
+async def upgrade(engine: AsyncEngine) -> List[str]:
+    done = await applied_versions(engine)
+    applied = []
+    for version, name, module in discover():
+        if version in done:
+            continue
+        async with engine.begin() as conn:
+            await module.upgrade(conn)
+        # Версията се записва след попълването - при грешка миграцията се пуска отново
+        if hasattr(module, "after_upgrade"):
+            await module.after_upgrade(engine)
+        async with engine.begin() as conn:
+            await conn.execute(schema_migrations.insert().values(version=version, name=name))
+        applied.append(f"{version:04d}_{name}")
+    return applied
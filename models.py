@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey, DateTime, Index, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -17,6 +17,11 @@ class Doctor(Base):
 # Пациенти
 class Patient(Base):
     __tablename__ = 'patients'
+    __table_args__ = (
+        # Списъци и keyset пагинация по лекар: WHERE doctor_id ORDER BY last_name, id
+        Index("ix_patients_doctor_last_name_id", "doctor_id", "last_name", "id"),
+        Index("ix_patients_doctor_birth_date", "doctor_id", "birth_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, nullable=False)
@@ -24,10 +29,17 @@ class Patient(Base):
     egn = Column(String, unique=True, nullable=False)
     birth_date = Column(Date, nullable=False)
 
-    doctor_id = Column(Integer, ForeignKey("doctors.id"))
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), index=True)
     doctor = relationship("Doctor", back_populates="patients")
 
-    immunizations = relationship("Immunization", back_populates="patient")
+    # Изтриването на пациент се каскадира от базата (ON DELETE CASCADE), без зареждане на децата
+    immunizations = relationship(
+        "Immunization", back_populates="patient", cascade="all, delete-orphan", passive_deletes=True
+    )
+    compliance = relationship(
+        "PatientCompliance", back_populates="patient", uselist=False,
+        cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 # Ваксини
@@ -45,10 +57,13 @@ class Vaccine(Base):
 # Поставени имунизации
 class Immunization(Base):
     __tablename__ = 'immunizations'
+    __table_args__ = (
+        Index("ix_immunizations_patient_vaccine", "patient_id", "vaccine_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"))
-    vaccine_id = Column(Integer, ForeignKey("vaccines.id"))
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), index=True)
+    vaccine_id = Column(Integer, ForeignKey("vaccines.id"), index=True)
     date_given = Column(Date, nullable=False)
     doctor_id = Column(Integer, ForeignKey("doctors.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -56,3 +71,63 @@ class Immunization(Base):
     patient = relationship("Patient", back_populates="immunizations")
     vaccine = relationship("Vaccine", back_populates="immunizations")
 
+
+# Обобщение на спазването на графика (поддържа се инкрементално)
+class PatientCompliance(Base):
+    __tablename__ = 'patient_compliance'
+
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True)
+    given_count = Column(Integer, nullable=False, default=0)
+    missing_count = Column(Integer, nullable=False, default=0)
+    next_due_date = Column(Date)  # кога става дължима следващата непоставена ваксина
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    patient = relationship("Patient", back_populates="compliance")
+
+
+# Дължими дати по пациент и ваксина (birth_date + recommended_month), поддържат се заедно с обобщението
+class PatientVaccineDue(Base):
+    __tablename__ = 'patient_vaccine_due'
+    __table_args__ = (
+        # Прогноза/просрочени по лекар: WHERE doctor_id AND given_date IS NULL AND due_date в интервал
+        Index("ix_patient_vaccine_due_doctor_open_due", "doctor_id", "given_date", "due_date"),
+        Index("ix_patient_vaccine_due_vaccine", "vaccine_id"),
+    )
+
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True)
+    vaccine_id = Column(Integer, ForeignKey("vaccines.id", ondelete="CASCADE"), primary_key=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"))
+    due_date = Column(Date, nullable=False)
+    given_date = Column(Date)  # първото поставяне; NULL докато ваксината не е поставена
+
+
+# По кой месец от раждането са сметнати редовете на ваксината в patient_vaccine_due
+# Четенията вярват на таблицата само ако състоянието съвпада с каталога и е ready
+class VaccineDueState(Base):
+    __tablename__ = 'vaccine_due_state'
+
+    vaccine_id = Column(Integer, ForeignKey("vaccines.id", ondelete="CASCADE"), primary_key=True)
+    first_due_month = Column(Integer, nullable=False)  # -1: ваксината не е дължима (няма редове)
+    ready = Column(Boolean, nullable=False, default=False)  # False докато преизчисляването тече
+
+
+# Нощни напомняния за просрочени ваксини: по един ред на лекар и дата
+# Редът е и checkpoint - прекъснато пускане продължава от лекарите без ред
+class ReminderOutbox(Base):
+    __tablename__ = 'reminder_outbox'
+    __table_args__ = (
+        UniqueConstraint("run_date", "doctor_id", name="uq_reminder_outbox_run_doctor"),
+        Index("ix_reminder_outbox_status_run_date", "status", "run_date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    run_date = Column(Date, nullable=False)
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="CASCADE"), nullable=False)
+    patient_count = Column(Integer, nullable=False, default=0)
+    overdue_count = Column(Integer, nullable=False, default=0)  # пациенти с поне една просрочена ваксина
+    payload = Column(Text, nullable=False)  # JSON: [{"patient_id", "vaccines": [...]}]
+    status = Column(String, nullable=False, default="pending")  # pending | sent | failed | empty
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
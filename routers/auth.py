@@ -1,30 +1,35 @@
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, status 
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 import hashlib
+import logging
 import os
+from typing import Union
 
 from models import Doctor
 from database import get_db
 from schemas import DoctorCreate, DoctorOut
+from utils.auth_cache import CachedDoctor, identity_cache
+from utils.password_pool import PoolSaturated, password_pool
+from utils.templates import templates
+
+logger = logging.getLogger(__name__)
 
 # Фиксиране на bcrypt проблема
 try:
     from passlib.context import CryptContext
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 except Exception as e:
-    print(f"Bcrypt error: {e}")
+    logger.error("Bcrypt error: %s", e)
     # Fallback към стандартен hashing ако bcrypt не работи
     import hashlib
     pwd_context = None
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
-templates = Jinja2Templates(directory="templates")
 
 # Настройки
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
@@ -43,7 +48,7 @@ def verify_password(plain_password, hashed_password):
             # Fallback към SHA256
             return hashlib.sha256(plain_password.encode()).hexdigest() == hashed_password
     except Exception as e:
-        print(f"Password verification error: {e}")
+        logger.error("Password verification error: %s", e)
         return False
 
 def get_password_hash(password):
@@ -54,10 +59,28 @@ def get_password_hash(password):
             # Fallback към SHA256
             return hashlib.sha256(password.encode()).hexdigest()
     except Exception as e:
-        print(f"Password hashing error: {e}")
+        logger.error("Password hashing error: %s", e)
         return hashlib.sha256(password.encode()).hexdigest()
 
 
+# ⚙️ Async версии - bcrypt се изпълнява в ограничения пул, не в event loop-а
+async def verify_password_async(plain_password, hashed_password):
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await password_pool.run(get_password_hash, password)
+
+
+OVERLOADED_MESSAGE = "Сървърът е претоварен, опитайте отново след малко"
+
+def _overloaded_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=OVERLOADED_MESSAGE,
+        headers={"Retry-After": "1"},
+    )
+
+
 # 🎟️ Генериране на JWT token
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -67,12 +90,17 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 
 # 👤 Dependency: вземи текущия логнат лекар (за API)
-async def get_current_doctor(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> Doctor:
+async def get_current_doctor(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> CachedDoctor:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Невалидни идентификационни данни",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Бърз път: вече проверен token без заявка към базата
+    cached = identity_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         doctor_id: int = payload.get("sub")
@@ -85,50 +113,56 @@ async def get_current_doctor(token: str = Depends(oauth2_scheme), db: AsyncSessi
     doctor = result.scalar_one_or_none()
     if doctor is None:
         raise credentials_exception
-    return doctor
+    return identity_cache.put(token, payload.get("exp"), doctor)
 
 
 # 👤 Dependency: вземи текущия логнат лекар (за Web) - ПОПРАВЕН
-async def get_current_doctor_web(request: Request, db: AsyncSession = Depends(get_db)) -> Doctor:
+async def get_current_doctor_web(
+    request: Request, db: AsyncSession = Depends(get_db)
+) -> Union[CachedDoctor, RedirectResponse]:
     """Web версия на get_current_doctor - проверява за token в cookie"""
     try:
         token = request.cookies.get("access_token")
-        print(f"Cookie token found: {token is not None}")  # Debug
+        logger.debug("Cookie token found: %s", token is not None)
         
         if not token:
-            print("No access_token cookie found")  # Debug
+            logger.debug("No access_token cookie found")
             return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
         
+        cached = identity_cache.get(token)
+        if cached is not None:
+            return cached
+        
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             doctor_id: int = payload.get("sub")
-            print(f"Doctor ID from token: {doctor_id}")  # Debug
+            logger.debug("Doctor ID from token: %s", doctor_id)
             
             if doctor_id is None:
-                print("No doctor_id in token")  # Debug
+                logger.debug("No doctor_id in token")
                 return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
                 
         except JWTError as e:
-            print(f"JWT decode error: {e}")  # Debug
+            logger.debug("JWT decode error: %s", e)
             return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
 
         result = await db.execute(select(Doctor).where(Doctor.id == int(doctor_id)))
         doctor = result.scalar_one_or_none()
         
         if doctor is None:
-            print(f"Doctor not found for ID: {doctor_id}")  # Debug
+            logger.debug("Doctor not found for ID: %s", doctor_id)
             return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
             
-        print(f"Doctor found: {doctor.username}")  # Debug
-        return doctor
+        logger.debug("Doctor found: %s", doctor.username)
+        return identity_cache.put(token, payload.get("exp"), doctor)
         
     except Exception as e:
-        print(f"General auth error: {e}")  # Debug
+        logger.warning("General auth error: %s", e)
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
 
 
 # Алтернативен web dependency, който хвърля HTTPException вместо да прави redirect
-async def get_current_doctor_web_strict(request: Request, db: AsyncSession = Depends(get_db)) -> Doctor:
+async def get_current_doctor_web_strict(request: Request, db: AsyncSession = Depends(get_db)) -> CachedDoctor:
     """Web версия на get_current_doctor - хвърля 401 ако няма автентификация"""
     token = request.cookies.get("access_token")
     
@@ -139,6 +173,10 @@ async def get_current_doctor_web_strict(request: Request, db: AsyncSession = Dep
             headers={"WWW-Authenticate": "Bearer"}
         )
     
+    cached = identity_cache.get(token)
+    if cached is not None:
+        return cached
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         doctor_id: int = payload.get("sub")
@@ -163,7 +201,7 @@ async def get_current_doctor_web_strict(request: Request, db: AsyncSession = Dep
             detail="Doctor not found",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    return doctor
+    return identity_cache.put(token, payload.get("exp"), doctor)
 
 
 # 📥 Регистрация на лекар (API)
@@ -176,7 +214,7 @@ async def register(doctor_data: DoctorCreate, db: AsyncSession = Depends(get_db)
         if existing_doctor:
             raise HTTPException(status_code=400, detail="Потребителското име вече съществува")
         
-        hashed_pw = get_password_hash(doctor_data.password)
+        hashed_pw = await get_password_hash_async(doctor_data.password)
         new_doctor = Doctor(username=doctor_data.username, hashed_password=hashed_pw)
         db.add(new_doctor)
         await db.commit()
@@ -184,9 +222,11 @@ async def register(doctor_data: DoctorCreate, db: AsyncSession = Depends(get_db)
         return new_doctor
     except HTTPException:
         raise
+    except PoolSaturated:
+        raise _overloaded_exception()
     except Exception as e:
         await db.rollback()
-        print(f"Register error: {e}")
+        logger.error("Register error: %s", e)
         raise HTTPException(status_code=500, detail="Грешка при регистрация")
 
 
@@ -197,15 +237,17 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
         result = await db.execute(select(Doctor).where(Doctor.username == form_data.username))
         doctor = result.scalar_one_or_none()
 
-        if not doctor or not verify_password(form_data.password, doctor.hashed_password):
+        if not doctor or not await verify_password_async(form_data.password, doctor.hashed_password):
             raise HTTPException(status_code=401, detail="Невалидно потребителско име или парола")
 
         access_token = create_access_token(data={"sub": str(doctor.id)})
         return {"access_token": access_token, "token_type": "bearer"}
     except HTTPException:
         raise
+    except PoolSaturated:
+        raise _overloaded_exception()
     except Exception as e:
-        print(f"Login API error: {e}")
+        logger.error("Login API error: %s", e)
         raise HTTPException(status_code=500, detail="Грешка при вход")
 
 
@@ -236,7 +278,7 @@ async def login_web(
         result = await db.execute(select(Doctor).where(Doctor.username == username))
         doctor = result.scalar_one_or_none()
 
-        if not doctor or not verify_password(password, doctor.hashed_password):
+        if not doctor or not await verify_password_async(password, doctor.hashed_password):
             return templates.TemplateResponse(
                 "login.html", 
                 {"request": request, "error": "Невалидно потребителско име или парола"}
@@ -244,7 +286,7 @@ async def login_web(
 
         # Създаваме JWT token
         access_token = create_access_token(data={"sub": str(doctor.id)})
-        print(f"Creating token for doctor {doctor.id}: {access_token[:20]}...")  # Debug
+        logger.debug("Creating token for doctor %s", doctor.id)
         
         # Пренасочваме към dashboard с token в cookie
         response = RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
@@ -256,11 +298,18 @@ async def login_web(
             samesite="lax",
             secure=False  # За development; в production задайте True
         )
-        print(f"Setting cookie for doctor {doctor.username}")  # Debug
+        logger.debug("Setting cookie for doctor %s", doctor.username)
         return response
         
+    except PoolSaturated:
+        return templates.TemplateResponse(
+            "login.html",
+            {"request": request, "error": OVERLOADED_MESSAGE},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
-        print(f"Web login error: {e}")
+        logger.error("Web login error: %s", e)
         return templates.TemplateResponse(
             "login.html", 
             {"request": request, "error": "Грешка при вход в системата"}
@@ -285,7 +334,7 @@ async def register_web(
                 {"request": request, "error": "Потребителското име вече съществува"}
             )
         
-        hashed_pw = get_password_hash(password)
+        hashed_pw = await get_password_hash_async(password)
         new_doctor = Doctor(username=username, hashed_password=hashed_pw)
         db.add(new_doctor)
         await db.commit()
@@ -304,8 +353,15 @@ async def register_web(
         )
         return response
         
+    except PoolSaturated:
+        return templates.TemplateResponse(
+            "register.html",
+            {"request": request, "error": OVERLOADED_MESSAGE},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
-        print(f"Web register error: {e}")
+        logger.error("Web register error: %s", e)
         await db.rollback()
         return templates.TemplateResponse(
             "register.html", 
@@ -315,7 +371,8 @@ async def register_web(
 
 # 🚪 Logout
 @router.post("/logout")
-async def logout():
+async def logout(request: Request):
+    identity_cache.forget_token(request.cookies.get("access_token"))
     response = RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie("access_token")
     return response
@@ -323,7 +380,8 @@ async def logout():
 
 # GET версия на logout за директно извикване
 @router.get("/logout")
-async def logout_get():
+async def logout_get(request: Request):
+    identity_cache.forget_token(request.cookies.get("access_token"))
     response = RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie("access_token")
     return response
\ No newline at end of file
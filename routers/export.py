@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from utils.auth_cache import CachedDoctor
+from routers.auth import get_current_doctor
+from utils.export import MEDIA_TYPES, available_formats, iter_export
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+# 📤 Пълен експорт на пациентите и имунизациите на лекаря (csv, ndjson или parquet)
+@router.get("/registry")
+async def export_registry(
+    format: str = "csv",
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
+):
+    if format not in available_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неподдържан формат. Налични: {', '.join(available_formats())}"
+        )
+
+    return StreamingResponse(
+        iter_export(current_doctor.id, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="registry.{format}"'}
+    )
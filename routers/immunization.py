@@ -1,21 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
+import logging
 
-from models import Immunization, Patient, Vaccine, Doctor
+from models import Immunization, Patient, Vaccine
 from database import get_db
-from schemas import ImmunizationCreate, ImmunizationOut
+from schemas import ImmunizationCreate, ImmunizationOut, ImportReportOut
+from utils.auth_cache import CachedDoctor
 from routers.auth import get_current_doctor
+from utils.fastjson import FastJSONResponse, rows_as_dicts
+from utils.queries import patient_immunization_rows
+from utils.compliance import refresh_patients
+from utils.ingest import ImportReport, detect_format, iter_batches, iter_records, validation_message
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/immunizations", tags=["Immunizations"])
 
+IMMUNIZATION_COLUMNS = ("id", "patient_id", "vaccine_id", "date_given", "doctor_id")
+
 # 📥 Поставяне на нова имунизация
 @router.post("/", response_model=ImmunizationOut, status_code=status.HTTP_201_CREATED)
 async def create_immunization(
     immunization: ImmunizationCreate,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
     # Проверка: дали пациентът е на този лекар
     result = await db.execute(select(Patient).where(Patient.id == immunization.patient_id))
@@ -36,6 +48,8 @@ async def create_immunization(
         doctor_id=current_doctor.id
     )
     db.add(new_immunization)
+    await db.flush()
+    await refresh_patients(db, [immunization.patient_id])
     await db.commit()
     await db.refresh(new_immunization)
     return new_immunization
@@ -45,12 +59,85 @@ async def create_immunization(
 async def get_immunizations_for_patient(
     patient_id: int,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
-    result = await db.execute(select(Patient).where(Patient.id == patient_id))
-    patient = result.scalar_one_or_none()
-    if not patient or patient.doctor_id != current_doctor.id:
+    # Една заявка: проверка на достъпа + само колоните на ImmunizationOut
+    rows = (await db.execute(patient_immunization_rows(patient_id, current_doctor.id))).all()
+    if not rows:
         raise HTTPException(status_code=403, detail="Нямате достъп до този пациент")
 
-    result = await db.execute(select(Immunization).where(Immunization.patient_id == patient_id))
-    return result.scalars().all()
+    return FastJSONResponse(rows_as_dicts(IMMUNIZATION_COLUMNS, (row for row in rows if row[0] is not None)))
+
+# 📦 Масово въвеждане на имунизации от CSV или NDJSON поток
+# Колони/полета: patient_id, vaccine_id, date_given (YYYY-MM-DD)
+# Всяка пачка (INGEST_BATCH_SIZE реда) е една транзакция: грешка на базата при запис отхвърля
+# всички валидни редове на пачката с "Грешка при запис в базата" - те могат да се подадат отново
+@router.post("/bulk", response_model=ImportReportOut)
+async def bulk_create_immunizations(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
+):
+    fmt = detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Поддържат се само text/csv и application/x-ndjson")
+
+    report = ImportReport()
+    async for batch in iter_batches(iter_records(request.stream(), fmt)):
+        await _ingest_immunization_batch(db, batch, current_doctor.id, report)
+    return report.as_dict()
+
+
+async def _ingest_immunization_batch(db: AsyncSession, batch, doctor_id: int, report: ImportReport):
+    valid = []
+    for row, record in batch:
+        report.processed += 1
+        if isinstance(record, str):
+            report.error(row, record)
+            continue
+        try:
+            valid.append((row, ImmunizationCreate(**record)))
+        except ValidationError as e:
+            report.error(row, validation_message(e))
+
+    if not valid:
+        return
+
+    # Проверки на цялата пачка с по една заявка
+    patient_ids = {imm.patient_id for _, imm in valid}
+    vaccine_ids = {imm.vaccine_id for _, imm in valid}
+    result = await db.execute(
+        select(Patient.id).where(Patient.id.in_(patient_ids), Patient.doctor_id == doctor_id)
+    )
+    owned = set(result.scalars().all())
+    result = await db.execute(select(Vaccine.id).where(Vaccine.id.in_(vaccine_ids)))
+    existing = set(result.scalars().all())
+
+    rows = []
+    for row, imm in valid:
+        if imm.patient_id not in owned:
+            report.error(row, "Нямате достъп до този пациент")
+        elif imm.vaccine_id not in existing:
+            report.error(row, "Ваксината не съществува")
+        else:
+            rows.append((row, {
+                "patient_id": imm.patient_id,
+                "vaccine_id": imm.vaccine_id,
+                "date_given": imm.date_given,
+                "doctor_id": doctor_id,
+            }))
+
+    if not rows:
+        await db.rollback()
+        return
+
+    try:
+        await db.execute(insert(Immunization), [values for _, values in rows])
+        await refresh_patients(db, {values["patient_id"] for _, values in rows})
+        await db.commit()
+        report.inserted += len(rows)
+    except Exception as e:
+        logger.error("Bulk immunization batch error: %s", e)
+        await db.rollback()
+        for row, _ in rows:
+            report.error(row, "Грешка при запис в базата")
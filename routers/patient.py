@@ -1,13 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import ValidationError
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List
-from utils.schedule import calculate_age_in_months, required_mandatory_vaccines
-from models import Patient, Doctor, Vaccine, Immunization
+from sqlalchemy.orm import joinedload
+from datetime import date
+from typing import List, Optional
+import logging
+from utils.catalog import CatalogSnapshot, get_catalog
+from utils.fastjson import FastJSONResponse
+from utils.queries import (
+    load_patient_summary_rows, load_patient_with_immunizations, patient_overdue_rows, remove_patients
+)
+from utils.compliance import refresh_patients
+from utils import due_dates
+from utils.due_dates import special_vaccine_ids
+from utils.schedule import calculate_age_in_months, required_for_age
+from utils.ingest import ImportReport, detect_format, iter_batches, iter_records, validation_message
+from models import Patient
 from database import get_db
-from schemas import PatientCreate, PatientOut
+from schemas import BulkDeleteOut, ImportReportOut, PatientCreate, PatientIdsIn, PatientOut, PatientSummaryOut
+from utils.auth_cache import CachedDoctor
 from routers.auth import get_current_doctor  # 👈 добавяме зависимостта
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/patients", tags=["Patients"])
 
 # 📥 Създаване на пациент (автоматично се свързва с логнатия лекар)
@@ -15,7 +32,7 @@ router = APIRouter(prefix="/patients", tags=["Patients"])
 async def create_patient(
     patient: PatientCreate,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
     new_patient = Patient(
     **patient.dict(exclude={"doctor_id"}),
@@ -23,27 +40,135 @@ async def create_patient(
 )
 
     db.add(new_patient)
+    await db.flush()
+    await refresh_patients(db, [new_patient.id])
     await db.commit()
     await db.refresh(new_patient)
     return new_patient
 
-# 📋 Взимане на всички пациенти на логнатия лекар
-@router.get("/", response_model=List[PatientOut])
+# 📦 Масов импорт на пациенти от CSV или NDJSON поток
+# Колони/полета: first_name, last_name, egn, birth_date (YYYY-MM-DD)
+@router.post("/bulk", response_model=ImportReportOut)
+async def bulk_create_patients(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
+):
+    fmt = detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Поддържат се само text/csv и application/x-ndjson")
+
+    report = await import_patients(db, request.stream(), fmt, current_doctor.id)
+    return report.as_dict()
+
+
+# 🧮 Импорт на пациенти на пачки (използва се и от web upload-а)
+async def import_patients(db: AsyncSession, chunks, fmt: str, doctor_id: int) -> ImportReport:
+    report = ImportReport()
+    async for batch in iter_batches(iter_records(chunks, fmt)):
+        await _ingest_patient_batch(db, batch, doctor_id, report)
+    return report
+
+
+async def _ingest_patient_batch(db: AsyncSession, batch, doctor_id: int, report: ImportReport):
+    valid = {}
+    for row, record in batch:
+        report.processed += 1
+        if isinstance(record, str):
+            report.error(row, record)
+            continue
+        try:
+            patient = PatientCreate(**record)
+        except ValidationError as e:
+            report.error(row, validation_message(e))
+            continue
+        if patient.egn in valid:
+            report.error(row, f"ЕГН {patient.egn} се повтаря във файла (ред {valid[patient.egn][0]})")
+            continue
+        valid[patient.egn] = (row, patient)
+
+    if not valid:
+        return
+
+    # Уникалност на ЕГН за цялата пачка с една заявка
+    result = await db.execute(select(Patient.egn).where(Patient.egn.in_(list(valid))))
+    for egn in result.scalars().all():
+        row, _ = valid.pop(egn)
+        report.error(row, f"Пациент с ЕГН {egn} вече съществува")
+
+    if not valid:
+        return
+
+    rows = [
+        {**patient.dict(exclude={"doctor_id"}), "doctor_id": doctor_id}
+        for _, patient in valid.values()
+    ]
+    try:
+        result = await db.execute(insert(Patient).returning(Patient.id), rows)
+        await refresh_patients(db, result.scalars().all())
+        await db.commit()
+        report.inserted += len(rows)
+    except Exception as e:
+        logger.error("Bulk patient batch error: %s", e)
+        await db.rollback()
+        for row, _ in valid.values():
+            report.error(row, "Грешка при запис в базата")
+
+
+# Размер на страницата, когато е подаден само курсор
+PATIENTS_PAGE_SIZE = 100
+
+
+# 📋 Пациентите на логнатия лекар, подредени по (фамилия, id)
+# Без after/limit - всички (както досега); с тях - keyset страница,
+# а курсорът за следващата страница се връща в хедъра X-Next-Cursor
+@router.get("/", response_model=List[PatientSummaryOut])
 async def get_my_patients(
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    born_from: Optional[date] = None,
+    born_to: Optional[date] = None,
+    name_prefix: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
-    result = await db.execute(select(Patient).where(Patient.doctor_id == current_doctor.id))
-    return result.scalars().all()
+    if after and limit is None:
+        limit = PATIENTS_PAGE_SIZE
+    # Само нужните колони като редове, сериализирани директно (без ORM обекти и pydantic)
+    try:
+        rows, next_cursor = await load_patient_summary_rows(
+            db, current_doctor.id, limit,
+            after=after, born_from=born_from, born_to=born_to, name_prefix=name_prefix
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse([_patient_summary(row) for row in rows], headers=headers)
+
+
+def _patient_summary(row) -> dict:
+    patient_id, first_name, last_name, egn, birth_date, doctor_id, given_count, missing_count, next_due_date = row
+    return {
+        "id": patient_id, "first_name": first_name, "last_name": last_name, "egn": egn,
+        "birth_date": birth_date, "doctor_id": doctor_id,
+        "compliance": None if given_count is None else {
+            "given_count": given_count, "missing_count": missing_count, "next_due_date": next_due_date,
+        },
+    }
 
 # 🔍 Взимане на конкретен пациент, ако е на текущия лекар
-@router.get("/{patient_id}", response_model=PatientOut)
+@router.get("/{patient_id}", response_model=PatientSummaryOut)
 async def get_patient(
     patient_id: int,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
-    result = await db.execute(select(Patient).where(Patient.id == patient_id, Patient.doctor_id == current_doctor.id))
+    result = await db.execute(
+        select(Patient)
+        .options(joinedload(Patient.compliance))
+        .where(Patient.id == patient_id, Patient.doctor_id == current_doctor.id)
+    )
     patient = result.scalar_one_or_none()
     if not patient:
         raise HTTPException(status_code=404, detail="Пациентът не е намерен или не принадлежи на този лекар")
@@ -55,7 +180,7 @@ async def update_patient(
     patient_id: int,
     updated: PatientCreate,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
     result = await db.execute(select(Patient).where(Patient.id == patient_id, Patient.doctor_id == current_doctor.id))
     patient = result.scalar_one_or_none()
@@ -65,6 +190,8 @@ async def update_patient(
     for key, value in updated.dict().items():
         setattr(patient, key, value)
 
+    await db.flush()
+    await refresh_patients(db, [patient.id])
     await db.commit()
     await db.refresh(patient)
     return patient
@@ -74,41 +201,48 @@ async def update_patient(
 async def delete_patient(
     patient_id: int,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
-    result = await db.execute(select(Patient).where(Patient.id == patient_id, Patient.doctor_id == current_doctor.id))
-    patient = result.scalar_one_or_none()
-    if not patient:
+    # Една DELETE заявка; имунизациите и обобщението се трият каскадно от базата
+    deleted = await remove_patients(db, current_doctor.id, [patient_id])
+    if not deleted:
         raise HTTPException(status_code=404, detail="Нямате достъп до този пациент")
+    await db.commit()
 
-    await db.delete(patient)
+# 🗑️ Масово изтриване на пациенти на текущия лекар в една транзакция
+@router.post("/bulk-delete", response_model=BulkDeleteOut)
+async def bulk_delete_patients(
+    payload: PatientIdsIn,
+    db: AsyncSession = Depends(get_db),
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
+):
+    ids = sorted(set(payload.ids))
+    deleted = await remove_patients(db, current_doctor.id, ids)
     await db.commit()
+    removed = set(deleted)
+    return {"deleted": sorted(removed), "not_found": [i for i in ids if i not in removed]}
 
 @router.get("/{patient_id}/missing-vaccines", response_model=List[str])
 async def get_missing_vaccines(
     patient_id: int,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor),
+    catalog: CatalogSnapshot = Depends(get_catalog)
 ):
-    # Проверка на достъп
-    result = await db.execute(select(Patient).where(Patient.id == patient_id))
-    patient = result.scalar_one_or_none()
-    if not patient or patient.doctor_id != current_doctor.id:
+    # Една индексирана заявка в patient_vaccine_due (заедно с проверката на достъп)
+    stmt = patient_overdue_rows(
+        patient_id, current_doctor.id, date.today(), special_vaccine_ids(catalog), due_dates.catalog_due_months(catalog)
+    )
+    rows = (await db.execute(stmt)).all()
+    if not rows:
         raise HTTPException(status_code=403, detail="Нямате достъп до този пациент")
 
-    age_months = calculate_age_in_months(patient.birth_date)
-
-    # Всички ваксини
-    result = await db.execute(select(Vaccine))
-    all_vaccines = result.scalars().all()
-
-    # Задължителни според възраст
-    required = required_mandatory_vaccines(age_months, all_vaccines)
-
-    # Вече поставени ваксини
-    result = await db.execute(select(Immunization).where(Immunization.patient_id == patient_id))
-    given_ids = {imm.vaccine_id for imm in result.scalars().all()}
+    # Таблицата още не е попълнена за пациента или не е сметната по този каталог (преизчисляване
+    # в ход, неуспешно или пуснато от друг процес) - смятаме от имунизациите
+    if not rows[0][1] or not rows[0][2]:
+        patient = await load_patient_with_immunizations(db, patient_id, current_doctor.id)
+        given_ids = {i.vaccine_id for i in patient.immunizations}
+        required = required_for_age(calculate_age_in_months(patient.birth_date), catalog.compiled)
+        return [v.name for v in required if v.id not in given_ids]
 
-    # Ваксини, които липсват
-    missing = [v.name for v in required if v.id not in given_ids]
-    return missing
+    return [v.name for v in due_dates.overdue_vaccines([row[0] for row in rows], catalog)]
@@ -1,34 +1,201 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List, Dict
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional
+from collections import Counter
+import json
+import os
 
-from database import get_db
-from models import Patient, Vaccine, Immunization, Doctor
+import numpy as np
+
+from database import AsyncSessionLocal, get_db
+from schemas import ForecastOut, OverdueOut
 from routers.auth import get_current_doctor
-from utils.schedule import calculate_age_in_months, required_mandatory_vaccines
+from utils.auth_cache import CachedDoctor
+from utils.catalog import CatalogSnapshot, get_catalog
+from utils import due_dates
+from utils.due_dates import special_vaccine_ids
+from utils.fastjson import FastJSONResponse
+from utils.http_cache import cache_headers, is_conditional, is_not_modified, latest, make_etag, not_modified
+from utils.queries import (
+    doctor_overdue_rows, due_counts_by_date, due_forecast, iter_patient_chunks, load_patient_with_immunizations, patient_schedule_version
+)
+from utils.schedule import (
+    ages_in_months, calculate_age_in_months, due_matrix, given_matrix, required_for_age, special_window_births
+)
 
 router = APIRouter(prefix="/schedule", tags=["Schedule"])
 
+# Брой пациенти, които се изчисляват наведнъж при стрийминг
+SCHEDULE_STREAM_CHUNK = int(os.getenv("SCHEDULE_STREAM_CHUNK", 1000))
+# Граници на прогнозата
+FORECAST_MAX_WEEKS = 52
+FORECAST_MAX_ITEMS = 10000
+
+
+# 📊 NDJSON редове (patient_id, given, missing) за всички пациенти на лекаря
+async def _compliance_ndjson(doctor_id: int, catalog: CatalogSnapshot):
+    names = [v.name for v in catalog.vaccines]
+    today = date.today()
+    # Собствена сесия: стриймът продължава след като request dependency-тата са затворени
+    async with AsyncSessionLocal() as db:
+        async for ids, birth_dates, given in iter_patient_chunks(db, doctor_id, SCHEDULE_STREAM_CHUNK):
+            given_m = given_matrix(given, catalog.compiled)
+            missing_m = due_matrix(ages_in_months(birth_dates, today), catalog.compiled) & ~given_m
+            lines = [
+                json.dumps({
+                    "patient_id": patient_id,
+                    "given": [names[col] for col in np.flatnonzero(given_row)],
+                    "missing": [names[col] for col in np.flatnonzero(missing_row)],
+                }, ensure_ascii=False)
+                for patient_id, given_row, missing_row in zip(ids, given_m, missing_m)
+            ]
+            yield "\n".join(lines) + "\n"
+
+
+@router.get("/")
+async def get_doctor_compliance(
+    current_doctor: CachedDoctor = Depends(get_current_doctor),
+    catalog: CatalogSnapshot = Depends(get_catalog)
+):
+    return StreamingResponse(
+        _compliance_ndjson(current_doctor.id, catalog),
+        media_type="application/x-ndjson"
+    )
+
+
+# 🔮 Кои пациенти за коя ваксина стават дължими в следващите седмици + натоварване по седмици
+# Чете предварително изчислените дати от patient_vaccine_due (range scan по индекса),
+# а докато таблицата изостава от каталога - смята от имунизациите
+@router.get("/forecast", response_model=ForecastOut)
+async def get_due_forecast(
+    start: Optional[date] = None,
+    weeks: int = Query(4, ge=1, le=FORECAST_MAX_WEEKS),
+    limit: int = Query(1000, ge=1, le=FORECAST_MAX_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    current_doctor: CachedDoctor = Depends(get_current_doctor),
+    catalog: CatalogSnapshot = Depends(get_catalog)
+):
+    start = start or date.today()
+    end = start + timedelta(weeks=weeks)
+    if await due_dates.table_current(db, catalog):
+        rows = (await db.execute(due_forecast(current_doctor.id, start, end, limit))).all()
+        counts = (await db.execute(due_counts_by_date(current_doctor.id, start, end))).all()
+    else:
+        # Таблицата не е сметната по този каталог - смятаме от имунизациите
+        live = [
+            d for d in await due_dates.live_doctor_due(db, current_doctor.id, catalog)
+            if d.given_date is None and start <= d.due_date < end
+        ]
+        rows = [d[:5] for d in live[:limit + 1]]
+        counts = Counter(d.due_date for d in live).items()
+
+    # Седмиците започват в понеделник; празните седмици също се връщат (с 0)
+    weekly = {}
+    week = start - timedelta(days=start.weekday())
+    while week < end:
+        weekly[week] = 0
+        week += timedelta(weeks=1)
+    for due_date, count in counts:
+        weekly[due_date - timedelta(days=due_date.weekday())] += count
+
+    return FastJSONResponse({
+        "start": start,
+        "end": end,
+        "total": sum(weekly.values()),
+        "truncated": len(rows) > limit,
+        "items": _due_items(rows[:limit], catalog),
+        "weekly": [{"week_start": week, "count": count} for week, count in weekly.items()],
+    })
+
+
+# ⏰ Просрочените ваксини на всички пациенти на лекаря (индексирано търсене в patient_vaccine_due)
+@router.get("/overdue", response_model=OverdueOut)
+async def get_overdue(
+    as_of: Optional[date] = None,
+    limit: int = Query(1000, ge=1, le=FORECAST_MAX_ITEMS),
+    db: AsyncSession = Depends(get_db),
+    current_doctor: CachedDoctor = Depends(get_current_doctor),
+    catalog: CatalogSnapshot = Depends(get_catalog)
+):
+    as_of = as_of or date.today()
+    special_ids = special_vaccine_ids(catalog)
+    if await due_dates.table_current(db, catalog):
+        rows = (await db.execute(doctor_overdue_rows(current_doctor.id, as_of, special_ids, limit))).all()
+    else:
+        # Таблицата не е сметната по този каталог - смятаме от имунизациите
+        born_from, born_to = special_window_births(as_of)
+        rows = [
+            d[:5] for d in await due_dates.live_doctor_due(db, current_doctor.id, catalog)
+            if d.given_date is None and d.due_date <= as_of
+            and (not born_from <= d.birth_date < born_to or d.vaccine_id in special_ids)
+        ][:limit + 1]
+    return FastJSONResponse({
+        "as_of": as_of,
+        "truncated": len(rows) > limit,
+        "items": _due_items(rows[:limit], catalog),
+    })
+
+
+def _due_items(rows, catalog: CatalogSnapshot) -> List[dict]:
+    names = {v.id: v.name for v in catalog.vaccines}
+    return [
+        {
+            "patient_id": patient_id, "first_name": first_name, "last_name": last_name,
+            "vaccine_id": vaccine_id, "vaccine": names.get(vaccine_id, ""), "due_date": due_date,
+        }
+        for patient_id, first_name, last_name, vaccine_id, due_date in rows
+    ]
+
+
+# 🏷️ ETag и Last-Modified на графика: зависи от каталога, датата, рождената дата и имунизациите
+# Стойностите са същите като на patient_schedule_version, за да съвпада ETag-ът в двата пътя
+def _schedule_validators(catalog: CatalogSnapshot, birth_date, given_count, last_given, compliance_updated):
+    today = date.today()
+    etag = make_etag("schedule", catalog.digest, today, birth_date, given_count, last_given)
+    last_modified = latest(
+        last_given, compliance_updated, catalog.loaded_at, datetime.combine(today, datetime.min.time()).astimezone()
+    )
+    return etag, last_modified
+
+
 @router.get("/{patient_id}", response_model=Dict[str, List[str]])
 async def get_patient_schedule(
     patient_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor),
+    catalog: CatalogSnapshot = Depends(get_catalog)
 ):
-    result = await db.execute(select(Patient).where(Patient.id == patient_id))
-    patient = result.scalar_one_or_none()
-    if not patient or patient.doctor_id != current_doctor.id:
+    # Условна заявка: евтината проверка на версията спестява зареждането на пациента при 304
+    if is_conditional(request):
+        version = (await db.execute(patient_schedule_version(patient_id, current_doctor.id))).first()
+        if version is None:
+            raise HTTPException(status_code=403, detail="Нямате достъп до този пациент")
+        etag, last_modified = _schedule_validators(catalog, *version)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+
+    # Иначе едно отиване до базата - валидаторите се смятат от заредения пациент
+    patient = await load_patient_with_immunizations(db, patient_id, current_doctor.id, with_compliance=True)
+    if not patient:
         raise HTTPException(status_code=403, detail="Нямате достъп до този пациент")
+    etag, last_modified = _schedule_validators(
+        catalog,
+        patient.birth_date,
+        len(patient.immunizations),
+        max((i.created_at for i in patient.immunizations if i.created_at is not None), default=None),
+        patient.compliance.updated_at if patient.compliance is not None else None,
+    )
+    response.headers.update(cache_headers(etag, last_modified))
 
     age_months = calculate_age_in_months(patient.birth_date)
-    result = await db.execute(select(Vaccine))
-    all_vaccines = result.scalars().all()
-    required = required_mandatory_vaccines(age_months, all_vaccines)
+    all_vaccines = catalog.vaccines
+    required = required_for_age(age_months, catalog.compiled)
 
-    result = await db.execute(select(Immunization).where(Immunization.patient_id == patient_id))
-    given = result.scalars().all()
-    given_ids = {i.vaccine_id for i in given}
+    given_ids = {i.vaccine_id for i in patient.immunizations}
 
     given_names = [v.name for v in all_vaccines if v.id in given_ids]
     missing_names = [v.name for v in required if v.id not in given_ids]
@@ -1,34 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
 
 from database import get_db
-from models import Vaccine, Doctor
+from models import Vaccine
 from schemas import VaccineCreate, VaccineOut
+from utils.auth_cache import CachedDoctor
 from routers.auth import get_current_doctor
+from utils.catalog import CatalogSnapshot, catalog_cache, get_catalog
+from utils import due_dates
+from utils.compliance import rebuild_in_background
+from utils.fastjson import dumps
+from utils.http_cache import cache_headers, is_not_modified, make_etag, not_modified
 
 router = APIRouter(prefix="/vaccines", tags=["Vaccines"])
 
-# 📋 Връща всички ваксини
+# 📋 Връща всички ваксини (304 при непроменен каталог)
 @router.get("/", response_model=List[VaccineOut])
 async def get_all_vaccines(
-    db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    request: Request,
+    catalog: CatalogSnapshot = Depends(get_catalog),
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
-    result = await db.execute(select(Vaccine))
-    return result.scalars().all()
+    etag = make_etag("vaccines", catalog.digest)
+    if is_not_modified(request, etag, catalog.loaded_at):
+        return not_modified(etag, catalog.loaded_at)
+    return Response(
+        _vaccines_body(catalog), media_type="application/json", headers=cache_headers(etag, catalog.loaded_at)
+    )
+
+
+# JSON на каталога се сериализира веднъж за всяка версия на каталога
+_encoded_catalog = (None, b"")
+
+
+def _vaccines_body(catalog: CatalogSnapshot) -> bytes:
+    global _encoded_catalog
+    digest, body = _encoded_catalog
+    if digest != catalog.digest:
+        body = dumps([vaccine._asdict() for vaccine in catalog.vaccines])
+        _encoded_catalog = (catalog.digest, body)
+    return body
 
 # ➕ Добавяне на ваксина 
 @router.post("/", response_model=VaccineOut, status_code=status.HTTP_201_CREATED)
 async def create_vaccine(
     vaccine: VaccineCreate,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
     new_vaccine = Vaccine(**vaccine.dict())
     db.add(new_vaccine)
     await db.commit()
+    catalog_cache.invalidate()
+    background_tasks.add_task(rebuild_in_background)
+    background_tasks.add_task(due_dates.rebuild_in_background, [new_vaccine.id])
     await db.refresh(new_vaccine)
     return new_vaccine
 
@@ -36,8 +64,9 @@ async def create_vaccine(
 @router.delete("/{vaccine_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_vaccine(
     vaccine_id: int,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
-    current_doctor: Doctor = Depends(get_current_doctor)
+    current_doctor: CachedDoctor = Depends(get_current_doctor)
 ):
     result = await db.execute(select(Vaccine).where(Vaccine.id == vaccine_id))
     vaccine = result.scalar_one_or_none()
@@ -45,3 +74,6 @@ async def delete_vaccine(
         raise HTTPException(status_code=404, detail="Ваксината не е намерена")
     await db.delete(vaccine)
     await db.commit()
+    catalog_cache.invalidate()
+    # Дължимите дати на ваксината падат по ON DELETE CASCADE, обобщението се преизчислява
+    background_tasks.add_task(rebuild_in_background)
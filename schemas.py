@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 
 
 # --- Doctor ---
@@ -33,6 +33,26 @@ class PatientOut(BaseModel):
     class Config:
         orm_mode = True
 
+class ComplianceOut(BaseModel):
+    given_count: int
+    missing_count: int
+    next_due_date: Optional[date]
+    class Config:
+        orm_mode = True
+
+class PatientSummaryOut(PatientOut):
+    compliance: Optional[ComplianceOut]
+
+# Най-много пациенти в една заявка за масово изтриване
+BULK_DELETE_MAX = 10000
+
+class PatientIdsIn(BaseModel):
+    ids: conlist(int, min_items=1, max_items=BULK_DELETE_MAX)
+
+class BulkDeleteOut(BaseModel):
+    deleted: List[int]
+    not_found: List[int]
+
 
 # --- Vaccine ---
 class VaccineCreate(BaseModel):
@@ -64,6 +84,43 @@ class ImmunizationOut(BaseModel):
     class Config:
         orm_mode = True
 
+# --- Forecast ---
+class ForecastItemOut(BaseModel):
+    patient_id: int
+    first_name: str
+    last_name: str
+    vaccine_id: int
+    vaccine: str
+    due_date: date
+
+class WeeklyLoadOut(BaseModel):
+    week_start: date  # понеделник
+    count: int
+
+class ForecastOut(BaseModel):
+    start: date
+    end: date  # изключително
+    total: int
+    truncated: bool
+    items: List[ForecastItemOut]
+    weekly: List[WeeklyLoadOut]
+
+class OverdueOut(BaseModel):
+    as_of: date
+    truncated: bool
+    items: List[ForecastItemOut]
+
+# --- Bulk import ---
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReportOut(BaseModel):
+    processed: int
+    inserted: int
+    error_count: int
+    errors: List[ImportRowError]
+
 class Token(BaseModel):
     access_token: str
     token_type: str
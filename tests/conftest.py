@@ -0,0 +1,63 @@
+import httpx
+import pytest
+
+import main
+from database import Base, engine
+from utils.auth_cache import identity_cache
+from utils.catalog import catalog_cache
+from utils.templates import fragment_cache
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+# 🗄️ Празна схема и празни in-process кешове за всеки тест
+@pytest.fixture
+async def database():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    catalog_cache.invalidate()
+    identity_cache.clear()
+    fragment_cache.clear()
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(database):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+# 🔑 Регистриран лекар и Authorization хедър за API-то
+@pytest.fixture
+async def auth_headers(client):
+    await client.post("/auth/register", json={"username": "doctor", "password": "secret"})
+    response = await client.post("/auth/token", data={"username": "doctor", "password": "secret"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+# 👶 Каталог, пациент на 2 години и една поставена ваксина
+@pytest.fixture
+async def patient(client, auth_headers):
+    for name, month in (("BCG", 0), ("HepB", 1), ("DTP", 2), ("MMR", 13)):
+        await client.post("/vaccines/", json={"name": name, "recommended_month": month}, headers=auth_headers)
+    response = await client.post("/patients/", headers=auth_headers, json={
+        "first_name": "Иван", "last_name": "Петров", "egn": "2341010000", "birth_date": "2023-01-10",
+    })
+    patient = response.json()
+    await client.post("/immunizations/", headers=auth_headers, json={
+        "patient_id": patient["id"], "vaccine_id": 1, "date_given": "2023-01-11",
+    })
+    return patient
+
+
+# 🍪 Cookie за web страниците
+@pytest.fixture
+async def web_login(client, auth_headers):
+    response = await client.post("/auth/login", data={"username": "doctor", "password": "secret"})
+    client.cookies.set("access_token", response.cookies.get("access_token"))
@@ -0,0 +1,21 @@
+import pytest
+
+from routers.auth import get_current_doctor
+from utils.auth_cache import CachedDoctor
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_me_served_from_identity_cache(client, auth_headers, sql_queries):
+    assert (await client.get("/doctors/me", headers=auth_headers)).json()["username"] == "doctor"
+
+    with sql_queries(max_queries=0):
+        response = await client.get("/doctors/me", headers=auth_headers)
+    assert response.json() == {"id": 1, "username": "doctor"}
+
+
+# Хендлърите получават CachedDoctor (не ORM Doctor) - след първата заявка без база
+async def test_dependency_returns_cached_identity(client, auth_headers):
+    await client.get("/doctors/me", headers=auth_headers)
+    token = auth_headers["Authorization"].removeprefix("Bearer ")
+    assert await get_current_doctor(token, db=None) == CachedDoctor(1, "doctor")
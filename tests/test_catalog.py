@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from database import AsyncSessionLocal
+from models import Vaccine
+from utils.catalog import CatalogCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def _add_vaccine(name: str, month: int) -> None:
+    async with AsyncSessionLocal() as db:
+        db.add(Vaccine(name=name, recommended_month=month))
+        await db.commit()
+
+
+# Запис от друг процес (без invalidate() тук) се вижда след TTL
+async def test_write_from_another_process_visible_after_ttl(database):
+    cache = CatalogCache(ttl=0.05)
+    await _add_vaccine("BCG", 0)
+    async with AsyncSessionLocal() as db:
+        first = await cache.get(db)
+        await _add_vaccine("HepB", 1)
+        assert await cache.get(db) is first
+
+        await asyncio.sleep(0.06)
+        second = await cache.get(db)
+    assert [v.name for v in second.vaccines] == ["BCG", "HepB"]
+    assert second.version > first.version
+    assert second.digest != first.digest
+
+
+async def test_unchanged_catalog_keeps_snapshot_after_ttl(database):
+    cache = CatalogCache(ttl=0.01)
+    await _add_vaccine("BCG", 0)
+    async with AsyncSessionLocal() as db:
+        first = await cache.get(db)
+        await asyncio.sleep(0.02)
+        assert await cache.get(db) is first
+    assert cache.stats()["misses"] == 2
+
+
+async def test_invalidate_reloads_immediately(database):
+    cache = CatalogCache(ttl=0)
+    async with AsyncSessionLocal() as db:
+        first = await cache.get(db)
+        await _add_vaccine("BCG", 0)
+        assert await cache.get(db) is first
+
+        cache.invalidate()
+        assert [v.name for v in (await cache.get(db)).vaccines] == ["BCG"]
@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import PatientCompliance
+from utils import compliance
+from utils.catalog import catalog_cache
+
+pytestmark = pytest.mark.anyio
+
+
+async def _compliance():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(
+            PatientCompliance.patient_id, PatientCompliance.given_count,
+            PatientCompliance.missing_count, PatientCompliance.next_due_date,
+        ).order_by(PatientCompliance.patient_id))
+        return result.all()
+
+
+# Каталог на фикстурата: BCG 0, HepB 1, DTP 2, MMR 13
+async def test_summarize(patient):
+    async with AsyncSessionLocal() as db:
+        catalog = await catalog_cache.get(db)
+    rows = compliance.summarize(
+        [1, 2], [date(2023, 1, 10), date(2023, 1, 10)], [[1], []], catalog, reference_date=date(2023, 3, 15),
+    )
+    assert rows == [
+        {"patient_id": 1, "given_count": 1, "missing_count": 2, "next_due_date": date(2024, 2, 1)},
+        {"patient_id": 2, "given_count": 0, "missing_count": 3, "next_due_date": date(2024, 2, 1)},
+    ]
+    # Всичко дължимо е поставено и няма следваща ваксина
+    [row] = compliance.summarize([1], [date(2023, 1, 10)], [[1, 2, 3, 4]], catalog, reference_date=date(2024, 2, 20))
+    assert (row["given_count"], row["missing_count"], row["next_due_date"]) == (4, 0, None)
+
+
+async def test_refresh_on_immunization(client, auth_headers, patient):
+    assert await _compliance() == [(patient["id"], 1, 3, None)]
+    await client.post("/immunizations/", headers=auth_headers, json={
+        "patient_id": patient["id"], "vaccine_id": 2, "date_given": "2023-02-15",
+    })
+    assert await _compliance() == [(patient["id"], 2, 2, None)]
+
+
+# Роден този месец - 0 месеца: дължима е само BCG (поставена)
+async def test_refresh_on_patient_update(client, auth_headers, patient):
+    born = date.today().replace(day=1)
+    response = await client.put(f"/patients/{patient['id']}", headers=auth_headers, json={
+        "first_name": "Иван", "last_name": "Петров", "egn": patient["egn"], "birth_date": born.isoformat(),
+    })
+    assert response.status_code == 200
+    next_due = (born + timedelta(days=31)).replace(day=1)
+    assert await _compliance() == [(patient["id"], 1, 0, next_due)]
+
+
+async def test_rebuild_all_in_chunks(client, auth_headers, patient):
+    await client.post("/patients/", headers=auth_headers, json={
+        "first_name": "Мария", "last_name": "Петрова", "egn": "2341010001", "birth_date": "2023-01-10",
+    })
+    expected = await _compliance()
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(PatientCompliance))
+        await db.commit()
+
+    assert await compliance.rebuild_all(chunk_size=1) == 2
+    assert await _compliance() == expected
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Vaccine, VaccineDueState
+from utils import due_dates
+from utils.catalog import catalog_cache
+
+pytestmark = pytest.mark.anyio
+
+
+# Друг процес сменя месеца на DTP (2 -> 60) без да преизчисли patient_vaccine_due
+async def _move_dtp_elsewhere():
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Vaccine).where(Vaccine.name == "DTP").values(recommended_month=60))
+        await db.commit()
+    # Изтекъл TTL на кеша на каталога в този процес
+    catalog_cache.invalidate()
+
+
+async def _state():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(VaccineDueState.vaccine_id, VaccineDueState.first_due_month, VaccineDueState.ready))
+        return sorted(result.all())
+
+
+async def test_state_follows_catalog(client, auth_headers, patient):
+    assert await _state() == [(1, 0, True), (2, 1, True), (3, 2, True), (4, 13, True)]
+
+
+async def test_stale_table_is_not_served(client, auth_headers, patient):
+    await _move_dtp_elsewhere()
+
+    response = await client.get(f"/patients/{patient['id']}/missing-vaccines", headers=auth_headers)
+    assert response.json() == ["HepB", "MMR"]
+
+    response = await client.get("/schedule/overdue", params={"as_of": "2026-10-01"}, headers=auth_headers)
+    assert [item["vaccine"] for item in response.json()["items"]] == ["HepB", "MMR"]
+
+    # DTP вече е дължима на 5 години - 2028-01-01
+    response = await client.get("/schedule/forecast", params={"start": "2027-12-27", "weeks": 1}, headers=auth_headers)
+    body = response.json()
+    assert [(item["vaccine"], item["due_date"]) for item in body["items"]] == [("DTP", "2028-01-01")]
+    assert body["total"] == 1
+
+
+async def test_rebuild_marks_state_ready(client, auth_headers, patient):
+    await _move_dtp_elsewhere()
+    await due_dates.rebuild_in_background([3])
+
+    assert (3, 60, True) in await _state()
+    response = await client.get("/schedule/forecast", params={"start": "2027-12-27", "weeks": 1}, headers=auth_headers)
+    assert [item["vaccine"] for item in response.json()["items"]] == ["DTP"]
+
+
+# Неуспешното преизчисляване оставя ready=False и се повтаря при следващото
+async def test_failed_rebuild_stays_stale(client, auth_headers, patient, monkeypatch):
+    await _move_dtp_elsewhere()
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    with monkeypatch.context() as m:
+        m.setattr(due_dates, "patients_with_given_dates", broken)
+        await due_dates.rebuild_in_background([3])
+    assert (3, 60, False) in await _state()
+
+    response = await client.get(f"/patients/{patient['id']}/missing-vaccines", headers=auth_headers)
+    assert response.json() == ["HepB", "MMR"]
+
+    await due_dates.rebuild_in_background([])
+    assert (3, 60, True) in await _state()
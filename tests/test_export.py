@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+
+from utils.export import COLUMNS, iter_export
+
+pytestmark = pytest.mark.anyio
+
+
+# Пациентът от фикстурата (една имунизация) и пациент без имунизации
+@pytest.fixture
+async def registry(client, auth_headers, patient):
+    response = await client.post("/patients/", headers=auth_headers, json={
+        "first_name": "Мария", "last_name": "Петрова", "egn": "2341010001", "birth_date": "2024-05-20",
+    })
+    return [patient, response.json()]
+
+
+async def _export(client, auth_headers, fmt: str):
+    response = await client.get("/export/registry", params={"format": fmt}, headers=auth_headers)
+    assert response.status_code == 200
+    return response
+
+
+async def test_csv_rows(client, auth_headers, registry):
+    response = await _export(client, auth_headers, "csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows == [
+        COLUMNS,
+        [str(registry[0]["id"]), "Иван", "Петров", "2341010000", "2023-01-10", "1", "1", "BCG", "2023-01-11"],
+        [str(registry[1]["id"]), "Мария", "Петрова", "2341010001", "2024-05-20", "", "", "", ""],
+    ]
+
+
+# Заглавието е само веднъж, колкото и пачки да има
+async def test_csv_header_once_across_chunks(registry):
+    chunks = [chunk async for chunk in iter_export(1, "csv", chunk_size=1)]
+    assert len(chunks) == 2
+    assert b"".join(chunks).decode().count("patient_id") == 1
+
+
+async def test_csv_header_without_rows(client, auth_headers):
+    response = await _export(client, auth_headers, "csv")
+    assert response.text == ",".join(COLUMNS) + "\r\n"
+
+
+async def test_ndjson_rows(client, auth_headers, registry):
+    response = await _export(client, auth_headers, "ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["patient_id"], r["vaccine_name"], r["date_given"]) for r in records] == [
+        (registry[0]["id"], "BCG", "2023-01-11"), (registry[1]["id"], None, None),
+    ]
+
+
+async def test_unknown_format(client, auth_headers):
+    response = await client.get("/export/registry", params={"format": "xlsx"}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+async def test_parquet_round_trip(client, auth_headers, registry):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = await _export(client, auth_headers, "parquet")
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column_names == COLUMNS
+    assert table.to_pylist() == [
+        {
+            "patient_id": registry[0]["id"], "first_name": "Иван", "last_name": "Петров", "egn": "2341010000",
+            "birth_date": date(2023, 1, 10), "immunization_id": 1, "vaccine_id": 1, "vaccine_name": "BCG",
+            "date_given": date(2023, 1, 11),
+        },
+        {
+            "patient_id": registry[1]["id"], "first_name": "Мария", "last_name": "Петрова", "egn": "2341010001",
+            "birth_date": date(2024, 5, 20), "immunization_id": None, "vaccine_id": None, "vaccine_name": None,
+            "date_given": None,
+        },
+    ]
@@ -0,0 +1,53 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def _forecast(client, auth_headers, **params):
+    response = await client.get("/schedule/forecast", params=params, headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+# Роден 2023-01-10, BCG поставена: HepB става дължима 2023-02-01, DTP - 2023-03-01
+# Началото е сряда - седмиците пак започват в понеделник (2023-01-23), а интервалът
+# [сряда, сряда + 6 седмици) засяга 7 календарни седмици
+async def test_weekly_buckets(client, auth_headers, patient):
+    body = await _forecast(client, auth_headers, start="2023-01-25", weeks=6)
+    assert (body["start"], body["end"], body["total"], body["truncated"]) == ("2023-01-25", "2023-03-08", 2, False)
+    assert [(item["vaccine"], item["due_date"]) for item in body["items"]] == [
+        ("HepB", "2023-02-01"), ("DTP", "2023-03-01"),
+    ]
+    assert body["weekly"] == [
+        {"week_start": "2023-01-23", "count": 0},
+        {"week_start": "2023-01-30", "count": 1},
+        {"week_start": "2023-02-06", "count": 0},
+        {"week_start": "2023-02-13", "count": 0},
+        {"week_start": "2023-02-20", "count": 0},
+        {"week_start": "2023-02-27", "count": 1},
+        {"week_start": "2023-03-06", "count": 0},
+    ]
+
+
+async def test_truncated(client, auth_headers, patient):
+    body = await _forecast(client, auth_headers, start="2023-01-25", weeks=6, limit=1)
+    assert [item["vaccine"] for item in body["items"]] == ["HepB"]
+    assert body["truncated"] is True
+    # Седмичното натоварване не зависи от limit
+    assert body["total"] == 2
+
+
+# Поставените ваксини не влизат в прогнозата
+async def test_given_vaccine_excluded(client, auth_headers, patient):
+    await client.post("/immunizations/", headers=auth_headers, json={
+        "patient_id": patient["id"], "vaccine_id": 2, "date_given": "2023-01-20",
+    })
+    body = await _forecast(client, auth_headers, start="2023-01-25", weeks=6)
+    assert [item["vaccine"] for item in body["items"]] == ["DTP"]
+    assert body["total"] == 1
+
+
+async def test_empty_range(client, auth_headers, patient):
+    body = await _forecast(client, auth_headers, start="2023-04-03", weeks=2)
+    assert (body["items"], body["total"], body["truncated"]) == ([], 0, False)
+    assert body["weekly"] == [{"week_start": "2023-04-03", "count": 0}, {"week_start": "2023-04-10", "count": 0}]
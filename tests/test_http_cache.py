@@ -0,0 +1,38 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_schedule_revalidates_with_one_statement(client, auth_headers, patient, sql_queries):
+    url = f"/schedule/{patient['id']}"
+    first = await client.get(url, headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    # ETag от пълния отговор съвпада с този от евтината проверка на версията
+    with sql_queries(max_queries=1):
+        response = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    response = await client.get(url, headers={**auth_headers, "If-Modified-Since": first.headers["last-modified"]})
+    assert response.status_code == 304
+
+
+async def test_schedule_etag_changes_with_immunizations(client, auth_headers, patient):
+    url = f"/schedule/{patient['id']}"
+    etag = (await client.get(url, headers=auth_headers)).headers["etag"]
+    await client.post("/immunizations/", headers=auth_headers, json={
+        "patient_id": patient["id"], "vaccine_id": 2, "date_given": "2023-02-11",
+    })
+
+    response = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["given"] == ["BCG", "HepB"]
+
+
+async def test_vaccines_not_modified(client, auth_headers, patient):
+    etag = (await client.get("/vaccines/", headers=auth_headers)).headers["etag"]
+    response = await client.get("/vaccines/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+import routers.immunization
+from database import AsyncSessionLocal
+from models import Immunization
+
+pytestmark = pytest.mark.anyio
+
+
+async def _post(client, auth_headers, body: str, content_type: str = "application/x-ndjson"):
+    response = await client.post(
+        "/immunizations/bulk", content=body.encode(), headers={**auth_headers, "Content-Type": content_type}
+    )
+    return response.json()
+
+
+async def _immunization_count() -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(Immunization))
+
+
+# Пациент на друг лекар
+@pytest.fixture
+async def foreign_patient(client):
+    await client.post("/auth/register", json={"username": "other", "password": "secret"})
+    response = await client.post("/auth/token", data={"username": "other", "password": "secret"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.post("/patients/", headers=headers, json={
+        "first_name": "Мария", "last_name": "Петрова", "egn": "2341010001", "birth_date": "2023-01-10",
+    })
+    return response.json()
+
+
+async def test_bulk_errors(client, auth_headers, patient, foreign_patient):
+    body = "\n".join([
+        f'{{"patient_id": {patient["id"]}, "vaccine_id": 2, "date_given": "2023-02-15"}}',
+        f'{{"patient_id": {foreign_patient["id"]}, "vaccine_id": 2, "date_given": "2023-02-15"}}',
+        f'{{"patient_id": {patient["id"]}, "vaccine_id": 99, "date_given": "2023-02-15"}}',
+        "{not json",
+        '"text"',
+        f'{{"patient_id": {patient["id"]}, "vaccine_id": 3}}',
+    ])
+    report = await _post(client, auth_headers, body)
+    assert (report["processed"], report["inserted"], report["error_count"]) == (6, 1, 5)
+    assert [(e["row"], e["error"].split(":")[0]) for e in report["errors"]] == [
+        (2, "Нямате достъп до този пациент"),
+        (3, "Ваксината не съществува"),
+        (4, "Невалиден JSON"),
+        (5, "Очаква се JSON обект"),
+        (6, "date_given"),
+    ]
+
+
+# Обобщението и дължимите дати се обновяват в транзакцията на пачката
+async def test_bulk_refreshes_compliance(client, auth_headers, patient):
+    body = (
+        "patient_id,vaccine_id,date_given\n"
+        f"{patient['id']},2,2023-02-15\n"
+        f"{patient['id']},3,2023-03-15\n"
+    )
+    report = await _post(client, auth_headers, body, "text/csv")
+    assert report["inserted"] == 2
+
+    response = await client.get(f"/patients/{patient['id']}", headers=auth_headers)
+    assert response.json()["compliance"]["given_count"] == 3
+    assert response.json()["compliance"]["missing_count"] == 1
+    response = await client.get(f"/patients/{patient['id']}/missing-vaccines", headers=auth_headers)
+    assert response.json() == ["MMR"]
+
+
+# Грешка на базата в пачката отхвърля всички нейни валидни редове
+async def test_db_error_fails_whole_batch(client, auth_headers, patient, monkeypatch):
+    async def broken(db, patient_ids):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(routers.immunization, "refresh_patients", broken)
+    body = "\n".join([
+        f'{{"patient_id": {patient["id"]}, "vaccine_id": 2, "date_given": "2023-02-15"}}',
+        f'{{"patient_id": {patient["id"]}, "vaccine_id": 99, "date_given": "2023-02-15"}}',
+        f'{{"patient_id": {patient["id"]}, "vaccine_id": 3, "date_given": "2023-03-15"}}',
+    ])
+    report = await _post(client, auth_headers, body)
+    assert report["inserted"] == 0
+    assert report["errors"] == [
+        {"row": 1, "error": "Грешка при запис в базата"},
+        {"row": 2, "error": "Ваксината не съществува"},
+        {"row": 3, "error": "Грешка при запис в базата"},
+    ]
+    assert await _immunization_count() == 1
@@ -0,0 +1,84 @@
+import pytest
+
+from utils.ingest import INGEST_BATCH_SIZE
+
+pytestmark = pytest.mark.anyio
+
+HEADER = "first_name,last_name,egn,birth_date\r\n"
+
+# BOM, ЕГН повторено във файла, ЕГН от базата, грешен брой колони и фамилия с нов ред в кавички
+CSV = (
+    "﻿" + HEADER
+    + "Мария,Иванова,2551010001,2025-01-10\r\n"
+    + "Петя,Иванова,2551010001,2025-01-10\r\n"
+    + "Иван,Петров,2341010000,2023-01-10\r\n"
+    + "Георги,Георгиев,2025-01-10\r\n"
+    + '"Ана","Иванова\r\nМладша",2551010002,2025-01-10\r\n'
+    + "Калин,Колев,2551010003,not-a-date\r\n"
+).encode()
+
+EXPECTED = {
+    "processed": 6,
+    "inserted": 2,
+    "error_count": 4,
+    "errors": [
+        {"row": 3, "error": "ЕГН 2551010001 се повтаря във файла (ред 2)"},
+        {"row": 4, "error": "Пациент с ЕГН 2341010000 вече съществува"},
+        {"row": 5, "error": "Очаквани 4 колони, получени 3"},
+        {"row": 8, "error": "birth_date: invalid date format"},
+    ],
+}
+
+
+async def _last_names(client, auth_headers):
+    response = await client.get("/patients/", headers=auth_headers)
+    return sorted(p["last_name"] for p in response.json())
+
+
+async def test_bulk_csv_report(client, auth_headers, patient):
+    response = await client.post("/patients/bulk", content=CSV, headers={**auth_headers, "Content-Type": "text/csv"})
+    assert response.json() == EXPECTED
+    assert await _last_names(client, auth_headers) == ["Иванова", "Иванова\nМладша", "Петров"]
+
+
+async def test_bulk_ndjson_report(client, auth_headers):
+    body = (
+        '{"first_name": "Мария", "last_name": "Иванова", "egn": "2551010001", "birth_date": "2025-01-10"}\n'
+        "\n"
+        "not json\n"
+        "[1, 2]\n"
+    ).encode()
+    response = await client.post(
+        "/patients/bulk", content=body, headers={**auth_headers, "Content-Type": "application/x-ndjson"}
+    )
+    report = response.json()
+    assert (report["processed"], report["inserted"]) == (3, 1)
+    assert [(e["row"], e["error"].split(":")[0]) for e in report["errors"]] == [
+        (3, "Невалиден JSON"), (4, "Очаква се JSON обект"),
+    ]
+
+
+async def test_bulk_unsupported_type(client, auth_headers):
+    response = await client.post("/patients/bulk", content=b"{}", headers={**auth_headers, "Content-Type": "text/plain"})
+    assert response.status_code == 415
+
+
+# Повторението през границата на пачката се хваща от проверката в базата
+async def test_bulk_batch_boundary(client, auth_headers):
+    rows = [f"Мария,Иванова{i},{2551000000 + i},2025-01-10\r\n" for i in range(INGEST_BATCH_SIZE)]
+    rows.append("Мария,Иванова,2551000000,2025-01-10\r\n")
+    body = (HEADER + "".join(rows)).encode()
+    response = await client.post("/patients/bulk", content=body, headers={**auth_headers, "Content-Type": "text/csv"})
+    report = response.json()
+    assert (report["processed"], report["inserted"]) == (INGEST_BATCH_SIZE + 1, INGEST_BATCH_SIZE)
+    assert report["errors"] == [
+        {"row": INGEST_BATCH_SIZE + 2, "error": "Пациент с ЕГН 2551000000 вече съществува"},
+    ]
+
+
+async def test_import_upload(client, auth_headers, patient, web_login):
+    response = await client.post("/patients/import", files={"file": ("patients.csv", CSV, "application/octet-stream")})
+    assert response.status_code == 200
+    assert "добавени <strong>2</strong> пациента" in response.text
+    assert "Пациент с ЕГН 2341010000 вече съществува" in response.text
+    assert await _last_names(client, auth_headers) == ["Иванова", "Иванова\nМладша", "Петров"]
@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks.load_bench import _percentile, _run
+
+pytestmark = pytest.mark.anyio
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert (_percentile(values, 50), _percentile(values, 99)) == (50.0, 99.0)
+    assert _percentile([], 95) == 0.0
+
+
+async def test_run_without_requests():
+    async def send():
+        raise AssertionError("не се очакват заявки")
+
+    result = await _run(send, requests=0, concurrency=4)
+    assert (result["requests"], result["p50_ms"], result["p99_ms"]) == (0, 0.0, 0.0)
@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import migrations
+import models  # noqa: F401 - регистрира моделите в Base.metadata
+from database import Base
+from utils.catalog import catalog_cache
+from utils.query_plans import check_hot_queries, full_scans
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def migrated(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}")
+    await migrations.upgrade(engine)
+    yield engine
+    await engine.dispose()
+
+
+def _schema(sync_conn) -> dict:
+    inspector = inspect(sync_conn)
+    return {
+        table: (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted(index["name"] for index in inspector.get_indexes(table)),
+            sorted(tuple(unique["column_names"]) for unique in inspector.get_unique_constraints(table)),
+            sorted(
+                (tuple(fk["constrained_columns"]), fk["referred_table"], fk["options"].get("ondelete"))
+                for fk in inspector.get_foreign_keys(table)
+            ),
+        )
+        for table in inspector.get_table_names()
+        if table != "schema_migrations"
+    }
+
+
+async def test_hot_queries_use_indexes_after_migrations(migrated):
+    assert await check_hot_queries(migrated) == []
+
+
+async def test_upgrade_is_idempotent(migrated):
+    assert await migrations.upgrade(migrated) == []
+
+
+# Замразените миграции трябва да водят до същата схема като моделите
+async def test_migrations_match_models(migrated, tmp_path):
+    reference = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'models.db'}")
+    try:
+        async with reference.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            expected = await conn.run_sync(_schema)
+    finally:
+        await reference.dispose()
+    async with migrated.connect() as conn:
+        assert await conn.run_sync(_schema) == expected
+
+
+@pytest.mark.parametrize("plan, tables", [
+    ("SCAN patients", ["patients"]),
+    ("SCAN TABLE immunizations", ["immunizations"]),
+    ("SCAN patients USING COVERING INDEX ix_patients_doctor_id", ["patients"]),
+    ("SCAN immunizations_1 USING INDEX ix_immunizations_patient_id", ["immunizations"]),
+    ("SEARCH patients USING INDEX ix_patients_doctor_last_name_id (doctor_id=?)", []),
+    ("SCAN vaccines", []),
+])
+def test_full_scans_sqlite(plan, tables):
+    assert full_scans(plan, "sqlite") == tables
+
+
+# 0006 попълва patient_vaccine_due за пациентите, които вече са в базата, и състоянието ѝ
+async def test_patient_vaccine_due_backfilled(migrated):
+    async with migrated.begin() as conn:
+        await conn.execute(text("DELETE FROM schema_migrations WHERE version = 6"))
+        await conn.execute(text("DROP TABLE vaccine_due_state"))
+        await conn.execute(text("INSERT INTO doctors (id, username, hashed_password) VALUES (1, 'doctor', '-')"))
+        await conn.execute(text("INSERT INTO vaccines (id, name, is_mandatory, recommended_month) VALUES (1, 'BCG', 1, 0)"))
+        await conn.execute(text(
+            "INSERT INTO patients (id, first_name, last_name, egn, birth_date, doctor_id) "
+            "VALUES (1, 'Иван', 'Петров', '2341010000', '2023-01-10', 1)"
+        ))
+
+    catalog_cache.invalidate()
+    try:
+        assert await migrations.upgrade(migrated) == ["0006_vaccine_due_state"]
+    finally:
+        catalog_cache.invalidate()
+    async with migrated.connect() as conn:
+        rows = (await conn.execute(text("SELECT patient_id, vaccine_id, due_date FROM patient_vaccine_due"))).all()
+        state = (await conn.execute(text("SELECT vaccine_id, first_due_month, ready FROM vaccine_due_state"))).all()
+    assert rows == [(1, 1, "2023-01-01")]
+    assert state == [(1, 0, 1)]
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.password_pool import PasswordPool, PoolSaturated, password_pool
+
+pytestmark = pytest.mark.anyio
+
+
+async def _until(predicate, timeout: float = 5.0):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timeout")
+
+
+# Прекъсната заявка не освобождава място, докато задачата ѝ още заема работна нишка
+async def test_pending_released_when_job_finishes():
+    pool = PasswordPool(workers=1, max_pending=2)
+    release = threading.Event()
+    running = asyncio.create_task(pool.run(release.wait))
+    queued = asyncio.create_task(pool.run(release.wait))
+    await _until(lambda: pool.pending == 2)
+    with pytest.raises(PoolSaturated):
+        await pool.run(release.wait)
+
+    # Задачата на опашката се маха веднага, работещата - едва като приключи
+    queued.cancel()
+    running.cancel()
+    await _until(lambda: pool.pending == 1)
+    await asyncio.sleep(0.05)
+    assert pool.pending == 1
+
+    release.set()
+    await _until(lambda: pool.pending == 0)
+    assert pool.rejected == 1
+
+
+async def test_token_overloaded(client, auth_headers):
+    release = threading.Event()
+    blockers = [asyncio.create_task(password_pool.run(release.wait)) for _ in range(password_pool.max_pending)]
+    try:
+        await _until(lambda: password_pool.pending == password_pool.max_pending)
+        response = await client.post("/auth/token", data={"username": "doctor", "password": "secret"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    finally:
+        release.set()
+        await asyncio.gather(*blockers)
+    await _until(lambda: password_pool.pending == 0)
+
+    response = await client.post("/auth/token", data={"username": "doctor", "password": "secret"})
+    assert response.status_code == 200
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import delete, func
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Immunization, Patient, PatientCompliance, PatientVaccineDue
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_missing_vaccines_from_due_table(client, auth_headers, patient):
+    response = await client.get(f"/patients/{patient['id']}/missing-vaccines", headers=auth_headers)
+    assert response.json() == ["HepB", "DTP", "MMR"]
+
+
+# Без редове в patient_vaccine_due (напр. преди попълването) се смята от имунизациите
+async def test_missing_vaccines_without_due_rows(client, auth_headers, patient):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(PatientVaccineDue))
+        await db.commit()
+
+    response = await client.get(f"/patients/{patient['id']}/missing-vaccines", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == ["HepB", "DTP", "MMR"]
+
+
+async def _create_patients(client, auth_headers, count):
+    for i in range(count):
+        await client.post("/patients/", headers=auth_headers, json={
+            "first_name": "Мария", "last_name": f"Иванова{i}", "egn": f"255101{i:04d}", "birth_date": "2025-01-10",
+        })
+
+
+# Без after/limit списъкът е пълен, както преди страниците
+async def test_patient_list_unpaginated_by_default(client, auth_headers):
+    await _create_patients(client, auth_headers, 3)
+    response = await client.get("/patients/", headers=auth_headers)
+    assert [p["last_name"] for p in response.json()] == ["Иванова0", "Иванова1", "Иванова2"]
+    assert "x-next-cursor" not in response.headers
+
+
+async def test_patient_list_pages(client, auth_headers):
+    await _create_patients(client, auth_headers, 3)
+    first = await client.get("/patients/", params={"limit": 2}, headers=auth_headers)
+    assert [p["last_name"] for p in first.json()] == ["Иванова0", "Иванова1"]
+
+    second = await client.get("/patients/", params={"after": first.headers["x-next-cursor"]}, headers=auth_headers)
+    assert [p["last_name"] for p in second.json()] == ["Иванова2"]
+    assert "x-next-cursor" not in second.headers
+
+
+async def _rows_of(model, patient_ids) -> int:
+    column = model.id if model is Patient else model.patient_id
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(model).where(column.in_(patient_ids)))
+
+
+# Чужди и несъществуващи id-та са в not_found; изтритите вземат със себе си и зависимите редове
+async def test_bulk_delete(client, auth_headers, patient):
+    await _create_patients(client, auth_headers, 1)
+    await client.post("/auth/register", json={"username": "other", "password": "secret"})
+    token = (await client.post("/auth/token", data={"username": "other", "password": "secret"})).json()["access_token"]
+    foreign = (await client.post("/patients/", headers={"Authorization": f"Bearer {token}"}, json={
+        "first_name": "Мария", "last_name": "Петрова", "egn": "2341010001", "birth_date": "2023-01-10",
+    })).json()
+    own = [patient["id"], patient["id"] + 1]
+    assert [await _rows_of(model, own) for model in (Immunization, PatientCompliance)] == [1, 2]
+    assert await _rows_of(PatientVaccineDue, own) > 0
+
+    response = await client.post("/patients/bulk-delete", headers=auth_headers, json={
+        "ids": [999, foreign["id"], *own, patient["id"]],
+    })
+    assert response.json() == {"deleted": own, "not_found": sorted([foreign["id"], 999])}
+
+    for model in (Patient, Immunization, PatientCompliance, PatientVaccineDue):
+        assert await _rows_of(model, own) == 0
+    assert await _rows_of(Patient, [foreign["id"]]) == 1
+    assert await _rows_of(PatientCompliance, [foreign["id"]]) == 1
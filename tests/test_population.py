@@ -0,0 +1,37 @@
+from datetime import date
+
+import pytest
+
+from utils.population import DEFAULT_MAX_AGE_YEARS, PopulationGenerator, PopulationSpec, egn_capacity
+
+VACCINES = [(1, "BCG", 0), (2, "MMR-1", 13)]
+
+
+def _egns(spec: PopulationSpec) -> list:
+    generator = PopulationGenerator(spec, [1, 2], VACCINES)
+    return [p["egn"] for patients, _ in generator.chunks(1, 500) for p in patients]
+
+
+def test_more_patients_than_egns_is_rejected():
+    with pytest.raises(ValueError, match="не се побират"):
+        PopulationSpec(patients=1001, max_age_years=0)
+
+
+def test_default_age_span_grows_with_population():
+    assert PopulationSpec(patients=10000).max_age_years == DEFAULT_MAX_AGE_YEARS
+    spec = PopulationSpec(patients=10_000_000)
+    assert spec.max_age_years > DEFAULT_MAX_AGE_YEARS
+    assert egn_capacity(spec.max_age_years) >= 10_000_000
+
+
+# Един ден с 800 пациента: близо до капацитета, но всички ЕГН-та са уникални и генерирането завършва
+def test_unique_egns_near_capacity():
+    spec = PopulationSpec(patients=egn_capacity(0), max_age_years=0, today=date(2026, 1, 1))
+    egns = _egns(spec)
+    assert len(egns) == len(set(egns)) == 800
+    assert {egn[:6] for egn in egns} == {"264101"}
+
+
+def test_deterministic_by_seed():
+    spec = PopulationSpec(patients=2000, seed=7, today=date(2026, 1, 1))
+    assert _egns(spec) == _egns(PopulationSpec(patients=2000, seed=7, today=date(2026, 1, 1)))
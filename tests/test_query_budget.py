@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import Vaccine
+from utils.sql_profile import QueryBudgetExceeded
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_repeated_statement_is_reported_as_n_plus_one(database, sql_queries):
+    async with AsyncSessionLocal() as db:
+        with pytest.raises(QueryBudgetExceeded, match="N\\+1"):
+            with sql_queries():
+                for vaccine_id in range(3):
+                    await db.execute(select(Vaccine).where(Vaccine.id == vaccine_id))
+
+
+async def test_budget_counts_statements(database, sql_queries):
+    async with AsyncSessionLocal() as db:
+        with pytest.raises(QueryBudgetExceeded, match="най-много 1"):
+            with sql_queries(max_queries=1):
+                await db.execute(select(Vaccine))
+                await db.execute(select(Vaccine.id))
+
+
+# Каталогът и идентичността са кеширани след първата заявка - повторният списък не стига до базата
+async def test_vaccine_list_served_from_cache(client, auth_headers, sql_queries):
+    await client.post("/vaccines/", json={"name": "BCG", "recommended_month": 0}, headers=auth_headers)
+    assert (await client.get("/vaccines/", headers=auth_headers)).status_code == 200
+
+    with sql_queries(max_queries=0) as queries:
+        response = await client.get("/vaccines/", headers=auth_headers)
+    assert response.status_code == 200
+    assert [v["name"] for v in response.json()] == ["BCG"]
+    assert queries.count == 0
+
+
+async def _warm(client, url, **kwargs):
+    # Първата заявка пълни кеша на каталога и на идентичността
+    response = await client.get(url, **kwargs)
+    assert response.status_code == 200
+    return response
+
+
+async def test_patient_schedule_single_statement(client, auth_headers, patient, sql_queries):
+    url = f"/schedule/{patient['id']}"
+    await _warm(client, url, headers=auth_headers)
+
+    with sql_queries(max_queries=1):
+        response = await client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"given": ["BCG"], "missing": ["HepB", "DTP", "MMR"]}
+
+
+async def test_missing_vaccines_single_statement(client, auth_headers, patient, sql_queries):
+    url = f"/patients/{patient['id']}/missing-vaccines"
+    await _warm(client, url, headers=auth_headers)
+
+    with sql_queries(max_queries=1):
+        response = await client.get(url, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == ["HepB", "DTP", "MMR"]
+
+
+async def test_patient_vaccines_page_single_statement(client, patient, web_login, sql_queries):
+    url = f"/patients/{patient['id']}/vaccines"
+    await _warm(client, url)
+
+    with sql_queries(max_queries=1):
+        response = await client.get(url)
+    assert response.status_code == 200
+    assert "Петров" in response.text
+
+
+async def test_foreign_patient_is_forbidden(client, auth_headers, patient):
+    await client.post("/auth/register", json={"username": "other", "password": "secret"})
+    token = (await client.post("/auth/token", data={"username": "other", "password": "secret"})).json()["access_token"]
+    other = {"Authorization": f"Bearer {token}"}
+
+    assert (await client.get(f"/schedule/{patient['id']}", headers=other)).status_code == 403
+    assert (await client.get(f"/patients/{patient['id']}/missing-vaccines", headers=other)).status_code == 403
@@ -0,0 +1,127 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Doctor, Immunization, Patient, ReminderOutbox, Vaccine
+from utils.catalog import CachedVaccine
+from utils.reminders import FileSender, ReminderMessage, build_outbox, evaluate_overdue, send_outbox
+from utils.schedule import compile_catalog
+
+pytestmark = pytest.mark.anyio
+
+RUN_DATE = date(2026, 10, 1)
+
+
+def test_evaluate_overdue():
+    catalog = compile_catalog([
+        CachedVaccine(1, "BCG", True, 0),
+        CachedVaccine(2, "MMR", True, 13),
+        CachedVaccine(3, "Flu", False, 6),
+        CachedVaccine(4, "DTP4", True, 18),
+    ])
+    result = evaluate_overdue(
+        [10, 11, 12, 13],
+        [date(2026, 9, 1), date(2025, 1, 1), date(2025, 9, 1), date(2024, 1, 1)],
+        [[1], [1], [], [1, 2, 4]],
+        RUN_DATE,
+        catalog,
+    )
+    # 21м е в специалния прозорец - дължима е само DTP4; незадължителната Flu никога не е просрочена
+    assert result == [
+        {"patient_id": 11, "vaccines": ["DTP4"]},
+        {"patient_id": 12, "vaccines": ["BCG", "MMR"]},
+    ]
+
+
+# 👩‍⚕️ Трима лекари, всеки с пациент на 13 месеца без поставена MMR
+@pytest.fixture
+async def doctors(database):
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Vaccine), [
+            {"id": 1, "name": "BCG", "recommended_month": 0}, {"id": 2, "name": "MMR", "recommended_month": 13},
+        ])
+        await db.execute(insert(Doctor), [
+            {"id": i, "username": f"doctor{i}", "hashed_password": "-"} for i in (1, 2, 3)
+        ])
+        await db.execute(insert(Patient), [
+            {"id": i, "first_name": "Иван", "last_name": "Петров", "egn": f"254101000{i}",
+             "birth_date": date(2025, 9, 1), "doctor_id": i}
+            for i in (1, 2, 3)
+        ])
+        await db.execute(insert(Immunization), [
+            {"patient_id": i, "vaccine_id": 1, "date_given": date(2025, 9, 2), "doctor_id": i} for i in (1, 2, 3)
+        ])
+        await db.commit()
+    return [1, 2, 3]
+
+
+async def _outbox():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(ReminderOutbox).order_by(ReminderOutbox.doctor_id))
+        return result.scalars().all()
+
+
+async def test_build_outbox(doctors):
+    report = await build_outbox(RUN_DATE, workers=0)
+    assert (report.doctors, report.patients, report.overdue_vaccines) == (3, 3, 3)
+    rows = await _outbox()
+    assert [row.status for row in rows] == ["pending"] * 3
+    assert json.loads(rows[0].payload) == [{"patient_id": 1, "vaccines": ["MMR"]}]
+
+
+# Прекъснато пускане продължава само с лекарите без ред за датата
+async def test_resume_from_checkpoint(doctors):
+    await build_outbox(RUN_DATE, workers=0)
+    async with AsyncSessionLocal() as db:
+        await db.execute(ReminderOutbox.__table__.delete().where(ReminderOutbox.doctor_id == 3))
+        await db.commit()
+
+    report = await build_outbox(RUN_DATE, workers=0)
+    assert (report.skipped, report.doctors) == (2, 1)
+    assert [row.doctor_id for row in await _outbox()] == [1, 2, 3]
+
+
+async def test_restart_keeps_sent_reminders(doctors, tmp_path):
+    await build_outbox(RUN_DATE, workers=0)
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(ReminderOutbox).where(ReminderOutbox.doctor_id == 1).values(status="sent"))
+        await db.commit()
+
+    report = await build_outbox(RUN_DATE, workers=0, restart=True)
+    assert (report.skipped, report.doctors) == (1, 2)
+    assert [row.status for row in await _outbox()] == ["sent", "pending", "pending"]
+
+    # Изпратеното не се праща втори път
+    result = await send_outbox(RUN_DATE, FileSender(str(tmp_path)))
+    assert result["sent"] == 2
+    assert sorted(p.name for p in (tmp_path / RUN_DATE.isoformat()).iterdir()) == ["doctor-2.json", "doctor-3.json"]
+
+
+def test_file_sender(tmp_path):
+    message = ReminderMessage(7, RUN_DATE, 3, "doctor3", [{"patient_id": 5, "vaccines": ["MMR"]}])
+    FileSender(str(tmp_path)).send(message)
+    FileSender(str(tmp_path)).send(message)
+
+    folder = tmp_path / "2026-10-01"
+    assert [p.name for p in folder.iterdir()] == ["doctor-3.json"]
+    data = json.loads((folder / "doctor-3.json").read_text(encoding="utf-8"))
+    assert data["run_date"] == "2026-10-01"
+    assert data["patients"] == [{"patient_id": 5, "vaccines": ["MMR"]}]
+    assert data["subject"] == message.subject
+
+
+async def test_failed_send_is_retried(doctors, tmp_path):
+    class BrokenSender:
+        def send(self, message):
+            raise OSError("SMTP down")
+
+    await build_outbox(RUN_DATE, workers=0)
+    assert (await send_outbox(RUN_DATE, BrokenSender()))["failed"] == 3
+    assert {row.last_error for row in await _outbox()} == {"SMTP down"}
+
+    assert (await send_outbox(RUN_DATE, FileSender(str(tmp_path))))["sent"] == 3
+    assert [(row.status, row.attempts) for row in await _outbox()] == [("sent", 2)] * 3
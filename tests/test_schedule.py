@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from models import Vaccine
+from utils.schedule import (
+    batch_schedule, compile_catalog, due_matrix, first_due_months, required_mandatory_vaccines
+)
+
+# Ваксина на 0 месеца, на 18 (специалния прозорец), на 24 и 25 (около края му) и незадължителни
+VACCINES = [
+    Vaccine(id=1, name="BCG", is_mandatory=True, recommended_month=0),
+    Vaccine(id=2, name="HepB", is_mandatory=True, recommended_month=1),
+    Vaccine(id=3, name="Rota", is_mandatory=False, recommended_month=2),
+    Vaccine(id=4, name="MMR", is_mandatory=True, recommended_month=13),
+    Vaccine(id=5, name="DTP-18", is_mandatory=True, recommended_month=18),
+    Vaccine(id=6, name="Hib", is_mandatory=True, recommended_month=24),
+    Vaccine(id=7, name="Flu", is_mandatory=False, recommended_month=None),
+    Vaccine(id=8, name="PCV", is_mandatory=True, recommended_month=25),
+]
+AGES = [0, 1, 2, 12, 13, 17, 18, 19, 24, 25, 26, 60]
+REFERENCE = date(2026, 6, 15)
+
+
+# Цикълът отпреди векторизацията (baseline utils/schedule.py) - еталонът за поведението
+def _baseline_required(age_months, all_vaccines):
+    required = []
+    for vaccine in all_vaccines:
+        if vaccine.is_mandatory:
+            if 18 <= age_months <= 24:
+                required.append(vaccine) if vaccine.recommended_month == 18 else None
+            elif age_months >= vaccine.recommended_month:
+                required.append(vaccine)
+    return required
+
+
+def _born(age_months: int) -> date:
+    months = REFERENCE.year * 12 + REFERENCE.month - 1 - age_months
+    return date(months // 12, months % 12 + 1, 1)
+
+
+@pytest.mark.parametrize("age", AGES)
+def test_required_matches_baseline(age):
+    assert required_mandatory_vaccines(age, VACCINES) == _baseline_required(age, VACCINES)
+
+
+@pytest.mark.parametrize("age", AGES)
+def test_due_matrix_matches_baseline(age):
+    catalog = compile_catalog(VACCINES)
+    due = due_matrix([age], catalog)[0]
+    assert set(catalog.ids[due].tolist()) == {v.id for v in _baseline_required(age, VACCINES)}
+
+
+def test_batch_schedule_matches_baseline():
+    catalog = compile_catalog(VACCINES)
+    given = [[1, 3], [2, 5], [], [1, 2, 4, 5, 6, 8]]
+    for age in AGES:
+        due, missing = batch_schedule([_born(age)] * len(given), given, catalog, REFERENCE)
+        expected = {v.id for v in _baseline_required(age, VACCINES)}
+        assert due == [expected] * len(given)
+        assert missing == [expected - set(g) for g in given]
+
+
+def test_first_due_months_matches_baseline():
+    catalog = compile_catalog(VACCINES)
+    expected = [
+        next((age for age in range(61) if v in _baseline_required(age, VACCINES)), -1)
+        for v in VACCINES
+    ]
+    assert first_due_months(catalog).tolist() == expected
+    assert expected == [0, 1, -1, 13, 18, 25, -1, 25]
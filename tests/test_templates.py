@@ -0,0 +1,31 @@
+import pytest
+from jinja2 import ChoiceLoader, DictLoader
+
+from utils.templates import fragment_cache, stream_template, templates
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_dashboard_streamed(client, patient, web_login):
+    response = await client.get("/dashboard")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert "Петров" in response.text
+    assert response.text.rstrip().endswith("</html>")
+
+
+# Грешка след началото на отговора: потокът се затваря, без да се вдига изключение
+async def test_stream_render_error_closes_stream(monkeypatch):
+    loader = DictLoader({"_broken.html": "начало {{ 1 // 0 }} край"})
+    monkeypatch.setattr(templates.env, "loader", ChoiceLoader([loader, templates.env.loader]))
+    chunks = [chunk async for chunk in stream_template("_broken.html", {})]
+    assert b"".join(chunks) == b""
+
+
+async def test_vaccine_cards_fragment_reused(client, patient, web_login):
+    await client.get("/vaccines")
+    before = fragment_cache.stats()
+    response = await client.get("/vaccines")
+    assert "MMR" in response.text
+    after = fragment_cache.stats()
+    assert (after["hits"], after["misses"]) == (before["hits"] + 1, before["misses"])
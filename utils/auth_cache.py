@@ -0,0 +1,86 @@
+import os
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+# Настройки на кеша (секунди / брой записи)
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+
+# 👤 Минималната идентичност на лекаря, нужна на хендлърите (това връщат auth dependency-тата)
+# id и username не се променят, а приложението няма път за промяна или изтриване на лекар,
+# затова записът не се инвалидира; ръчна промяна в базата се вижда след AUTH_CACHE_TTL_SECONDS
+class CachedDoctor(NamedTuple):
+    id: int
+    username: str
+
+
+# 🎟️ TTL/LRU кеш: token -> doctor_id и doctor_id -> CachedDoctor
+class IdentityCache:
+    def __init__(self, ttl: float = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._tokens: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._doctors: "OrderedDict[int, Tuple[CachedDoctor, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[CachedDoctor]:
+        now = time.time()
+        entry = self._tokens.get(token)
+        if entry is None or entry[1] <= now:
+            self._tokens.pop(token, None)
+            self.misses += 1
+            return None
+
+        doctor_entry = self._doctors.get(entry[0])
+        if doctor_entry is None or doctor_entry[1] <= now:
+            self._doctors.pop(entry[0], None)
+            self.misses += 1
+            return None
+
+        self._tokens.move_to_end(token)
+        self._doctors.move_to_end(entry[0])
+        self.hits += 1
+        return doctor_entry[0]
+
+    def put(self, token: str, exp: Optional[float], doctor) -> CachedDoctor:
+        cached = CachedDoctor(doctor.id, doctor.username)
+        now = time.time()
+        expires_at = now + self.ttl
+        # Никога не пазим токена след неговия exp
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        if expires_at > now:
+            self._tokens[token] = (cached.id, expires_at)
+            self._tokens.move_to_end(token)
+            self._doctors[cached.id] = (cached, now + self.ttl)
+            self._doctors.move_to_end(cached.id)
+            self._evict()
+        return cached
+
+    def forget_token(self, token: Optional[str]) -> None:
+        if token:
+            self._tokens.pop(token, None)
+
+    def clear(self) -> None:
+        self._tokens.clear()
+        self._doctors.clear()
+
+    def _evict(self) -> None:
+        while len(self._tokens) > self.max_entries:
+            self._tokens.popitem(last=False)
+        while len(self._doctors) > self.max_entries:
+            self._doctors.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "tokens": len(self._tokens),
+            "doctors": len(self._doctors),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import get_db
+from models import Vaccine
+from utils.schedule import CompiledCatalog, compile_catalog
+
+# Колко секунди снимката се ползва без проверка в базата: записите от други worker-и
+# и от manage.py се виждат най-късно след толкова (0 = само write-through инвалидиране)
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", 30))
+
+
+# 💉 Неизменимо копие на ред от vaccines (не е закачено за сесия)
+class CachedVaccine(NamedTuple):
+    id: int
+    name: str
+    is_mandatory: bool
+    recommended_month: Optional[int]
+
+
+# 📚 Снимка на каталога с номер на версия
+# digest зависи само от съдържанието (еднакъв във всички worker-и) - ползва се за ETag
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    vaccines: Tuple[CachedVaccine, ...]
+    compiled: CompiledCatalog
+    digest: str
+    loaded_at: datetime
+
+    def by_month(self) -> Tuple[CachedVaccine, ...]:
+        # Същият ред като ORDER BY recommended_month (NULL накрая)
+        return tuple(sorted(
+            self.vaccines,
+            key=lambda v: (v.recommended_month is None, v.recommended_month or 0),
+        ))
+
+
+# 🗄️ In-process кеш на каталога с write-through инвалидиране и TTL
+class CatalogCache:
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._expires_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _fresh(self) -> Optional[CatalogSnapshot]:
+        if self._snapshot is not None and (self.ttl <= 0 or time.monotonic() < self._expires_at):
+            return self._snapshot
+        return None
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        snapshot = self._fresh()
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        async with self._lock:
+            # Друга заявка може вече да е заредила каталога
+            snapshot = self._fresh()
+            if snapshot is not None:
+                self.hits += 1
+                return snapshot
+
+            self.misses += 1
+            version = self._version
+            result = await db.execute(select(Vaccine).order_by(Vaccine.id))
+            vaccines = tuple(
+                CachedVaccine(v.id, v.name, bool(v.is_mandatory), v.recommended_month)
+                for v in result.scalars().all()
+            )
+            digest = hashlib.sha1(repr(vaccines).encode()).hexdigest()
+
+            previous = self._snapshot
+            if previous is not None and previous.digest == digest:
+                # Изтекъл, но непроменен: същата снимка (и loaded_at - Last-Modified не се мести)
+                snapshot = previous
+            else:
+                if previous is not None:
+                    # Каталогът е променен от друг процес
+                    self._version += 1
+                    version = self._version
+                snapshot = CatalogSnapshot(
+                    version, vaccines, compile_catalog(vaccines),
+                    digest=digest,
+                    loaded_at=datetime.now(timezone.utc),
+                )
+            # Ако междувременно е имало запис, не кешираме остарели данни
+            if version == self._version:
+                self._snapshot = snapshot
+                self._expires_at = time.monotonic() + self.ttl
+            return snapshot
+
+    def invalidate(self) -> None:
+        self._version += 1
+        self._snapshot = None
+
+    def stats(self) -> dict:
+        return {
+            "version": self._version,
+            "cached": self._snapshot is not None,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+catalog_cache = CatalogCache()
+
+
+# Dependency за взимане на каталога
+async def get_catalog(db: AsyncSession = Depends(get_db)) -> CatalogSnapshot:
+    return await catalog_cache.get(db)
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Patient, PatientCompliance
+from utils import due_dates
+from utils.catalog import CatalogSnapshot, catalog_cache
+from utils.queries import group_patient_rows, iter_patient_chunks, patients_with_vaccine_ids
+from utils.schedule import (
+    ages_in_months, due_matrix, given_matrix, month_start_dates, next_due_ages
+)
+
+logger = logging.getLogger(__name__)
+
+# Брой пациенти в една транзакция при пълно преизчисляване
+COMPLIANCE_REBUILD_CHUNK = int(os.getenv("COMPLIANCE_REBUILD_CHUNK", 2000))
+
+
+# 🧮 Редове за patient_compliance за пачка пациенти (векторизирано)
+def summarize(
+    ids: List[int],
+    birth_dates: List[date],
+    given: List[List[int]],
+    catalog: CatalogSnapshot,
+    reference_date: Optional[date] = None,
+) -> List[dict]:
+    ages = ages_in_months(birth_dates, reference_date)
+    given_m = given_matrix(given, catalog.compiled)
+    missing_m = due_matrix(ages, catalog.compiled) & ~given_m
+    next_dates = month_start_dates(birth_dates, next_due_ages(ages, given_m, catalog.compiled))
+    return [
+        {
+            "patient_id": patient_id,
+            "given_count": int(given_count),
+            "missing_count": int(missing_count),
+            "next_due_date": next_due,
+        }
+        for patient_id, given_count, missing_count, next_due in zip(
+            ids, given_m.sum(axis=1), missing_m.sum(axis=1), next_dates
+        )
+    ]
+
+
+async def _write(db: AsyncSession, rows: List[dict]) -> None:
+    if not rows:
+        return
+    await db.execute(
+        delete(PatientCompliance).where(PatientCompliance.patient_id.in_([r["patient_id"] for r in rows]))
+    )
+    await db.execute(insert(PatientCompliance), rows)
+
+
+# 🔄 Инкрементално обновяване на обобщението за конкретни пациенти (в текущата транзакция)
+async def refresh_patients(db: AsyncSession, patient_ids: Iterable[int]) -> None:
+    ids = sorted(set(patient_ids))
+    if not ids:
+        return
+    catalog = await catalog_cache.get(db)
+    result = await db.execute(patients_with_vaccine_ids(Patient.id.in_(ids)))
+    await _write(db, summarize(*group_patient_rows(result.all()), catalog))
+    # Дължимите дати зависят от същите данни и се обновяват в същата транзакция
+    await due_dates.refresh_patients(db, ids)
+
+
+# 🏗️ Пълно преизчисляване на всички пациенти на пачки; връща броя обработени пациенти
+# Четящата и пишещата сесия са отделни връзки - под SQLite разчита на WAL (database.py)
+# missing_count зависи от възрастта към днес: пуска се всяка нощ (manage.py rebuild-compliance)
+async def rebuild_all(chunk_size: int = COMPLIANCE_REBUILD_CHUNK) -> int:
+    total = 0
+    today = date.today()
+    async with AsyncSessionLocal() as reader, AsyncSessionLocal() as writer:
+        catalog = await catalog_cache.get(writer)
+        await writer.commit()
+        async for ids, birth_dates, given in iter_patient_chunks(reader, None, chunk_size):
+            await _write(writer, summarize(ids, birth_dates, given, catalog, today))
+            await writer.commit()
+            total += len(ids)
+    return total
+
+
+# ⏱️ Фоново преизчисляване след промяна в каталога (не повече от едно едновременно)
+_rebuild_lock = asyncio.Lock()
+_rebuild_requested = False
+
+
+async def rebuild_in_background() -> None:
+    global _rebuild_requested
+    _rebuild_requested = True
+    if _rebuild_lock.locked():
+        # Текущото преизчисляване ще се повтори с новия каталог
+        return
+    async with _rebuild_lock:
+        while _rebuild_requested:
+            _rebuild_requested = False
+            try:
+                await rebuild_all()
+            except Exception as e:
+                logger.error("Compliance rebuild error: %s", e)
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+import numpy as np
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, engine
+from models import Patient, PatientVaccineDue, VaccineDueState
+from utils.catalog import CatalogSnapshot, catalog_cache
+from utils.queries import due_state_current, patients_with_given_dates
+from utils.schedule import first_due_months
+
+logger = logging.getLogger(__name__)
+
+# Брой пациенти в една транзакция при пълно преизчисляване
+DUE_DATES_REBUILD_CHUNK = int(os.getenv("DUE_DATES_REBUILD_CHUNK", 2000))
+
+
+# 🗓️ Месец на първа дължимост за всяка ваксина от каталога (-1: не е дължима)
+def catalog_due_months(catalog: CatalogSnapshot) -> Dict[int, int]:
+    return dict(zip(catalog.compiled.ids.tolist(), first_due_months(catalog.compiled).tolist()))
+
+
+# 🧮 Редове за patient_vaccine_due: всяка ваксина с месец >= 0 за всеки пациент
+# rows: (patient_id, doctor_id, birth_date, vaccine_id, first_date_given), подредени по пациент
+# months: {vaccine_id: месец на първа дължимост}
+def due_rows(rows, months: Dict[int, int]) -> List[dict]:
+    vaccine_ids = [vid for vid, month in months.items() if month >= 0]
+    offsets = np.array([months[vid] for vid in vaccine_ids], dtype=np.int64)
+
+    patients, given = [], []
+    for patient_id, doctor_id, birth_date, vaccine_id, date_given in rows:
+        if not patients or patients[-1][0] != patient_id:
+            patients.append((patient_id, doctor_id, birth_date))
+            given.append({})
+        if vaccine_id is not None:
+            given[-1][vaccine_id] = date_given
+    if not patients or not vaccine_ids:
+        return []
+
+    # Дължимата дата е 1-во число на месеца, в който пациентът навършва възрастта
+    born = np.array([p[2] for p in patients], dtype="datetime64[D]").astype("datetime64[M]")
+    due = (born[:, np.newaxis] + offsets.astype("timedelta64[M]")).astype("datetime64[D]").tolist()
+    return [
+        {
+            "patient_id": patient_id,
+            "vaccine_id": vaccine_id,
+            "doctor_id": doctor_id,
+            "due_date": due_date,
+            "given_date": given_dates.get(vaccine_id),
+        }
+        for (patient_id, doctor_id, _), given_dates, due_dates in zip(patients, given, due)
+        for vaccine_id, due_date in zip(vaccine_ids, due_dates)
+    ]
+
+
+async def _write(db: AsyncSession, patient_ids: List[int], rows: List[dict], *criteria) -> None:
+    await db.execute(delete(PatientVaccineDue).where(PatientVaccineDue.patient_id.in_(patient_ids), *criteria))
+    if rows:
+        # Core insert (executemany) - ORM bulk insert разделя редовете по това кои стойности са NULL
+        await db.execute(insert(PatientVaccineDue.__table__), rows)
+
+
+# Месеците, по които таблицата се пише в момента (и по време на преизчисляване - новите)
+async def _state_months(db: AsyncSession, vaccine_ids: Optional[Set[int]] = None) -> Dict[int, int]:
+    stmt = select(VaccineDueState.vaccine_id, VaccineDueState.first_due_month)
+    if vaccine_ids is not None:
+        stmt = stmt.where(VaccineDueState.vaccine_id.in_(vaccine_ids))
+    return dict((await db.execute(stmt)).all())
+
+
+# 🔄 Инкрементално обновяване за конкретни пациенти (в текущата транзакция)
+# Пише по месеците от vaccine_due_state, а не по каталога на процеса - така не разваля
+# преизчисляване, пуснато от друг процес с по-нов каталог
+async def refresh_patients(db: AsyncSession, patient_ids: Iterable[int]) -> None:
+    ids = sorted(set(patient_ids))
+    if not ids:
+        return
+    months = await _state_months(db)
+    result = await db.execute(patients_with_given_dates(Patient.id.in_(ids)))
+    await _write(db, ids, due_rows(result.all(), months))
+
+
+# 🏗️ Преизчисляване на пачки по id на пациента (всяка пачка в своя транзакция)
+# vaccine_ids=None - всички ваксини; иначе само редовете на тези ваксини. Връща броя пациенти
+# bind: друг engine (миграциите), по подразбиране този на приложението
+# Първо записва новите месеци с ready=False (четенията минават на смятане от имунизациите),
+# а ready=True - едва след последната пачка
+async def rebuild_all(
+    chunk_size: int = DUE_DATES_REBUILD_CHUNK,
+    vaccine_ids: Optional[Sequence[int]] = None,
+    bind: Optional[AsyncEngine] = None,
+) -> int:
+    only = set(vaccine_ids) if vaccine_ids is not None else None
+    criteria = [PatientVaccineDue.vaccine_id.in_(only)] if only is not None else []
+    total = 0
+    after = 0
+    async with AsyncSessionLocal(bind=bind or engine) as db:
+        catalog = await catalog_cache.get(db)
+        targets = {
+            vid: month for vid, month in catalog_due_months(catalog).items()
+            if only is None or vid in only
+        }
+        await db.execute(delete(VaccineDueState).where(VaccineDueState.vaccine_id.in_(targets)))
+        if targets:
+            await db.execute(insert(VaccineDueState.__table__), [
+                {"vaccine_id": vid, "first_due_month": month, "ready": False} for vid, month in targets.items()
+            ])
+        await db.commit()
+
+        while True:
+            result = await db.execute(
+                select(Patient.id).where(Patient.id > after).order_by(Patient.id).limit(chunk_size)
+            )
+            ids = list(result.scalars().all())
+            if not ids:
+                break
+            # Месеците се четат за всяка пачка - друг процес може да е сменил ваксината междувременно
+            months = await _state_months(db, only)
+            result = await db.execute(patients_with_given_dates(Patient.id.in_(ids), vaccine_ids=only))
+            await _write(db, ids, due_rows(result.all(), months), *criteria)
+            await db.commit()
+            total += len(ids)
+            after = ids[-1]
+            # Пускаме event loop-а между пачките - заявките не чакат цялото преизчисляване
+            await asyncio.sleep(0)
+
+        # Готово е само за ваксините, чийто месец никой не е сменил след началото
+        if targets:
+            state = VaccineDueState.__table__
+            await db.execute(
+                update(state)
+                .where(state.c.vaccine_id == bindparam("vid"), state.c.first_due_month == bindparam("month"))
+                .values(ready=True),
+                [{"vid": vid, "month": month} for vid, month in targets.items()],
+            )
+            await db.commit()
+    return total
+
+
+# ✅ Дали patient_vaccine_due е сметната по този каталог (иначе - смятане от имунизациите)
+async def table_current(db: AsyncSession, catalog: CatalogSnapshot) -> bool:
+    return bool(await db.scalar(select(due_state_current(catalog_due_months(catalog)))))
+
+
+# 🐢 Дължимите дати на пациентите на лекаря, сметнати от имунизациите по каталога
+# За прогнозата и просрочените, докато таблицата изостава; подредени като индексираните заявки
+class LiveDue(NamedTuple):
+    patient_id: int
+    first_name: str
+    last_name: str
+    vaccine_id: int
+    due_date: date
+    given_date: Optional[date]
+    birth_date: date
+
+
+async def live_doctor_due(db: AsyncSession, doctor_id: int, catalog: CatalogSnapshot) -> List[LiveDue]:
+    result = await db.execute(patients_with_given_dates(Patient.doctor_id == doctor_id))
+    rows = due_rows(result.all(), catalog_due_months(catalog))
+    result = await db.execute(
+        select(Patient.id, Patient.first_name, Patient.last_name, Patient.birth_date)
+        .where(Patient.doctor_id == doctor_id)
+    )
+    patients = {row[0]: row[1:] for row in result.all()}
+    due = [
+        LiveDue(
+            row["patient_id"], *patients[row["patient_id"]][:2], row["vaccine_id"],
+            row["due_date"], row["given_date"], patients[row["patient_id"]][2],
+        )
+        for row in rows
+    ]
+    return sorted(due, key=lambda d: (d.due_date, d.patient_id, d.vaccine_id))
+
+
+# ⏱️ Фоново преизчисляване на променените ваксини (не повече от едно едновременно в процеса)
+_rebuild_lock = asyncio.Lock()
+_pending: Set[int] = set()
+
+
+async def rebuild_in_background(vaccine_ids: Iterable[int]) -> None:
+    _pending.update(vaccine_ids)
+    if _rebuild_lock.locked():
+        # Текущото преизчисляване ще вземе и новите ваксини след като приключи
+        return
+    async with _rebuild_lock:
+        while _pending:
+            batch = sorted(_pending)
+            _pending.clear()
+            try:
+                total = await rebuild_all(vaccine_ids=batch)
+                logger.info("Due dates rebuilt for vaccines %s: %d patients", batch, total)
+            except Exception as e:
+                # Състоянието остава ready=False - четенията смятат от имунизациите до следващия опит
+                _pending.update(batch)
+                logger.error("Due dates rebuild error for vaccines %s: %s", batch, e)
+                return
+
+
+# 💉 Просрочените ваксини на пациент от редовете на patient_overdue_rows, в реда на каталога
+def overdue_vaccines(vaccine_ids: Iterable[Optional[int]], catalog: CatalogSnapshot) -> list:
+    overdue = set(vaccine_ids)
+    return [v for v in catalog.vaccines if v.id in overdue]
+
+
+# Ваксините, които остават дължими и в специалния прозорец (18-ти месец)
+def special_vaccine_ids(catalog: CatalogSnapshot) -> List[int]:
+    return catalog.compiled.ids[catalog.compiled.special].tolist()
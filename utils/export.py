@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+import os
+from datetime import date
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Immunization, Patient, Vaccine
+
+# Parquet е по избор - само ако pyarrow е инсталиран
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Брой редове, които се четат от курсора наведнъж
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", 5000))
+
+COLUMNS = [
+    "patient_id", "first_name", "last_name", "egn", "birth_date",
+    "immunization_id", "vaccine_id", "vaccine_name", "date_given",
+]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def available_formats() -> List[str]:
+    return ["csv", "ndjson"] + (["parquet"] if pa is not None else [])
+
+
+# 🔗 Пациенти на лекаря с имунизациите им (по един ред на имунизация)
+def registry_rows(doctor_id: int):
+    return (
+        select(
+            Patient.id, Patient.first_name, Patient.last_name, Patient.egn, Patient.birth_date,
+            Immunization.id, Immunization.vaccine_id, Vaccine.name, Immunization.date_given,
+        )
+        .outerjoin(Immunization, Immunization.patient_id == Patient.id)
+        .outerjoin(Vaccine, Vaccine.id == Immunization.vaccine_id)
+        .where(Patient.doctor_id == doctor_id)
+        .order_by(Patient.id, Immunization.id)
+    )
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def _csv_chunk(rows, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def _ndjson_chunk(rows) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(COLUMNS, map(_json_value, row))), ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+
+# 📦 Файлов обект за pyarrow, който само натрупва байтове до следващото изпразване
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("patient_id", pa.int64()), ("first_name", pa.string()), ("last_name", pa.string()),
+        ("egn", pa.string()), ("birth_date", pa.date32()), ("immunization_id", pa.int64()),
+        ("vaccine_id", pa.int64()), ("vaccine_name", pa.string()), ("date_given", pa.date32()),
+    ])
+
+
+# 🌊 Експорт като поток байтове; всяка пачка от курсора става едно парче от отговора
+async def iter_export(doctor_id: int, fmt: str, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    chunk_size = chunk_size or EXPORT_CHUNK
+    sink = writer = None
+    if fmt == "parquet":
+        sink = _ChunkSink()
+        schema = _parquet_schema()
+        writer = pq.ParquetWriter(sink, schema)
+
+    first = True
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(registry_rows(doctor_id).execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield _csv_chunk(rows, header=first)
+            elif fmt == "ndjson":
+                yield _ndjson_chunk(rows)
+            else:
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+                yield sink.drain()
+            first = False
+
+    if fmt == "csv" and first:
+        yield _csv_chunk([], header=True)
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
@@ -0,0 +1,40 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Sequence
+
+from fastapi import Response
+
+# orjson е по избор - без него се ползва стандартният json модул
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} не се сериализира в JSON")
+
+
+# ⚡ JSON байтове без pydantic (orjson сериализира date/datetime директно)
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+# 📋 Редове (tuple) към речници по имената на колоните
+def rows_as_dicts(columns: Sequence[str], rows: Iterable[Sequence]) -> List[dict]:
+    return [dict(zip(columns, row)) for row in rows]
+
+
+# Отговор, който пропуска response_model валидацията и сериализира с dumps
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
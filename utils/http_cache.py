@@ -0,0 +1,61 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Отговорите са лични (зависят от лекаря); клиентът пази копие, но винаги проверява с ETag
+API_CACHE_CONTROL = os.getenv("API_CACHE_CONTROL", "private, no-cache")
+
+
+# 🏷️ Слаб ETag от частите, от които зависи отговорът
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # SQLite връща naive стойности от CURRENT_TIMESTAMP (UTC)
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def latest(*moments: Optional[datetime]) -> Optional[datetime]:
+    values = [_as_utc(m) for m in moments if m is not None]
+    return max(values) if values else None
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": API_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+# Клиентът има копие и пита дали е актуално
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+# ✅ Дали клиентското копие е актуално (If-None-Match има предимство пред If-Modified-Since)
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+    return False
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
@@ -0,0 +1,130 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+
+# Размер на пачка записи (една транзакция) и таван на върнатите грешки
+INGEST_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+CSV_TYPES = {"text/csv", "application/csv"}
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines"}
+
+
+# 🔎 Формат по Content-Type или по разширението на файла
+def detect_format(content_type: Optional[str], filename: Optional[str] = None) -> Optional[str]:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in CSV_TYPES or (filename or "").lower().endswith(".csv"):
+        return "csv"
+    if media_type in NDJSON_TYPES or (filename or "").lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+# 📄 Редове от поток байтове (UTF-8, с или без BOM)
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+# 📥 (номер на ред, запис) или (номер на ред, съобщение за грешка) - празните редове се пропускат
+# CSV запис в кавички може да съдържа нов ред: физическите редове се събират, докато
+# кавичките се затворят (четен брой "), и номерът е на първия ред на записа
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, object]]:
+    header: Optional[List[str]] = None
+    row = 0
+    start, pending = 0, None
+    async for line in iter_lines(chunks):
+        row += 1
+        if fmt == "csv" and pending is not None:
+            line = pending + "\n" + line
+        elif not line.strip():
+            continue
+        else:
+            start = row
+        if fmt == "csv":
+            if line.count('"') % 2:
+                pending = line
+                continue
+            pending = None
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                yield start, f"Очаквани {len(header)} колони, получени {len(values)}"
+                continue
+            yield start, dict(zip(header, values))
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row, f"Невалиден JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row, "Очаква се JSON обект"
+                continue
+            yield row, record
+    if pending is not None:
+        yield start, "Незатворени кавички"
+
+
+# 📦 Групира записите на пачки от (номер на ред, запис | грешка)
+async def iter_batches(records: AsyncIterator[Tuple[int, object]], size: int = INGEST_BATCH_SIZE):
+    batch = []
+    async for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# 📤 Поток байтове от качен файл (web upload)
+async def upload_chunks(file: UploadFile, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+
+# 🧾 Отчет за импорт: брой успешни и списък с грешки по редове
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors: List[dict] = []
+
+    def error(self, row: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "error_count": self.error_count,
+            "errors": sorted(self.errors, key=lambda e: e["row"]),
+        }
+
+
+# ⚠️ Кратко съобщение от pydantic ValidationError
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
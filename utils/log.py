@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# Идентификатор на текущата заявка (задава се от RequestIdMiddleware)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LOG_LEVEL=INFO, LOG_LEVELS="crud=DEBUG,routers.auth=WARNING", LOG_SAMPLING="routers.auth=0.1"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+_listener: Optional[QueueListener] = None
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    mapping = {}
+    for item in value.split(","):
+        name, _, setting = item.partition("=")
+        if name.strip() and setting.strip():
+            mapping[name.strip()] = setting.strip()
+    return mapping
+
+
+# 🧾 JSON ред за всеки запис; допълнителни полета идват от extra={"fields": {...}}
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# 🎲 Семплиране по logger (най-специфичният префикс печели); WARNING и нагоре винаги минават
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def rate_for(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return self.rates.get("", 1.0)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.rate_for(record.name)
+
+
+# 📮 Handler, който само слага записа в опашката; форматирането е в нишката на listener-а
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        # Съобщението се фиксира тук, за да не зависи от по-късни промени в аргументите
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Препълнена опашка: губим записа вместо да блокираме event loop-а
+            pass
+
+
+def setup_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    rates = {name: float(rate) for name, rate in _parse_mapping(os.getenv("LOG_SAMPLING", "")).items()}
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in _parse_mapping(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# 🆔 Middleware: взима X-Request-ID или генерира нов и го връща в отговора
+class RequestIdMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,212 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+
+# Граници на хистограмите в секунди (латентност) и в брой заявки към базата
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# Пътят, под който пишем заявки без съвпадащ route (за да не растат етикетите безкрайно)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+# 📊 Хистограма с натрупващи се кофи (Prometheus формат)
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels}le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels.rstrip(',')}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels.rstrip(',')}}} {self.count}"
+
+
+# 🧮 Броячи за текущата заявка (попълват се от събитията на engine-а и от шаблоните)
+class RequestMetrics:
+    __slots__ = ("queries", "db_time", "render_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# 📈 Всички метрики на процеса; само прости операции в event loop-а, без заключване
+class MetricsRegistry:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.request_db_time: Dict[Tuple[str, str], Histogram] = {}
+        self.templates: Dict[str, Histogram] = {}
+        self.db_queries = 0
+        self.db_time = 0.0
+
+    @staticmethod
+    def _histogram(store: dict, key, buckets) -> Histogram:
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, request: RequestMetrics) -> None:
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        route_key = (method, route)
+        self._histogram(self.latency, route_key, LATENCY_BUCKETS).observe(seconds)
+        self._histogram(self.request_queries, route_key, QUERY_COUNT_BUCKETS).observe(request.queries)
+        self._histogram(self.request_db_time, route_key, LATENCY_BUCKETS).observe(request.db_time)
+
+    def observe_query(self, seconds: float) -> None:
+        self.db_queries += 1
+        self.db_time += seconds
+        request = current_request.get()
+        if request is not None:
+            request.queries += 1
+            request.db_time += seconds
+
+    def observe_render(self, template: str, seconds: float) -> None:
+        self._histogram(self.templates, template, LATENCY_BUCKETS).observe(seconds)
+        request = current_request.get()
+        if request is not None:
+            request.render_time += seconds
+
+    # 📝 Текстов формат за Prometheus (/metrics)
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Заявки, които се обработват в момента",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Брой завършени заявки",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+        histograms = (
+            ("http_request_duration_seconds", "Латентност на заявката", self.latency),
+            ("http_request_db_queries", "Брой SQL заявки на една HTTP заявка", self.request_queries),
+            ("http_request_db_seconds", "Време в базата на една HTTP заявка", self.request_db_time),
+        )
+        for name, help_text, store in histograms:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (method, route), histogram in sorted(store.items()):
+                lines.extend(histogram.lines(name, f'method="{method}",route="{_escape(route)}",'))
+
+        lines += [
+            "# HELP template_render_seconds Време за рендериране на шаблон",
+            "# TYPE template_render_seconds histogram",
+        ]
+        for template, histogram in sorted(self.templates.items()):
+            lines.extend(histogram.lines("template_render_seconds", f'template="{_escape(template)}",'))
+
+        lines += [
+            "# HELP db_queries_total Всички SQL заявки (вкл. фонови задачи)",
+            "# TYPE db_queries_total counter",
+            f"db_queries_total {self.db_queries}",
+            "# HELP db_query_seconds_total Общо време в SQL заявки",
+            "# TYPE db_query_seconds_total counter",
+            f"db_query_seconds_total {self.db_time:.6f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# 🔌 Време на всяка SQL заявка през събитията на engine-а
+def instrument_engine(engine) -> None:
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        metrics.observe_query(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # Неуспешната заявка не стига до after_cursor_execute
+        stack = context.connection.info.get("query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+# 🖼️ Jinja2Templates, които мерят рендерирането (TemplateResponse рендерира веднага)
+class InstrumentedTemplates(Jinja2Templates):
+    def TemplateResponse(self, name: str, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().TemplateResponse(name, *args, **kwargs)
+        finally:
+            metrics.observe_render(name, time.perf_counter() - started)
+
+
+# ⏱️ ASGI middleware: брояч, латентност и in-flight по шаблона на пътя (/patients/{patient_id})
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[object, str]] = None
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._routes is None:
+            routes = {}
+            for route in getattr(scope.get("app"), "routes", []):
+                routes.setdefault(getattr(route, "endpoint", None), route.path)
+            self._routes = routes
+        return self._routes.get(endpoint, UNMATCHED_ROUTE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request = RequestMetrics()
+        token = current_request.set(request)
+        status_code = 500
+        started = time.perf_counter()
+        metrics.in_flight += 1
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_flight -= 1
+            current_request.reset(token)
+            metrics.observe_request(
+                scope["method"], self._route_path(scope), status_code, time.perf_counter() - started, request
+            )
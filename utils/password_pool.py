@@ -0,0 +1,86 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# bcrypt освобождава GIL, затова нишките дават реален паралелизъм
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", PASSWORD_HASH_WORKERS * 4))
+
+
+class PoolSaturated(Exception):
+    """Опашката за хеширане е пълна - заявката трябва да се откаже веднага"""
+
+
+# 📈 Брояч за латентност: брой, сума и максимум в секунди
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+# 🔐 Ограничен пул за bcrypt извън event loop-а
+class PasswordPool:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()  # pending се намалява от работните нишки
+        self.pending = 0
+        self.rejected = 0
+        self.latency = _Timing()
+        self.queue_wait = _Timing()
+
+    async def run(self, fn: Callable, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated()
+            self.pending += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            return fn(*args), started, time.perf_counter()
+
+        # pending пада, когато задачата наистина приключи (или е махната от опашката), а не когато
+        # чакащата заявка бъде прекъсната - иначе прекъснатите заявки пълнят опашката незабелязано
+        future = self._executor.submit(job)
+        future.add_done_callback(self._release)
+        result, started, finished = await asyncio.wrap_future(future)
+        # Метриките се записват в event loop-а, не в работните нишки
+        self.queue_wait.observe(started - submitted)
+        self.latency.observe(finished - started)
+        return result
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            "hash_latency": self.latency.as_dict(),
+            "queue_wait": self.queue_wait.as_dict(),
+        }
+
+
+password_pool = PasswordPool()
@@ -0,0 +1,259 @@
+import time
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, text
+from sqlalchemy.future import select
+
+from models import Doctor, Immunization, Patient, Vaccine
+
+# Национален календар (месец на препоръка) - ползва се, ако каталогът е празен
+DEFAULT_CATALOG = [
+    ("BCG", 0), ("HepB-1", 0), ("HepB-2", 1), ("DTaP-IPV-Hib-HepB-1", 2), ("PCV-1", 2),
+    ("DTaP-IPV-Hib-HepB-2", 3), ("PCV-2", 4), ("DTaP-IPV-Hib-HepB-3", 4), ("PCV-3", 12),
+    ("MMR-1", 13), ("DTaP-IPV-Hib-HepB-4", 16), ("DTaP-IPV", 72), ("MMR-2", 144), ("Td", 144),
+]
+
+MALE_FIRST = ["Георги", "Иван", "Димитър", "Николай", "Петър", "Александър", "Стоян", "Мартин", "Виктор", "Калоян"]
+FEMALE_FIRST = ["Мария", "Иванка", "Елена", "Йорданка", "Десислава", "Виктория", "Никол", "Габриела", "Симона", "Радост"]
+LAST_NAMES = ["Иванов", "Георгиев", "Димитров", "Петров", "Николов", "Христов", "Стоянов", "Тодоров", "Илиев", "Василев",
+              "Атанасов", "Петков", "Ангелов", "Колев", "Йорданов", "Маринов", "Стефанов", "Попов", "Михайлов", "Костов"]
+
+EGN_WEIGHTS = np.array([2, 4, 8, 5, 10, 9, 7, 3, 6])
+# За една дата и пол има 500 поредни номера (деветата цифра е четна за мъж, нечетна за жена)
+EGN_SEQUENCES = 500
+# Най-голям дял заети поредни номера: над него пренасочването към свободни дни става бавно
+EGN_FILL = 0.8
+DEFAULT_MAX_AGE_YEARS = 18
+DAYS_PER_MONTH = 30.4375
+
+
+# Брой възможни дати на раждане (възраст в дни 0..span-1)
+def age_span_days(max_age_years: int) -> int:
+    return max_age_years * 365 + max_age_years // 4 + 1
+
+
+# 🔢 Колко пациента се генерират с уникални ЕГН-та: дни x 2 пола x поредни номера, с резерв EGN_FILL
+def egn_capacity(max_age_years: int) -> int:
+    return int(age_span_days(max_age_years) * 2 * EGN_SEQUENCES * EGN_FILL)
+
+
+def min_age_years(patients: int) -> int:
+    years = 0
+    while egn_capacity(years) < patients:
+        years += 1
+    return years
+
+
+# 🧬 Параметри на генерирания набор
+class PopulationSpec:
+    def __init__(
+        self,
+        patients: int,
+        doctors: int = 200,
+        seed: int = 1,
+        max_age_years: Optional[int] = None,
+        compliance: float = 0.92,
+        compliance_by: Optional[Dict[str, float]] = None,
+        mean_delay_days: float = 14.0,
+        today: Optional[date] = None,
+    ):
+        self.patients = patients
+        self.doctors = doctors
+        self.seed = seed
+        # По подразбиране 18 години, а при по-голям набор - колкото е нужно за уникални ЕГН-та
+        if max_age_years is None:
+            max_age_years = max(DEFAULT_MAX_AGE_YEARS, min_age_years(patients))
+        self.max_age_years = max_age_years
+        if patients > egn_capacity(self.max_age_years):
+            raise ValueError(
+                f"{patients} пациента не се побират в уникални ЕГН-та за възраст до {self.max_age_years} г."
+                f" (най-много {egn_capacity(self.max_age_years)}; нужни са поне {min_age_years(patients)} г.)"
+            )
+        self.compliance = compliance
+        self.compliance_by = compliance_by or {}
+        self.mean_delay_days = mean_delay_days
+        self.today = today or date.today()
+
+
+# 📅 Вероятност за раждане по ден: по-големи по-стари кохорти и лек летен пик
+def birth_day_weights(spec: PopulationSpec) -> np.ndarray:
+    age_days = np.arange(age_span_days(spec.max_age_years))
+    birth = np.datetime64(spec.today) - age_days.astype("timedelta64[D]")
+    day_of_year = (birth - birth.astype("datetime64[Y]")).astype(int)
+    weights = (1 + 0.015 * age_days / 365.25) * (1 + 0.05 * np.sin(2 * np.pi * (day_of_year - 100) / 365.25))
+    return weights / weights.sum()
+
+
+# 🔢 Контролна цифра на ЕГН за масив от 9-цифрени префикси (n, 9)
+def egn_checksum(digits: np.ndarray) -> np.ndarray:
+    remainder = (digits * EGN_WEIGHTS).sum(axis=1) % 11
+    return np.where(remainder == 10, 0, remainder)
+
+
+def format_egns(birth: np.ndarray, sequences: np.ndarray) -> List[str]:
+    years = birth.astype("datetime64[Y]").astype(int) + 1970
+    months = birth.astype("datetime64[M]").astype(int) % 12 + 1
+    days = (birth - birth.astype("datetime64[M]")).astype(int) + 1
+    months = months + np.where(years >= 2000, 40, np.where(years < 1900, 20, 0))
+    digits = np.stack([
+        years % 100 // 10, years % 10, months // 10, months % 10, days // 10, days % 10,
+        sequences // 100, sequences // 10 % 10, sequences % 10,
+    ], axis=1)
+    numbers = digits @ (10 ** np.arange(9, 0, -1)) + egn_checksum(digits)
+    return [f"{number:010d}" for number in numbers.tolist()]
+
+
+# 🏭 Генератор на пациенти и имунизации на пачки (детерминиран по seed)
+class PopulationGenerator:
+    def __init__(self, spec: PopulationSpec, doctor_ids: List[int], vaccines: List[Tuple[int, str, int]]):
+        self.spec = spec
+        self.rng = np.random.default_rng(spec.seed)
+        self.doctor_ids = np.array(doctor_ids)
+        self.vaccine_ids = np.array([v[0] for v in vaccines])
+        self.vaccine_months = np.array([v[2] for v in vaccines])
+        self.vaccine_rates = np.array([spec.compliance_by.get(v[1], spec.compliance) for v in vaccines])
+        self.day_weights = birth_day_weights(spec)
+        # Използвани поредни номера за (ден назад, пол)
+        self.used_sequences = np.zeros(len(self.day_weights) * 2, dtype=np.int64)
+
+    def _age_days_and_sequences(self, sex: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(sex)
+        age_days = self.rng.choice(len(self.day_weights), size=n, p=self.day_weights)
+        sequences = np.full(n, -1)
+        pending = np.arange(n)
+        while len(pending):
+            keys = age_days[pending] * 2 + sex[pending]
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            first = np.searchsorted(sorted_keys, sorted_keys, side="left")
+            rank = np.empty(len(pending), dtype=np.int64)
+            rank[order] = np.arange(len(pending)) - first
+            numbers = self.used_sequences[keys] + rank
+            ok = numbers < EGN_SEQUENCES
+            sequences[pending[ok]] = numbers[ok] * 2 + sex[pending[ok]]
+            np.add.at(self.used_sequences, keys[ok], 1)
+            # Изчерпаните дати се преразпределят към друг ден - само сред дните със свободни номера за пола
+            pending = pending[~ok]
+            for value in (0, 1):
+                group = pending[sex[pending] == value]
+                if not len(group):
+                    continue
+                free = self.day_weights * (self.used_sequences[value::2] < EGN_SEQUENCES)
+                if not free.any():
+                    raise ValueError("Няма свободни ЕГН-та за периода - увеличете max_age_years")
+                age_days[group] = self.rng.choice(len(free), size=len(group), p=free / free.sum())
+        return age_days, sequences
+
+    def chunk(self, first_id: int, size: int) -> Tuple[List[dict], List[dict]]:
+        today = np.datetime64(self.spec.today)
+        sex = self.rng.integers(0, 2, size=size)
+        age_days, sequences = self._age_days_and_sequences(sex)
+        birth = today - age_days.astype("timedelta64[D]")
+        egns = format_egns(birth, sequences)
+        doctors = self.rng.choice(self.doctor_ids, size=size)
+        first_names = np.where(
+            sex == 0, self.rng.choice(MALE_FIRST, size=size), self.rng.choice(FEMALE_FIRST, size=size)
+        )
+        last_names = self.rng.choice(LAST_NAMES, size=size)
+        last_names = np.where(sex == 0, last_names, np.char.add(last_names, "а"))
+
+        ids = np.arange(first_id, first_id + size)
+        birth_dates = birth.astype(object)
+        patients = [
+            {"id": pid, "first_name": fn, "last_name": ln, "egn": egn, "birth_date": bd, "doctor_id": did}
+            for pid, fn, ln, egn, bd, did in zip(
+                ids.tolist(), first_names.tolist(), last_names.tolist(), egns, birth_dates, doctors.tolist()
+            )
+        ]
+
+        # Поставена е, ако е дължима по възраст и пациентът е "спазил" графика за нея
+        due_days = np.rint(self.vaccine_months * DAYS_PER_MONTH).astype(np.int64)
+        delay = self.rng.exponential(self.spec.mean_delay_days, size=(size, len(due_days))).astype(np.int64)
+        given_after = due_days[None, :] + delay
+        given = (given_after <= age_days[:, None]) & (self.rng.random((size, len(due_days))) < self.vaccine_rates)
+        rows, columns = np.nonzero(given)
+        dates = (birth[rows] + given_after[rows, columns].astype("timedelta64[D]")).astype(object)
+        immunizations = [
+            {"patient_id": pid, "vaccine_id": vid, "date_given": dg, "doctor_id": did}
+            for pid, vid, dg, did in zip(
+                ids[rows].tolist(), self.vaccine_ids[columns].tolist(), dates, doctors[rows].tolist()
+            )
+        ]
+        return patients, immunizations
+
+    def chunks(self, first_id: int, chunk_size: int) -> Iterator[Tuple[List[dict], List[dict]]]:
+        for offset in range(0, self.spec.patients, chunk_size):
+            yield self.chunk(first_id + offset, min(chunk_size, self.spec.patients - offset))
+
+
+async def _copy(conn, table, rows: List[dict]) -> None:
+    # asyncpg: COPY ... FROM STDIN в двоичен формат
+    columns = list(rows[0])
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        table.name, records=[tuple(row[c] for c in columns) for row in rows], columns=columns
+    )
+
+
+async def _load(conn, table, rows: List[dict]) -> None:
+    if not rows:
+        return
+    if conn.dialect.driver == "asyncpg":
+        await _copy(conn, table, rows)
+    else:
+        # executemany - драйверът праща редовете на многоредови пачки
+        await conn.execute(insert(table), rows)
+
+
+async def _prepare(conn, spec: PopulationSpec, password_hash: str) -> Tuple[List[int], List[Tuple[int, str, int]]]:
+    if (await conn.execute(select(func.count(Patient.id)))).scalar():
+        raise ValueError("Таблицата patients не е празна - генераторът очаква празна база (ЕГН-тата трябва да са уникални)")
+
+    if not (await conn.execute(select(func.count(Vaccine.id)))).scalar():
+        await conn.execute(insert(Vaccine.__table__), [
+            {"name": name, "recommended_month": month, "is_mandatory": True} for name, month in DEFAULT_CATALOG
+        ])
+    result = await conn.execute(
+        select(Vaccine.id, Vaccine.name, Vaccine.recommended_month)
+        .where(Vaccine.recommended_month.isnot(None))
+        .order_by(Vaccine.id)
+    )
+    vaccines = [tuple(row) for row in result]
+
+    usernames = [f"gen-{spec.seed}-doctor-{i:04d}" for i in range(spec.doctors)]
+    existing = set((await conn.execute(select(Doctor.username).where(Doctor.username.in_(usernames)))).scalars())
+    missing = [{"username": name, "hashed_password": password_hash} for name in usernames if name not in existing]
+    if missing:
+        await conn.execute(insert(Doctor.__table__), missing)
+    result = await conn.execute(select(Doctor.id).where(Doctor.username.in_(usernames)).order_by(Doctor.id))
+    return list(result.scalars()), vaccines
+
+
+# 🚚 Генерира и зарежда набора; всяка пачка е отделна транзакция. Връща броя редове
+async def generate_population(engine, spec: PopulationSpec, password_hash: str, chunk_size: int = 50000, progress=None) -> dict:
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        doctor_ids, vaccines = await _prepare(conn, spec, password_hash)
+        first_id = ((await conn.execute(select(func.max(Patient.id)))).scalar() or 0) + 1
+
+    generator = PopulationGenerator(spec, doctor_ids, vaccines)
+    totals = {"doctors": len(doctor_ids), "patients": 0, "immunizations": 0}
+    for patients, immunizations in generator.chunks(first_id, chunk_size):
+        async with engine.begin() as conn:
+            await _load(conn, Patient.__table__, patients)
+            await _load(conn, Immunization.__table__, immunizations)
+        totals["patients"] += len(patients)
+        totals["immunizations"] += len(immunizations)
+        if progress:
+            progress(totals, time.perf_counter() - started)
+
+    if engine.dialect.name == "postgresql":
+        # Явните id-та не местят sequence-а
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('patients', 'id'), (SELECT MAX(id) FROM patients))"
+            ))
+    totals["seconds"] = round(time.perf_counter() - started, 2)
+    return totals
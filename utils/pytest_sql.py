@@ -0,0 +1,24 @@
+"""pytest plugin за бюджет на SQL заявки.
+
+    # conftest.py
+    pytest_plugins = ["utils.pytest_sql"]
+
+    async def test_dashboard(client, sql_queries):
+        with sql_queries(max_queries=3):
+            await client.get("/dashboard")
+"""
+import pytest
+
+from database import engine
+from utils.sql_profile import N_PLUS_ONE_THRESHOLD, capture_queries, instrument_engine
+
+
+@pytest.fixture
+def sql_queries():
+    """Връща capture_queries: брои заявките в блока и пада при надвишен бюджет или N+1"""
+    instrument_engine(engine)
+
+    def capture(max_queries=None, n_plus_one=N_PLUS_ONE_THRESHOLD):
+        return capture_queries(max_queries=max_queries, n_plus_one=n_plus_one)
+
+    return capture
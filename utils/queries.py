@@ -0,0 +1,342 @@
+import base64
+import json
+from datetime import date
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, exists, func, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased, joinedload
+
+from models import Immunization, Patient, PatientCompliance, PatientVaccineDue, VaccineDueState
+from utils.schedule import special_window_births
+
+
+# 🔗 Пациент на даден лекар заедно с имунизациите му - един SELECT с JOIN
+# with_compliance: заедно с обобщението (в същата заявка)
+def patient_with_immunizations(patient_id: int, doctor_id: int, with_compliance: bool = False):
+    stmt = (
+        select(Patient)
+        .options(joinedload(Patient.immunizations))
+        .where(Patient.id == patient_id, Patient.doctor_id == doctor_id)
+    )
+    if with_compliance:
+        stmt = stmt.options(joinedload(Patient.compliance))
+    return stmt
+
+
+# 📥 Зарежда пациента (или None, ако не е на този лекар) с едно отиване до базата
+async def load_patient_with_immunizations(
+    db: AsyncSession, patient_id: int, doctor_id: int, with_compliance: bool = False
+) -> Optional[Patient]:
+    result = await db.execute(patient_with_immunizations(patient_id, doctor_id, with_compliance))
+    return result.unique().scalar_one_or_none()
+
+
+# 🔗 Пациенти (id, birth_date) с vaccine_id на имунизациите им, подредени по пациент
+def patients_with_vaccine_ids(*criteria):
+    return (
+        select(Patient.id, Patient.birth_date, Immunization.vaccine_id)
+        .outerjoin(Immunization, Immunization.patient_id == Patient.id)
+        .where(*criteria)
+        .order_by(Patient.id)
+    )
+
+
+def doctor_patients_with_immunizations(doctor_id: int):
+    return patients_with_vaccine_ids(Patient.doctor_id == doctor_id)
+
+
+# 📦 Групира редовете от горната заявка по пациент
+def group_patient_rows(rows) -> Tuple[List[int], List[date], List[List[int]]]:
+    ids: List[int] = []
+    birth_dates: List[date] = []
+    given: List[List[int]] = []
+    for patient_id, birth_date, vaccine_id in rows:
+        if not ids or ids[-1] != patient_id:
+            ids.append(patient_id)
+            birth_dates.append(birth_date)
+            given.append([])
+        if vaccine_id is not None:
+            given[-1].append(vaccine_id)
+    return ids, birth_dates, given
+
+
+# 🌊 Чете пациентите (на лекаря или всички при doctor_id=None) със server-side курсор
+# и връща пачки от цели пациенти: (patient_ids, birth_dates, [vaccine_id-та за всеки пациент])
+async def iter_patient_chunks(
+    db: AsyncSession, doctor_id: Optional[int], chunk_size: int
+) -> AsyncIterator[Tuple[List[int], List[date], List[List[int]]]]:
+    criteria = [Patient.doctor_id == doctor_id] if doctor_id is not None else []
+    stmt = patients_with_vaccine_ids(*criteria).execution_options(yield_per=chunk_size)
+    result = await db.stream(stmt)
+
+    ids: List[int] = []
+    birth_dates: List[date] = []
+    given: List[List[int]] = []
+    async for rows in result.partitions():
+        for patient_id, birth_date, vaccine_id in rows:
+            if not ids or ids[-1] != patient_id:
+                ids.append(patient_id)
+                birth_dates.append(birth_date)
+                given.append([])
+            if vaccine_id is not None:
+                given[-1].append(vaccine_id)
+
+        # Последният пациент може да продължава в следващата пачка
+        if len(ids) > chunk_size:
+            yield ids[:-1], birth_dates[:-1], given[:-1]
+            ids, birth_dates, given = ids[-1:], birth_dates[-1:], given[-1:]
+
+    if ids:
+        yield ids, birth_dates, given
+
+
+# 🔖 Курсор за keyset пагинация: непрозрачен base64 от (last_name, id)
+def encode_cursor(patient) -> str:
+    raw = json.dumps([patient.last_name, patient.id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        last_name, patient_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(last_name), int(patient_id)
+    except Exception:
+        raise ValueError("Невалиден курсор")
+
+
+# 📄 Страница пациенти на лекаря, подредени по (last_name, id), с филтри
+def patients_page(
+    doctor_id: int,
+    limit: int,
+    after: Optional[str] = None,
+    born_from: Optional[date] = None,
+    born_to: Optional[date] = None,
+    name_prefix: Optional[str] = None,
+):
+    stmt = select(Patient).options(joinedload(Patient.compliance)).where(Patient.doctor_id == doctor_id)
+    return _page(stmt, limit, after, born_from, born_to, name_prefix)
+
+
+# Keyset условие и филтри, общи за страниците с пациенти
+# limit=None - всички редове (без страниране)
+def _page(stmt, limit: Optional[int], after, born_from, born_to, name_prefix):
+    if after:
+        stmt = stmt.where(tuple_(Patient.last_name, Patient.id) > decode_cursor(after))
+    if born_from:
+        stmt = stmt.where(Patient.birth_date >= born_from)
+    if born_to:
+        stmt = stmt.where(Patient.birth_date <= born_to)
+    if name_prefix:
+        stmt = stmt.where(Patient.last_name.startswith(name_prefix, autoescape=True))
+    stmt = stmt.order_by(Patient.last_name, Patient.id)
+    if limit is None:
+        return stmt
+    # Един ред повече, за да знаем дали има следваща страница
+    return stmt.limit(limit + 1)
+
+
+async def load_patients_page(db: AsyncSession, doctor_id: int, limit: int, **filters) -> Tuple[List[Patient], Optional[str]]:
+    result = await db.execute(patients_page(doctor_id, limit, **filters))
+    patients = result.scalars().all()
+    if len(patients) > limit:
+        patients = patients[:limit]
+        return patients, encode_cursor(patients[-1])
+    return patients, None
+
+
+# Колоните на PatientSummaryOut (пациент + обобщение) като плоски стойности
+PATIENT_SUMMARY_COLUMNS = (
+    Patient.id, Patient.first_name, Patient.last_name, Patient.egn, Patient.birth_date, Patient.doctor_id,
+    PatientCompliance.given_count, PatientCompliance.missing_count, PatientCompliance.next_due_date,
+)
+
+
+# ⚡ Същата страница като patients_page, но само нужните колони (без ORM обекти)
+def patient_summary_rows_page(
+    doctor_id: int,
+    limit: Optional[int],
+    after: Optional[str] = None,
+    born_from: Optional[date] = None,
+    born_to: Optional[date] = None,
+    name_prefix: Optional[str] = None,
+):
+    stmt = (
+        select(*PATIENT_SUMMARY_COLUMNS)
+        .outerjoin(PatientCompliance, PatientCompliance.patient_id == Patient.id)
+        .where(Patient.doctor_id == doctor_id)
+    )
+    return _page(stmt, limit, after, born_from, born_to, name_prefix)
+
+
+async def load_patient_summary_rows(
+    db: AsyncSession, doctor_id: int, limit: Optional[int], **filters
+) -> Tuple[list, Optional[str]]:
+    result = await db.execute(patient_summary_rows_page(doctor_id, limit, **filters))
+    rows = result.all()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+# ⚡ Имунизациите на пациент като редове; (None, ...) ако пациентът няма имунизации,
+# празен резултат - ако пациентът не е на този лекар
+def patient_immunization_rows(patient_id: int, doctor_id: int):
+    return (
+        select(
+            Immunization.id, Immunization.patient_id, Immunization.vaccine_id,
+            Immunization.date_given, Immunization.doctor_id,
+        )
+        .select_from(Patient)
+        .outerjoin(Immunization, Immunization.patient_id == Patient.id)
+        .where(Patient.id == patient_id, Patient.doctor_id == doctor_id)
+        .order_by(Immunization.id)
+    )
+
+
+# ❌ Изтрива пациенти на лекаря с една заявка; имунизациите и обобщението падат по ON DELETE CASCADE
+def delete_doctor_patients(doctor_id: int, patient_ids: List[int]):
+    return (
+        delete(Patient)
+        .where(Patient.doctor_id == doctor_id, Patient.id.in_(patient_ids))
+        .returning(Patient.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Връща id-тата на реално изтритите пациенти (чуждите и несъществуващите се пропускат)
+async def remove_patients(db: AsyncSession, doctor_id: int, patient_ids: List[int]) -> List[int]:
+    if not patient_ids:
+        return []
+    result = await db.execute(delete_doctor_patients(doctor_id, patient_ids))
+    return list(result.scalars().all())
+
+
+# 🏷️ Всичко, от което зависи графикът на пациента, с една агрегатна заявка (за ETag)
+def patient_schedule_version(patient_id: int, doctor_id: int):
+    return (
+        select(
+            Patient.birth_date,
+            func.count(Immunization.id),
+            func.max(Immunization.created_at),
+            PatientCompliance.updated_at,
+        )
+        .outerjoin(Immunization, Immunization.patient_id == Patient.id)
+        .outerjoin(PatientCompliance, PatientCompliance.patient_id == Patient.id)
+        .where(Patient.id == patient_id, Patient.doctor_id == doctor_id)
+        .group_by(Patient.id, Patient.birth_date, PatientCompliance.updated_at)
+    )
+
+
+# 🔗 Пациенти (id, doctor_id, birth_date) с датата на първото поставяне на всяка ваксина
+# vaccine_ids: само имунизациите с тези ваксини
+def patients_with_given_dates(*criteria, vaccine_ids=None):
+    on = Immunization.patient_id == Patient.id
+    if vaccine_ids is not None:
+        on = and_(on, Immunization.vaccine_id.in_(vaccine_ids))
+    return (
+        select(
+            Patient.id, Patient.doctor_id, Patient.birth_date,
+            Immunization.vaccine_id, func.min(Immunization.date_given),
+        )
+        .outerjoin(Immunization, on)
+        .where(*criteria)
+        .group_by(Patient.id, Patient.doctor_id, Patient.birth_date, Immunization.vaccine_id)
+        .order_by(Patient.id)
+    )
+
+
+# Непоставените ваксини на лекаря с дължима дата в [start, end) - range scan по индекса
+def _open_due_between(doctor_id: int, start: date, end: date):
+    return (
+        PatientVaccineDue.doctor_id == doctor_id,
+        PatientVaccineDue.given_date.is_(None),
+        PatientVaccineDue.due_date >= start,
+        PatientVaccineDue.due_date < end,
+    )
+
+
+# 📅 (пациент, ваксина, дата) за прогнозата, подредени по дата
+def due_forecast(doctor_id: int, start: date, end: date, limit: int):
+    return (
+        select(
+            PatientVaccineDue.patient_id, Patient.first_name, Patient.last_name,
+            PatientVaccineDue.vaccine_id, PatientVaccineDue.due_date,
+        )
+        .join(Patient, Patient.id == PatientVaccineDue.patient_id)
+        .where(*_open_due_between(doctor_id, start, end))
+        .order_by(PatientVaccineDue.due_date, PatientVaccineDue.patient_id, PatientVaccineDue.vaccine_id)
+        .limit(limit + 1)
+    )
+
+
+# 📊 Брой дължими ваксини по дата в същия интервал (за седмичното натоварване)
+def due_counts_by_date(doctor_id: int, start: date, end: date):
+    return (
+        select(PatientVaccineDue.due_date, func.count())
+        .where(*_open_due_between(doctor_id, start, end))
+        .group_by(PatientVaccineDue.due_date)
+    )
+
+
+# Просрочени към as_of: непоставени, с настъпила дата и извън специалния прозорец
+# (в прозореца 18-24м остават дължими само ваксините за 18-ти месец)
+def _overdue(as_of: date, special_ids: List[int]):
+    born_from, born_to = special_window_births(as_of)
+    return (
+        PatientVaccineDue.given_date.is_(None),
+        PatientVaccineDue.due_date <= as_of,
+        or_(
+            Patient.birth_date < born_from,
+            Patient.birth_date >= born_to,
+            PatientVaccineDue.vaccine_id.in_(special_ids),
+        ),
+    )
+
+
+# ✅ Дали patient_vaccine_due е сметната по тези месеци {vaccine_id: месец}: всяка ваксина
+# от каталога има ready ред със същия месец (изтритите ваксини падат с CASCADE)
+def due_state_current(months: Dict[int, int]):
+    matching = (
+        select(func.count())
+        .select_from(VaccineDueState)
+        .where(
+            VaccineDueState.ready.is_(True),
+            tuple_(VaccineDueState.vaccine_id, VaccineDueState.first_due_month).in_(list(months.items())),
+        )
+        .scalar_subquery()
+    )
+    return matching == len(months)
+
+
+# ⏰ Просрочените ваксини на пациент - индексирано търсене по patient_id
+# Редове (vaccine_id, има ли пациентът редове в patient_vaccine_due изобщо, дали таблицата е
+# сметната по months): (None, ...) ако няма просрочени, празен резултат - ако пациентът не е на този лекар
+def patient_overdue_rows(patient_id: int, doctor_id: int, as_of: date, special_ids: List[int], months: Dict[int, int]):
+    any_due = aliased(PatientVaccineDue)
+    return (
+        select(
+            PatientVaccineDue.vaccine_id,
+            exists().where(any_due.patient_id == Patient.id),
+            due_state_current(months),
+        )
+        .select_from(Patient)
+        .outerjoin(PatientVaccineDue, and_(PatientVaccineDue.patient_id == Patient.id, *_overdue(as_of, special_ids)))
+        .where(Patient.id == patient_id, Patient.doctor_id == doctor_id)
+    )
+
+
+# ⏰ Просрочените ваксини на всички пациенти на лекаря, най-старите първо
+def doctor_overdue_rows(doctor_id: int, as_of: date, special_ids: List[int], limit: int):
+    return (
+        select(
+            PatientVaccineDue.patient_id, Patient.first_name, Patient.last_name,
+            PatientVaccineDue.vaccine_id, PatientVaccineDue.due_date,
+        )
+        .join(Patient, Patient.id == PatientVaccineDue.patient_id)
+        .where(PatientVaccineDue.doctor_id == doctor_id, *_overdue(as_of, special_ids))
+        .order_by(PatientVaccineDue.due_date, PatientVaccineDue.patient_id, PatientVaccineDue.vaccine_id)
+        .limit(limit + 1)
+    )
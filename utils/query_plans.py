@@ -0,0 +1,82 @@
+import re
+from datetime import date
+from typing import Callable, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.future import select
+
+from models import Doctor, Patient
+from utils.export import registry_rows
+from utils.queries import (
+    delete_doctor_patients, doctor_overdue_rows, doctor_patients_with_immunizations, due_counts_by_date,
+    due_forecast, patient_overdue_rows, encode_cursor, patient_with_immunizations,
+    patient_schedule_version, patients_page,
+)
+
+# Таблици, по които не допускаме пълно сканиране в горещите заявки
+GUARDED_TABLES = ("patients", "immunizations", "doctors", "patient_vaccine_due")
+
+
+class _Cursor:
+    last_name = "M"
+    id = 1
+
+
+# 🔥 Горещите заявки от crud.py и routers/ (с примерни параметри)
+HOT_QUERIES: List[Tuple[str, Callable]] = [
+    ("auth: doctor by id", lambda: select(Doctor).where(Doctor.id == 1)),
+    ("auth: doctor by username", lambda: select(Doctor).where(Doctor.username == "doctor")),
+    ("schedule: patient with immunizations", lambda: patient_with_immunizations(1, 1, with_compliance=True)),
+    ("schedule: version for ETag", lambda: patient_schedule_version(1, 1)),
+    ("patients: first page", lambda: patients_page(1, 60)),
+    ("patients: keyset page", lambda: patients_page(1, 60, after=encode_cursor(_Cursor))),
+    ("patients: name prefix", lambda: patients_page(1, 60, name_prefix="Ив")),
+    ("schedule: doctor compliance stream", lambda: doctor_patients_with_immunizations(1)),
+    ("export: registry", lambda: registry_rows(1)),
+    ("import: owned patients", lambda: select(Patient.id).where(Patient.id.in_([1, 2]), Patient.doctor_id == 1)),
+    ("import: egn check", lambda: select(Patient.egn).where(Patient.egn.in_(["0000000000"]))),
+    ("delete: doctor patients", lambda: delete_doctor_patients(1, [1, 2])),
+    ("forecast: due between dates", lambda: due_forecast(1, date(2025, 1, 1), date(2025, 2, 1), 1000)),
+    ("forecast: weekly counts", lambda: due_counts_by_date(1, date(2025, 1, 1), date(2025, 2, 1))),
+    ("overdue: patient", lambda: patient_overdue_rows(1, 1, date(2025, 1, 1), [5], {5: 18})),
+    ("overdue: doctor", lambda: doctor_overdue_rows(1, date(2025, 1, 1), [5], 1000)),
+]
+
+
+def _compile(stmt, dialect) -> str:
+    return str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+# 🔍 План на заявката като текст (PostgreSQL или SQLite)
+async def explain(conn, stmt) -> str:
+    sql = _compile(stmt, conn.dialect)
+    if conn.dialect.name == "sqlite":
+        result = await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        return "\n".join(str(row[-1]) for row in result)
+    result = await conn.execute(text(f"EXPLAIN {sql}"))
+    return "\n".join(row[0] for row in result)
+
+
+def full_scans(plan: str, dialect: str) -> List[str]:
+    tables = "|".join(GUARDED_TABLES)
+    if dialect == "sqlite":
+        # Всяко SCAN е пълно обхождане (и "SCAN ... USING COVERING INDEX"); само SEARCH е наред
+        # Псевдонимите на SQLAlchemy (immunizations_1) се броят към таблицата
+        pattern = rf"\bSCAN (?:TABLE )?({tables})(?:_\d+)?\b"
+    else:
+        pattern = rf"Seq Scan on ({tables})\b"
+    return re.findall(pattern, plan)
+
+
+# ✅ Проверява всички горещи заявки; връща списък с регресии (празен = всичко е наред)
+async def check_hot_queries(engine) -> List[str]:
+    problems = []
+    async with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Принуждаваме планера да ползва индекс, ако изобщо има подходящ
+            await conn.execute(text("SET enable_seqscan = off"))
+        for name, build in HOT_QUERIES:
+            plan = await explain(conn, build())
+            for table in full_scans(plan, conn.dialect.name):
+                problems.append(f"{name}: пълно сканиране на {table}\n{plan}")
+    return problems
@@ -0,0 +1,306 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import smtplib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timezone
+from email.message import EmailMessage
+from typing import List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import delete, insert, update
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, engine
+from models import Doctor, ReminderOutbox
+from utils.catalog import catalog_cache
+from utils.queries import iter_patient_chunks
+from utils.schedule import CompiledCatalog, ages_in_months, due_matrix, given_matrix
+
+logger = logging.getLogger(__name__)
+
+# Процеси за изчисляване на просрочените ваксини (0 = в главния процес)
+REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", os.cpu_count() or 2))
+# Брой пациенти, които се четат от курсора наведнъж
+REMINDER_CHUNK = int(os.getenv("REMINDER_CHUNK", 5000))
+# Опити за изпращане, след които напомнянето остава failed
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", 5))
+
+REMINDER_DIR = os.getenv("REMINDER_DIR", "reminders")
+REMINDER_SMTP_HOST = os.getenv("REMINDER_SMTP_HOST", "localhost")
+REMINDER_SMTP_PORT = int(os.getenv("REMINDER_SMTP_PORT", 1025))
+REMINDER_MAIL_FROM = os.getenv("REMINDER_MAIL_FROM", "reminders@localhost")
+REMINDER_MAIL_DOMAIN = os.getenv("REMINDER_MAIL_DOMAIN", "localhost")
+
+
+# 🧮 Просрочените ваксини на пачка пациенти
+def evaluate_overdue(
+    ids: Sequence[int],
+    birth_dates: Sequence[date],
+    given: Sequence[Sequence[int]],
+    as_of: date,
+    catalog: CompiledCatalog,
+) -> List[dict]:
+    missing = due_matrix(ages_in_months(birth_dates, as_of), catalog) & ~given_matrix(given, catalog)
+    names = [v.name for v in catalog.vaccines]
+    overdue: dict = {}
+    # nonzero обхожда по редове, така че пациентите и ваксините остават подредени
+    for row, col in zip(*(axis.tolist() for axis in np.nonzero(missing))):
+        overdue.setdefault(ids[row], []).append(names[col])
+    return [{"patient_id": patient_id, "vaccines": vaccines} for patient_id, vaccines in overdue.items()]
+
+
+# 👩‍⚕️ Пациентите на един лекар: чете ги на пачки и връща (брой пациенти, просрочени, секунди четене)
+async def evaluate_doctor(doctor_id: int, as_of: date, catalog: CompiledCatalog, chunk_size: int):
+    patients = 0
+    overdue: List[dict] = []
+    read_seconds = 0.0
+    async with AsyncSessionLocal() as db:
+        chunks = iter_patient_chunks(db, doctor_id, chunk_size)
+        while True:
+            started = time.perf_counter()
+            chunk = await anext(chunks, None)
+            read_seconds += time.perf_counter() - started
+            if chunk is None:
+                break
+            patients += len(chunk[0])
+            overdue += evaluate_overdue(*chunk, as_of, catalog)
+    return patients, overdue, read_seconds
+
+
+# ⚙️ Работен процес: собствен event loop и собствени връзки към базата,
+# така че и четенето, и изчисляването вървят паралелно по лекари
+_worker_catalog: Optional[CompiledCatalog] = None
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _init_worker(catalog: CompiledCatalog) -> None:
+    global _worker_catalog, _worker_loop
+    _worker_catalog = catalog
+    _worker_loop = asyncio.new_event_loop()
+    # spawn импортира database наново - SQL логът на dev профила би заглушил изхода на командата
+    engine.echo = False
+
+
+def _evaluate_in_worker(doctor_id: int, as_of: date, chunk_size: int):
+    return _worker_loop.run_until_complete(_evaluate_and_release(doctor_id, as_of, chunk_size))
+
+
+async def _evaluate_and_release(doctor_id: int, as_of: date, chunk_size: int):
+    try:
+        return await evaluate_doctor(doctor_id, as_of, _worker_catalog, chunk_size)
+    finally:
+        # Без отворени връзки между задачите - иначе нишките на драйвера задържат процеса при спиране
+        await engine.dispose()
+
+
+# 📈 Отчет за пускането
+@dataclass
+class RunReport:
+    run_date: date
+    doctors: int = 0
+    skipped: int = 0            # лекари, обработени при предишно (прекъснато) пускане
+    patients: int = 0
+    overdue_patients: int = 0
+    overdue_vaccines: int = 0
+    read_seconds: float = 0.0   # сума по лекари (при пул - по всички процеси)
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        report = asdict(self)
+        report["run_date"] = self.run_date.isoformat()
+        report["read_seconds"] = round(self.read_seconds, 3)
+        report["seconds"] = round(self.seconds, 3)
+        report["patients_per_s"] = round(self.patients / self.seconds) if self.seconds else 0
+        return report
+
+
+# 🌙 Изчислява напомнянията за всички лекари и ги записва в reminder_outbox
+# Всеки лекар се записва в собствена транзакция - това е checkpoint-ът за продължаване
+async def build_outbox(
+    run_date: date,
+    workers: int = REMINDER_WORKERS,
+    chunk_size: int = REMINDER_CHUNK,
+    restart: bool = False,
+) -> RunReport:
+    report = RunReport(run_date)
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        if restart:
+            # Изпратените остават - иначе лекарят би получил напомнянето втори път
+            await db.execute(delete(ReminderOutbox).where(
+                ReminderOutbox.run_date == run_date, ReminderOutbox.status != "sent"
+            ))
+        done = set((await db.execute(
+            select(ReminderOutbox.doctor_id).where(ReminderOutbox.run_date == run_date)
+        )).scalars().all())
+        doctor_ids = [d for d in (await db.execute(select(Doctor.id).order_by(Doctor.id))).scalars().all() if d not in done]
+        catalog = await catalog_cache.get(db)
+        await db.commit()
+    report.skipped = len(done)
+
+    executor = None
+    if workers > 0:
+        # spawn: работните процеси не наследяват нишките на event loop-а и aiosqlite
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(catalog.compiled,),
+        )
+    loop = asyncio.get_running_loop()
+    write_lock = asyncio.Lock()
+
+    # Записът в reminder_outbox е само в главния процес (един писател)
+    async def finish(doctor_id: int, evaluation) -> None:
+        patients, overdue, read_seconds = await evaluation
+        async with write_lock, AsyncSessionLocal() as db:
+            await db.execute(insert(ReminderOutbox).values(
+                run_date=run_date, doctor_id=doctor_id, patient_count=patients, overdue_count=len(overdue),
+                payload=json.dumps(overdue, ensure_ascii=False), status="pending" if overdue else "empty",
+            ))
+            await db.commit()
+        report.doctors += 1
+        report.read_seconds += read_seconds
+        report.patients += patients
+        report.overdue_patients += len(overdue)
+        report.overdue_vaccines += sum(len(item["vaccines"]) for item in overdue)
+
+    pending = set()
+    try:
+        for doctor_id in doctor_ids:
+            if executor is not None:
+                evaluation = loop.run_in_executor(executor, _evaluate_in_worker, doctor_id, run_date, chunk_size)
+            else:
+                evaluation = evaluate_doctor(doctor_id, run_date, catalog.compiled, chunk_size)
+            pending.add(asyncio.ensure_future(finish(doctor_id, evaluation)))
+
+            # Най-много две задачи на процес в движение
+            if len(pending) >= max(workers, 1) * 2:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    task.result()
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+# ✉️ Едно напомняне за изпращане
+@dataclass
+class ReminderMessage:
+    outbox_id: int
+    run_date: date
+    doctor_id: int
+    username: str
+    patients: List[dict]
+
+    @property
+    def subject(self) -> str:
+        return f"Просрочени ваксини към {self.run_date.isoformat()}: {len(self.patients)} пациента"
+
+    def body(self) -> str:
+        return "\n".join(f"Пациент #{p['patient_id']}: {', '.join(p['vaccines'])}" for p in self.patients) + "\n"
+
+
+# 📁 Записва всяко напомняне като JSON файл (за тестове и локална работа)
+# Повторното изпращане презаписва същия файл
+class FileSender:
+    def __init__(self, directory: str = REMINDER_DIR):
+        self.directory = directory
+
+    def send(self, message: ReminderMessage) -> None:
+        folder = os.path.join(self.directory, message.run_date.isoformat())
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"doctor-{message.doctor_id}.json")
+        data = {**asdict(message), "run_date": message.run_date.isoformat(), "subject": message.subject}
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+# 📧 Изпраща по SMTP до <username>@REMINDER_MAIL_DOMAIN
+# Локално: python -m smtpd -n -c DebuggingServer localhost:1025
+class SmtpSender:
+    def __init__(
+        self,
+        host: str = REMINDER_SMTP_HOST,
+        port: int = REMINDER_SMTP_PORT,
+        sender: str = REMINDER_MAIL_FROM,
+        domain: str = REMINDER_MAIL_DOMAIN,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.domain = domain
+
+    def send(self, message: ReminderMessage) -> None:
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = f"{message.username}@{self.domain}"
+        email["Subject"] = message.subject
+        email.set_content(message.body())
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            smtp.send_message(email)
+
+
+SENDERS = {"file": FileSender, "smtp": SmtpSender}
+
+
+# 📤 Изпраща чакащите (и неуспелите) напомняния за датата; статусът се записва след всяко
+async def send_outbox(run_date: date, sender, batch_size: int = 100, max_attempts: int = REMINDER_MAX_ATTEMPTS) -> dict:
+    sent = failed = 0
+    started = time.perf_counter()
+    after = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            result = await db.execute(
+                select(
+                    ReminderOutbox.id, ReminderOutbox.doctor_id, Doctor.username, ReminderOutbox.payload,
+                    ReminderOutbox.attempts,
+                )
+                .join(Doctor, Doctor.id == ReminderOutbox.doctor_id)
+                .where(
+                    ReminderOutbox.run_date == run_date,
+                    ReminderOutbox.status.in_(["pending", "failed"]),
+                    ReminderOutbox.attempts < max_attempts,
+                    ReminderOutbox.id > after,
+                )
+                .order_by(ReminderOutbox.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            for outbox_id, doctor_id, username, payload, attempts in rows:
+                message = ReminderMessage(outbox_id, run_date, doctor_id, username, json.loads(payload))
+                values = {"attempts": attempts + 1}
+                try:
+                    # Изпращането е блокиращо (SMTP/файл) - извън event loop-а
+                    await asyncio.to_thread(sender.send, message)
+                    values.update(status="sent", sent_at=datetime.now(timezone.utc), last_error=None)
+                    sent += 1
+                except Exception as e:
+                    logger.error("Reminder send error (doctor %s): %s", doctor_id, e)
+                    values.update(status="failed", last_error=str(e)[:500])
+                    failed += 1
+                await db.execute(update(ReminderOutbox).where(ReminderOutbox.id == outbox_id).values(**values))
+                await db.commit()
+            after = rows[-1][0]
+    seconds = time.perf_counter() - started
+    return {
+        "sent": sent,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "messages_per_s": round((sent + failed) / seconds) if seconds else 0,
+    }
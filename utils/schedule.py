@@ -1,20 +1,163 @@
+from dataclasses import dataclass
 from datetime import date
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
 from models import Vaccine, Immunization
-from typing import List
+
+# Специален прозорец: 18–24м се изисква само ваксината за 18-ти месец
+SPECIAL_WINDOW = (18, 24)
+SPECIAL_MONTH = 18
+
+
+# 📚 Каталог, компилиран веднъж: задължителните ваксини с прагове в месеци
+@dataclass(frozen=True)
+class CompiledCatalog:
+    vaccines: Tuple[Vaccine, ...]   # всички ваксини в оригиналния ред
+    ids: np.ndarray                 # vaccine.id по колони
+    mandatory: np.ndarray           # bool маска на задължителните
+    thresholds: np.ndarray          # сортирани recommended_month на задължителните
+    rank: np.ndarray                # позиция на всяка колона в thresholds (или големина при липса)
+    special: np.ndarray             # задължителни с recommended_month == 18
+
+    @property
+    def size(self) -> int:
+        return len(self.vaccines)
+
+    def column_of(self) -> dict:
+        return {int(vid): col for col, vid in enumerate(self.ids)}
+
+
+def compile_catalog(all_vaccines: Sequence[Vaccine]) -> CompiledCatalog:
+    vaccines = tuple(all_vaccines)
+    n = len(vaccines)
+    ids = np.fromiter((v.id for v in vaccines), dtype=np.int64, count=n)
+    # Задължителна ваксина без месец никога не става дължима
+    months = np.fromiter(
+        (v.recommended_month if v.recommended_month is not None else -1 for v in vaccines),
+        dtype=np.int64, count=n,
+    )
+    mandatory = np.fromiter((bool(v.is_mandatory) for v in vaccines), dtype=bool, count=n)
+    with_month = mandatory & (months >= 0)
+
+    cols = np.flatnonzero(with_month)
+    order = cols[np.argsort(months[cols], kind="stable")]
+    thresholds = months[order]
+    rank = np.full(n, n + 1, dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    return CompiledCatalog(
+        vaccines=vaccines,
+        ids=ids,
+        mandatory=mandatory,
+        thresholds=thresholds,
+        rank=rank,
+        special=with_month & (months == SPECIAL_MONTH),
+    )
+
+
+# ⏳ Възраст в месеци за цяла кохорта наведнъж
+def ages_in_months(birth_dates: Sequence[date], reference_date: Optional[date] = None) -> np.ndarray:
+    reference = np.datetime64(reference_date or date.today(), "M")
+    born = np.asarray(birth_dates, dtype="datetime64[D]").astype("datetime64[M]")
+    return (reference - born).astype(np.int64)
+
+
+# 🧮 Матрица (пациенти x ваксини) на дължимите задължителни ваксини
+def due_matrix(ages: np.ndarray, catalog: CompiledCatalog) -> np.ndarray:
+    ages = np.asarray(ages, dtype=np.int64)
+    # Брой прагове <= възрастта -> първите k ваксини в сортирания ред са дължими
+    reached = np.searchsorted(catalog.thresholds, ages, side="right")
+    due = catalog.rank[np.newaxis, :] < reached[:, np.newaxis]
+    window = (ages >= SPECIAL_WINDOW[0]) & (ages <= SPECIAL_WINDOW[1])
+    due[window] = catalog.special
+    return due
+
+
+# ✅ Матрица на поставените ваксини от списъци с vaccine_id за всеки пациент
+def given_matrix(given: Sequence[Iterable[int]], catalog: CompiledCatalog) -> np.ndarray:
+    column = catalog.column_of()
+    rows, cols = [], []
+    for row, vaccine_ids in enumerate(given):
+        for vid in vaccine_ids:
+            col = column.get(vid)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+    matrix = np.zeros((len(given), catalog.size), dtype=bool)
+    matrix[rows, cols] = True
+    return matrix
+
+
+# 🚀 Дължими и липсващи ваксини за цяла кохорта в едно минаване
+def batch_schedule(
+    birth_dates: Sequence[date],
+    given: Sequence[Iterable[int]],
+    catalog: CompiledCatalog,
+    reference_date: Optional[date] = None,
+) -> Tuple[List[Set[int]], List[Set[int]]]:
+    due = due_matrix(ages_in_months(birth_dates, reference_date), catalog)
+    missing = due & ~given_matrix(given, catalog)
+    return _row_sets(due, catalog.ids), _row_sets(missing, catalog.ids)
+
+
+# 📅 Следващата възраст (в месеци), на която става дължима нова, непоставена ваксина; -1 ако няма
+def next_due_ages(ages: np.ndarray, given: np.ndarray, catalog: CompiledCatalog) -> np.ndarray:
+    ages = np.asarray(ages, dtype=np.int64)
+    # Дължимото множество се променя само на праговете и на границите на прозореца
+    candidates = np.unique(np.concatenate([
+        catalog.thresholds, [SPECIAL_WINDOW[0], SPECIAL_WINDOW[1] + 1]
+    ])).astype(np.int64)
+    due_now = due_matrix(ages, catalog)
+    due_later = due_matrix(candidates, catalog)
+    newly_due = (due_later[np.newaxis, :, :] & ~given[:, np.newaxis, :] & ~due_now[:, np.newaxis, :]).any(axis=2)
+    newly_due &= candidates[np.newaxis, :] > ages[:, np.newaxis]
+    first = newly_due.argmax(axis=1)
+    return np.where(newly_due.any(axis=1), candidates[first], -1)
+
+
+# 📆 Първата възраст (в месеци), на която всяка ваксина от каталога става дължима; -1 ако никога
+def first_due_months(catalog: CompiledCatalog) -> np.ndarray:
+    candidates = np.unique(np.concatenate([
+        [0], catalog.thresholds, [SPECIAL_WINDOW[0], SPECIAL_WINDOW[1] + 1]
+    ])).astype(np.int64)
+    due = due_matrix(candidates, catalog)
+    return np.where(due.any(axis=0), candidates[due.argmax(axis=0)], -1)
+
+
+# 🪟 Рождени дати [от, до), за които на reference_date пациентът е в специалния прозорец
+def special_window_births(reference_date: Optional[date] = None) -> Tuple[date, date]:
+    reference = np.datetime64(reference_date or date.today(), "M")
+    born_from = reference - np.timedelta64(SPECIAL_WINDOW[1], "M")
+    born_to = reference - np.timedelta64(SPECIAL_WINDOW[0] - 1, "M")
+    return born_from.astype("datetime64[D]").item(), born_to.astype("datetime64[D]").item()
+
+
+# 📅 Дата, на която пациентът навършва дадена възраст в месеци (1-во число на месеца)
+def month_start_dates(birth_dates: Sequence[date], months: np.ndarray) -> List[Optional[date]]:
+    born = np.asarray(birth_dates, dtype="datetime64[D]").astype("datetime64[M]")
+    dates = (born + np.asarray(months, dtype=np.int64).astype("timedelta64[M]")).astype("datetime64[D]")
+    return [d.item() if m >= 0 else None for d, m in zip(dates, months)]
+
+
+def _row_sets(matrix: np.ndarray, ids: np.ndarray) -> List[Set[int]]:
+    rows, cols = np.nonzero(matrix)
+    result: List[Set[int]] = [set() for _ in range(matrix.shape[0])]
+    for row, vid in zip(rows.tolist(), ids[cols].tolist()):
+        result[row].add(vid)
+    return result
+
 
 # ⏳ Изчисляване на възраст в месеци
-def calculate_age_in_months(birth_date: date) -> int:
-    today = date.today()
-    return (today.year - birth_date.year) * 12 + (today.month - birth_date.month)
+def calculate_age_in_months(birth_date: date, reference_date: Optional[date] = None) -> int:
+    return int(ages_in_months([birth_date], reference_date)[0])
 
 # 🧠 Връща препоръчителните задължителни ваксини за тази възраст
 def required_mandatory_vaccines(age_months: int, all_vaccines: List[Vaccine]) -> List[Vaccine]:
-    required = []
-    for vaccine in all_vaccines:
-        if vaccine.is_mandatory:
-            # Специален случай: 18–24м само ако има минала 1г от предишната задължителна
-            if 18 <= age_months <= 24:
-                required.append(vaccine) if vaccine.recommended_month == 18 else None
-            elif age_months >= vaccine.recommended_month:
-                required.append(vaccine)
-    return required
+    return required_for_age(age_months, compile_catalog(all_vaccines))
+
+# 🧠 Същото, но върху вече компилиран каталог
+def required_for_age(age_months: int, catalog: CompiledCatalog) -> List[Vaccine]:
+    due = due_matrix(np.array([age_months]), catalog)[0]
+    return [catalog.vaccines[col] for col in np.flatnonzero(due)]
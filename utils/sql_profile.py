@@ -0,0 +1,131 @@
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Включва профилирането на всяка заявка (SQL_PROFILE=1); по подразбиране е изключено
+SQL_PROFILE = os.getenv("SQL_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+# Колко еднакви заявки в една HTTP заявка считаме за N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 3))
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*\)")
+_VALUES_ROWS = re.compile(r"(VALUES \(\.\.\.\))(?:, \(\.\.\.\))+", re.IGNORECASE)
+
+
+# 🔑 Отпечатък на SQL: без литерали и с еднаква форма на IN (...) и многоредови VALUES
+def fingerprint(statement: str) -> str:
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _POSTCOMPILE.sub("(...)", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _VALUES_ROWS.sub(r"\1", sql)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Повече SQL заявки от позволеното или N+1 шаблон"""
+
+
+# 🧾 SQL заявките, изпълнени в рамките на едно прихващане (вложените се броят и във външното)
+class QueryLog:
+    def __init__(self, parent: Optional["QueryLog"] = None):
+        self.statements: List[str] = []
+        self.parent = parent
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def fingerprints(self) -> Counter:
+        return Counter(fingerprint(statement) for statement in self.statements)
+
+    # Отпечатъци, повторени поне threshold пъти (N+1 кандидати)
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        return {sql: n for sql, n in self.fingerprints().items() if n >= threshold}
+
+    def report(self) -> str:
+        lines = [f"{self.count} SQL заявки:"]
+        lines += [f"  {n}x {sql}" for sql, n in self.fingerprints().most_common()]
+        return "\n".join(lines)
+
+    def assert_max(self, max_queries: Optional[int] = None, n_plus_one: Optional[int] = N_PLUS_ONE_THRESHOLD) -> None:
+        if max_queries is not None and self.count > max_queries:
+            raise QueryBudgetExceeded(f"Очаквани най-много {max_queries} SQL заявки\n{self.report()}")
+        if n_plus_one is not None and self.repeated(n_plus_one):
+            raise QueryBudgetExceeded(f"Повтарящи се заявки (N+1)\n{self.report()}")
+
+
+_active_log: ContextVar[Optional[QueryLog]] = ContextVar("sql_query_log", default=None)
+_instrumented = set()
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    query_log = _active_log.get()
+    while query_log is not None:
+        query_log.statements.append(statement)
+        query_log = query_log.parent
+
+
+# 🔌 Слушател на engine-а; извън прихващане струва само едно четене на contextvar
+def instrument_engine(engine) -> None:
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if id(sync_engine) in _instrumented:
+        return
+    event.listen(sync_engine, "after_cursor_execute", _record)
+    _instrumented.add(id(sync_engine))
+
+
+# 🎯 Прихваща заявките в текущия контекст (вкл. вложените async задачи)
+@contextmanager
+def capture_queries(max_queries: Optional[int] = None, n_plus_one: Optional[int] = None):
+    query_log = QueryLog(_active_log.get())
+    token = _active_log.set(query_log)
+    try:
+        yield query_log
+    finally:
+        _active_log.reset(token)
+    query_log.assert_max(max_queries, n_plus_one)
+
+
+# 🩺 Middleware (само при SQL_PROFILE=1): X-SQL-Queries в отговора и предупреждение за N+1
+class SqlProfileMiddleware:
+    def __init__(self, app, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        query_log = QueryLog(_active_log.get())
+        token = _active_log.set(query_log)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-sql-queries", str(query_log.count).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _active_log.reset(token)
+
+        repeated = query_log.repeated(self.threshold)
+        if repeated:
+            logger.warning(
+                "N+1 pattern in %s %s", scope["method"], scope["path"],
+                extra={"fields": {"queries": query_log.count, "repeated": repeated}},
+            )
@@ -0,0 +1,107 @@
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Hashable, Iterator
+
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from utils.metrics import InstrumentedTemplates, metrics
+
+TEMPLATES_DIR = "templates"
+# Компилираните шаблони се пазят на диск между рестартите
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "vaccination-jinja-cache"))
+# В продукция: TEMPLATES_AUTO_RELOAD=0 (без проверка на mtime при всяко рендериране)
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "1").strip().lower() in ("1", "true", "yes", "on")
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 256))
+# Размер на парчетата при стрийминг на HTML
+STREAM_CHUNK_SIZE = 16 * 1024
+
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+logger = logging.getLogger(__name__)
+
+
+# 🧩 LRU кеш на готови HTML фрагменти по (шаблон, ключ)
+class FragmentCache:
+    def __init__(self, max_size: int = FRAGMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._items: "OrderedDict[tuple, Markup]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, name: str, key: Hashable, **context) -> Markup:
+        cache_key = (name, key)
+        html = self._items.get(cache_key)
+        if html is not None:
+            self.hits += 1
+            self._items.move_to_end(cache_key)
+            return html
+
+        self.misses += 1
+        started = time.perf_counter()
+        html = Markup(templates.get_template(name).render(**context))
+        metrics.observe_render(name, time.perf_counter() - started)
+        self._items[cache_key] = html
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return html
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+fragment_cache = FragmentCache()
+
+# Една обща Jinja среда за crud.py и routers/auth.py
+templates = InstrumentedTemplates(
+    directory=TEMPLATES_DIR,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    auto_reload=TEMPLATES_AUTO_RELOAD,
+)
+# В шаблон: {{ fragment("_vaccine_cards.html", catalog_version, vaccines=vaccines) }}
+templates.env.globals["fragment"] = fragment_cache.render
+
+
+# 🔥 Компилира всички шаблони при старт (и пълни bytecode кеша)
+def precompile_templates() -> int:
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.get_template(name)
+    return len(names)
+
+
+# 🌊 HTML на парчета: браузърът получава началото, докато останалото още се рендерира
+# Шаблонът се зарежда веднага (липсващ/невалиден шаблон е грешка преди отговора), а грешка
+# по време на рендерирането идва след статус 200 - тогава се логва и потокът се затваря
+def stream_template(name: str, context: dict) -> AsyncIterator[bytes]:
+    return _stream(name, templates.get_template(name).generate(context))
+
+
+async def _stream(name: str, pieces: Iterator[str]) -> AsyncIterator[bytes]:
+    buffer, size, rendering = [], 0, 0.0
+    try:
+        while True:
+            # Мерим само рендерирането, не и чакането на клиента
+            started = time.perf_counter()
+            piece = next(pieces, None)
+            rendering += time.perf_counter() - started
+            if piece is None:
+                break
+            buffer.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer).encode()
+                buffer, size = [], 0
+    except Exception as e:
+        logger.error("Template streaming error in %s: %s", name, e)
+        pieces.close()
+        return
+    if buffer:
+        yield "".join(buffer).encode()
+    metrics.observe_render(name, rendering)